@@ -26,7 +26,6 @@ import elf_support
 
 import array
 import os.path
-import subprocess
 import re
 import xml.etree.ElementTree
 
@@ -153,9 +152,6 @@ def bootblock_action(target, source, env):
     if strExt == '.elf':
         # This seems to be an ELF file.
 
-        # Generate a temp filename for the binary.
-        strBinFileName = strSourceFileName + '.bin'
-
         # Extract the segments.
         atSegments = elf_support.get_segment_table(env, strSourceFileName)
         # Get the estimated binary size from the segments.
@@ -166,26 +162,16 @@ def bootblock_action(target, source, env):
                             'Too scared to continue!')
 
         # Extract the binaries.
-        subprocess.check_call([
-            env['OBJCOPY'],
-            '-O', 'binary',
-            strSourceFileName,
-            strBinFileName
-        ])
+        strBinFile = elf_support.get_binary_data(env, strSourceFileName)
 
         ulExecAddress = elf_support.get_exec_address(env, strSourceFileName)
         ulLoadAddress = elf_support.get_load_address(atSegments)
 
-        # Get the application data.
-        tBinFile = open(strBinFileName, 'rb')
-        strBinFile = tBinFile.read()
-        tBinFile.close()
-
         # Pad the application size to a multiple of dwords.
         uiPadBytes = len(strBinFile) & 3
         if uiPadBytes != 0:
             uiPadBytes = 4 - uiPadBytes
-            strBinFile += '\0' * uiPadBytes
+            strBinFile += b'\0' * uiPadBytes
         # Get the size of the evetually padded data.
         ulApplicationDwordSize = int(len(strBinFile) / 4)
         aulApplicationData = array.array('I')
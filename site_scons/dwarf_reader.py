@@ -0,0 +1,846 @@
+# -*- coding: utf-8 -*-
+
+# ***************************************************************************
+# *   Copyright (C) 2019 by Hilscher GmbH                                   *
+# *   netXsupport@hilscher.com                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation; either version 2 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program; if not, write to the                         *
+# *   Free Software Foundation, Inc.,                                       *
+# *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+# ***************************************************************************
+
+
+import re
+import struct
+
+
+# The tags used by the symbol extraction.
+DW_TAG_member = 0x0d
+DW_TAG_structure_type = 0x13
+DW_TAG_enumerator = 0x28
+
+# The attributes used by the symbol extraction.
+DW_AT_name = 0x03
+DW_AT_byte_size = 0x0b
+DW_AT_const_value = 0x1c
+DW_AT_data_member_location = 0x38
+DW_AT_declaration = 0x3c
+DW_AT_str_offsets_base = 0x72
+
+# Attribute forms.
+DW_FORM_addr = 0x01
+DW_FORM_block2 = 0x03
+DW_FORM_block4 = 0x04
+DW_FORM_data2 = 0x05
+DW_FORM_data4 = 0x06
+DW_FORM_data8 = 0x07
+DW_FORM_string = 0x08
+DW_FORM_block = 0x09
+DW_FORM_block1 = 0x0a
+DW_FORM_data1 = 0x0b
+DW_FORM_flag = 0x0c
+DW_FORM_sdata = 0x0d
+DW_FORM_strp = 0x0e
+DW_FORM_udata = 0x0f
+DW_FORM_ref_addr = 0x10
+DW_FORM_ref1 = 0x11
+DW_FORM_ref2 = 0x12
+DW_FORM_ref4 = 0x13
+DW_FORM_ref8 = 0x14
+DW_FORM_ref_udata = 0x15
+DW_FORM_indirect = 0x16
+DW_FORM_sec_offset = 0x17
+DW_FORM_exprloc = 0x18
+DW_FORM_flag_present = 0x19
+DW_FORM_strx = 0x1a
+DW_FORM_addrx = 0x1b
+DW_FORM_ref_sup4 = 0x1c
+DW_FORM_strp_sup = 0x1d
+DW_FORM_data16 = 0x1e
+DW_FORM_line_strp = 0x1f
+DW_FORM_ref_sig8 = 0x20
+DW_FORM_implicit_const = 0x21
+DW_FORM_loclistx = 0x22
+DW_FORM_rnglistx = 0x23
+DW_FORM_ref_sup8 = 0x24
+DW_FORM_strx1 = 0x25
+DW_FORM_strx2 = 0x26
+DW_FORM_strx3 = 0x27
+DW_FORM_strx4 = 0x28
+DW_FORM_addrx1 = 0x29
+DW_FORM_addrx2 = 0x2a
+DW_FORM_addrx3 = 0x2b
+DW_FORM_addrx4 = 0x2c
+DW_FORM_GNU_addr_index = 0x1f01
+DW_FORM_GNU_str_index = 0x1f02
+DW_FORM_GNU_ref_alt = 0x1f20
+DW_FORM_GNU_strp_alt = 0x1f21
+
+# Unit types of DWARF 5.
+DW_UT_type = 0x02
+DW_UT_skeleton = 0x04
+DW_UT_split_compile = 0x05
+DW_UT_split_type = 0x06
+
+# The only location operation which is evaluated for member offsets.
+DW_OP_plus_uconst = 0x23
+
+# The entry types of the ".debug_macinfo" section.
+DW_MACINFO_define = 0x01
+DW_MACINFO_undef = 0x02
+DW_MACINFO_start_file = 0x03
+DW_MACINFO_end_file = 0x04
+DW_MACINFO_vendor_ext = 0xff
+
+# The opcodes of the ".debug_macro" section. The GNU extension for DWARF 4
+# uses the same values up to the "import" entries.
+DW_MACRO_define = 0x01
+DW_MACRO_undef = 0x02
+DW_MACRO_start_file = 0x03
+DW_MACRO_end_file = 0x04
+DW_MACRO_define_strp = 0x05
+DW_MACRO_undef_strp = 0x06
+DW_MACRO_import = 0x07
+DW_MACRO_define_sup = 0x08
+DW_MACRO_undef_sup = 0x09
+DW_MACRO_import_sup = 0x0a
+DW_MACRO_define_strx = 0x0b
+DW_MACRO_undef_strx = 0x0c
+DW_MACRO_lo_user = 0xe0
+
+# Only macros without parameters are used. The name must be followed by
+# whitespace, the rest of the string is the value.
+s_reMacro = re.compile(r'(\w+)\s+(.*)')
+
+# The section flag for compressed sections.
+SHF_COMPRESSED = 0x800
+
+# The ELF type of relocatable files.
+ET_REL = 1
+
+# Forms with a size which does not depend on the unit.
+s_atFixedFormSizes = dict({
+    DW_FORM_data1: 1,
+    DW_FORM_ref1: 1,
+    DW_FORM_flag: 1,
+    DW_FORM_strx1: 1,
+    DW_FORM_addrx1: 1,
+    DW_FORM_data2: 2,
+    DW_FORM_ref2: 2,
+    DW_FORM_strx2: 2,
+    DW_FORM_addrx2: 2,
+    DW_FORM_strx3: 3,
+    DW_FORM_addrx3: 3,
+    DW_FORM_data4: 4,
+    DW_FORM_ref4: 4,
+    DW_FORM_ref_sup4: 4,
+    DW_FORM_strx4: 4,
+    DW_FORM_addrx4: 4,
+    DW_FORM_data8: 8,
+    DW_FORM_ref8: 8,
+    DW_FORM_ref_sig8: 8,
+    DW_FORM_ref_sup8: 8,
+    DW_FORM_data16: 16,
+    DW_FORM_flag_present: 0,
+    DW_FORM_implicit_const: 0
+})
+
+# Forms with the size of an offset in the section.
+s_astrOffsetForms = frozenset([
+    DW_FORM_strp,
+    DW_FORM_sec_offset,
+    DW_FORM_line_strp,
+    DW_FORM_strp_sup,
+    DW_FORM_GNU_ref_alt,
+    DW_FORM_GNU_strp_alt
+])
+
+
+class DwarfUnit:
+    """The properties of one unit which are needed to decode its DIEs."""
+
+    # The DWARF version of the unit.
+    uiVersion = None
+
+    # 4 for 32 bit DWARF, 8 for 64 bit DWARF.
+    uiOffsetSize = None
+
+    # The size of an address in bytes.
+    uiAddressSize = None
+
+    # The start of the first DIE and the end of the unit in the buffer.
+    ulDieStart = None
+    ulEnd = None
+
+    # The abbreviations of the unit.
+    atAbbrevs = None
+
+    # The offset of the string offsets table for the "strx" forms.
+    ulStrOffsetsBase = None
+
+
+class DwarfReader:
+    """Decode the DWARF debug information of an ELF file.
+
+    The reader works directly on the memory mapped ELF file. It never builds
+    a complete tree of the debug information but streams over the DIEs and
+    only decodes the attributes which are really needed.
+    """
+
+    # The ELF reader providing the sections.
+    __tElf = None
+
+    # The memory mapped ELF file.
+    __tBuffer = None
+
+    # The byte order prefix for struct.
+    __strEndian = None
+
+    # Cache for the abbreviation tables. The key is the offset in the
+    # ".debug_abbrev" section.
+    __atAbbrevTables = None
+
+    # Cache for the locations of the debug sections.
+    __atSections = None
+
+    def __init__(self, tElf):
+        # The debug sections of relocatable files must be relocated before
+        # they can be used.
+        if tElf.get_type() == ET_REL:
+            raise Exception('Relocatable files are not supported.')
+
+        self.__tElf = tElf
+        self.__tBuffer = tElf.get_buffer()
+        self.__strEndian = tElf.get_endian()
+        self.__atAbbrevTables = dict({})
+        self.__atSections = dict({})
+
+    def __get_section(self, strName):
+        # Return the start and end offset of a section in the buffer or None
+        # if the section does not exist.
+        if strName in self.__atSections:
+            return self.__atSections[strName]
+
+        tLocation = None
+        tSection = self.__tElf.get_section_by_name(strName)
+        if tSection is not None:
+            if (tSection['sh_flags'] & SHF_COMPRESSED) != 0:
+                raise Exception(
+                    'Compressed debug sections are not supported: %s' %
+                    strName
+                )
+            ulStart = tSection['sh_offset']
+            ulEnd = ulStart + tSection['sh_size']
+            if ulEnd > len(self.__tBuffer):
+                raise Exception('The section "%s" is truncated.' % strName)
+            tLocation = (ulStart, ulEnd)
+
+        self.__atSections[strName] = tLocation
+        return tLocation
+
+    def __read_uleb128(self, ulPos):
+        tBuffer = self.__tBuffer
+        ulResult = 0
+        uiShift = 0
+        while True:
+            ucByte = tBuffer[ulPos]
+            ulPos += 1
+            ulResult |= (ucByte & 0x7f) << uiShift
+            if (ucByte & 0x80) == 0:
+                break
+            uiShift += 7
+        return ulResult, ulPos
+
+    def __read_sleb128(self, ulPos):
+        tBuffer = self.__tBuffer
+        ulResult = 0
+        uiShift = 0
+        while True:
+            ucByte = tBuffer[ulPos]
+            ulPos += 1
+            ulResult |= (ucByte & 0x7f) << uiShift
+            uiShift += 7
+            if (ucByte & 0x80) == 0:
+                break
+        if (ucByte & 0x40) != 0:
+            ulResult -= (1 << uiShift)
+        return ulResult, ulPos
+
+    def __read_uint(self, ulPos, uiSize):
+        if uiSize == 1:
+            return self.__tBuffer[ulPos]
+        elif uiSize == 2:
+            strFormat = 'H'
+        elif uiSize == 4:
+            strFormat = 'I'
+        elif uiSize == 8:
+            strFormat = 'Q'
+        else:
+            # This is only used for the 3 byte forms.
+            if self.__strEndian == '<':
+                strByteOrder = 'little'
+            else:
+                strByteOrder = 'big'
+            return int.from_bytes(
+                self.__tBuffer[ulPos:ulPos + uiSize],
+                strByteOrder
+            )
+        return struct.unpack_from(
+            self.__strEndian + strFormat,
+            self.__tBuffer,
+            ulPos
+        )[0]
+
+    def __read_cstring(self, ulPos, ulEnd=None):
+        tBuffer = self.__tBuffer
+        if ulEnd is None:
+            ulEnd = len(tBuffer)
+        ulTerm = tBuffer.find(b'\0', ulPos, ulEnd)
+        if ulTerm == -1:
+            raise Exception('Unterminated string in the debug information.')
+        return tBuffer[ulPos:ulTerm].decode('utf-8', 'replace'), ulTerm + 1
+
+    def __get_abbrevs(self, ulAbbrevOffset):
+        atAbbrevs = self.__atAbbrevTables.get(ulAbbrevOffset)
+        if atAbbrevs is None:
+            tSection = self.__get_section('.debug_abbrev')
+            if tSection is None:
+                raise Exception('The ELF file has no ".debug_abbrev".')
+            ulStart, ulEnd = tSection
+
+            atAbbrevs = dict({})
+            ulPos = ulStart + ulAbbrevOffset
+            while ulPos < ulEnd:
+                ulCode, ulPos = self.__read_uleb128(ulPos)
+                if ulCode == 0:
+                    break
+                ulTag, ulPos = self.__read_uleb128(ulPos)
+                fHasChildren = (self.__tBuffer[ulPos] != 0)
+                ulPos += 1
+
+                atAttributes = []
+                while True:
+                    ulAttribute, ulPos = self.__read_uleb128(ulPos)
+                    ulForm, ulPos = self.__read_uleb128(ulPos)
+                    if ulAttribute == 0 and ulForm == 0:
+                        break
+                    tImplicit = None
+                    if ulForm == DW_FORM_implicit_const:
+                        tImplicit, ulPos = self.__read_sleb128(ulPos)
+                    atAttributes.append((ulAttribute, ulForm, tImplicit))
+
+                atAbbrevs[ulCode] = (ulTag, fHasChildren, tuple(atAttributes))
+
+            # Units of one object file usually share the same table. Keep
+            # only a few tables to limit the memory usage.
+            if len(self.__atAbbrevTables) >= 16:
+                self.__atAbbrevTables.clear()
+            self.__atAbbrevTables[ulAbbrevOffset] = atAbbrevs
+
+        return atAbbrevs
+
+    def __get_fixed_size(self, tUnit, atAttributes):
+        # Get the size of all attributes if they all have a fixed size in
+        # this unit. Return None if at least one size depends on the data.
+        sizTotal = 0
+        for ulAttribute, ulForm, tImplicit in atAttributes:
+            sizForm = s_atFixedFormSizes.get(ulForm)
+            if sizForm is None:
+                if ulForm in s_astrOffsetForms:
+                    sizForm = tUnit.uiOffsetSize
+                elif ulForm == DW_FORM_addr:
+                    sizForm = tUnit.uiAddressSize
+                elif ulForm == DW_FORM_ref_addr:
+                    if tUnit.uiVersion == 2:
+                        sizForm = tUnit.uiAddressSize
+                    else:
+                        sizForm = tUnit.uiOffsetSize
+                else:
+                    return None
+            sizTotal += sizForm
+        return sizTotal
+
+    def __read_form(self, tUnit, ulForm, tImplicit, ulPos):
+        # Read one attribute value. Blocks are returned as a tuple with the
+        # start and end offset in the buffer, strings are resolved and all
+        # other values are returned as integers.
+        sizForm = s_atFixedFormSizes.get(ulForm)
+        if sizForm is not None:
+            if ulForm == DW_FORM_implicit_const:
+                return tImplicit, ulPos
+            elif ulForm == DW_FORM_flag_present:
+                return 1, ulPos
+            elif ulForm == DW_FORM_data16:
+                return None, ulPos + 16
+            tValue = self.__read_uint(ulPos, sizForm)
+            if ulForm in (
+                DW_FORM_strx1,
+                DW_FORM_strx2,
+                DW_FORM_strx3,
+                DW_FORM_strx4
+            ):
+                tValue = self.__get_str_index(tUnit, tValue)
+            return tValue, ulPos + sizForm
+
+        if ulForm == DW_FORM_sdata:
+            return self.__read_sleb128(ulPos)
+        elif ulForm in (
+            DW_FORM_udata,
+            DW_FORM_ref_udata,
+            DW_FORM_addrx,
+            DW_FORM_loclistx,
+            DW_FORM_rnglistx,
+            DW_FORM_GNU_addr_index
+        ):
+            return self.__read_uleb128(ulPos)
+        elif ulForm == DW_FORM_string:
+            return self.__read_cstring(ulPos, tUnit.ulEnd)
+        elif ulForm == DW_FORM_strp:
+            ulOffset = self.__read_uint(ulPos, tUnit.uiOffsetSize)
+            return (
+                self.__get_string('.debug_str', ulOffset),
+                ulPos + tUnit.uiOffsetSize
+            )
+        elif ulForm == DW_FORM_line_strp:
+            ulOffset = self.__read_uint(ulPos, tUnit.uiOffsetSize)
+            return (
+                self.__get_string('.debug_line_str', ulOffset),
+                ulPos + tUnit.uiOffsetSize
+            )
+        elif ulForm in (DW_FORM_strx, DW_FORM_GNU_str_index):
+            ulIndex, ulPos = self.__read_uleb128(ulPos)
+            return self.__get_str_index(tUnit, ulIndex), ulPos
+        elif ulForm in s_astrOffsetForms:
+            return (
+                self.__read_uint(ulPos, tUnit.uiOffsetSize),
+                ulPos + tUnit.uiOffsetSize
+            )
+        elif ulForm == DW_FORM_addr:
+            return (
+                self.__read_uint(ulPos, tUnit.uiAddressSize),
+                ulPos + tUnit.uiAddressSize
+            )
+        elif ulForm == DW_FORM_ref_addr:
+            if tUnit.uiVersion == 2:
+                sizRef = tUnit.uiAddressSize
+            else:
+                sizRef = tUnit.uiOffsetSize
+            return self.__read_uint(ulPos, sizRef), ulPos + sizRef
+        elif ulForm == DW_FORM_block1:
+            sizBlock = self.__tBuffer[ulPos]
+            ulPos += 1
+        elif ulForm == DW_FORM_block2:
+            sizBlock = self.__read_uint(ulPos, 2)
+            ulPos += 2
+        elif ulForm == DW_FORM_block4:
+            sizBlock = self.__read_uint(ulPos, 4)
+            ulPos += 4
+        elif ulForm in (DW_FORM_block, DW_FORM_exprloc):
+            sizBlock, ulPos = self.__read_uleb128(ulPos)
+        elif ulForm == DW_FORM_indirect:
+            ulForm, ulPos = self.__read_uleb128(ulPos)
+            return self.__read_form(tUnit, ulForm, None, ulPos)
+        else:
+            raise Exception('Unknown DWARF form: 0x%x' % ulForm)
+
+        return (ulPos, ulPos + sizBlock), ulPos + sizBlock
+
+    def __get_string(self, strSection, ulOffset):
+        tSection = self.__get_section(strSection)
+        if tSection is None:
+            raise Exception('The ELF file has no "%s".' % strSection)
+        ulStart, ulEnd = tSection
+        return self.__read_cstring(ulStart + ulOffset, ulEnd)[0]
+
+    def __get_str_index(self, tUnit, ulIndex):
+        tSection = self.__get_section('.debug_str_offsets')
+        if tSection is None:
+            raise Exception('The ELF file has no ".debug_str_offsets".')
+        ulBase = tUnit.ulStrOffsetsBase
+        if ulBase is None:
+            # Skip the header of the first table.
+            ulBase = 2 * tUnit.uiOffsetSize
+        ulOffset = self.__read_uint(
+            tSection[0] + ulBase + ulIndex * tUnit.uiOffsetSize,
+            tUnit.uiOffsetSize
+        )
+        return self.__get_string('.debug_str', ulOffset)
+
+    def __read_attributes(self, tUnit, atAttributes, ulPos, atWanted):
+        # Read all attributes of a DIE. Only the values of the attributes in
+        # atWanted are decoded.
+        atValues = dict({})
+        for ulAttribute, ulForm, tImplicit in atAttributes:
+            if ulAttribute in atWanted:
+                tValue, ulPos = self.__read_form(
+                    tUnit,
+                    ulForm,
+                    tImplicit,
+                    ulPos
+                )
+                atValues[ulAttribute] = (ulForm, tValue)
+            else:
+                sizForm = s_atFixedFormSizes.get(ulForm)
+                if sizForm is not None:
+                    ulPos += sizForm
+                else:
+                    tValue, ulPos = self.__read_form(
+                        tUnit,
+                        ulForm,
+                        tImplicit,
+                        ulPos
+                    )
+        return atValues, ulPos
+
+    def __iter_units(self):
+        tSection = self.__get_section('.debug_info')
+        if tSection is None:
+            return
+        ulPos, ulSectionEnd = tSection
+
+        while ulPos < ulSectionEnd:
+            tUnit = DwarfUnit()
+
+            ulLength = self.__read_uint(ulPos, 4)
+            ulPos += 4
+            tUnit.uiOffsetSize = 4
+            if ulLength == 0xffffffff:
+                ulLength = self.__read_uint(ulPos, 8)
+                ulPos += 8
+                tUnit.uiOffsetSize = 8
+            tUnit.ulEnd = ulPos + ulLength
+            if tUnit.ulEnd > ulSectionEnd:
+                raise Exception('The unit exceeds the ".debug_info".')
+
+            tUnit.uiVersion = self.__read_uint(ulPos, 2)
+            ulPos += 2
+            if tUnit.uiVersion < 2 or tUnit.uiVersion > 5:
+                raise Exception(
+                    'Unsupported DWARF version: %d' % tUnit.uiVersion
+                )
+
+            if tUnit.uiVersion >= 5:
+                ucUnitType = self.__tBuffer[ulPos]
+                tUnit.uiAddressSize = self.__tBuffer[ulPos + 1]
+                ulPos += 2
+                ulAbbrevOffset = self.__read_uint(ulPos, tUnit.uiOffsetSize)
+                ulPos += tUnit.uiOffsetSize
+                if ucUnitType in (DW_UT_skeleton, DW_UT_split_compile):
+                    ulPos += 8
+                elif ucUnitType in (DW_UT_type, DW_UT_split_type):
+                    ulPos += 8 + tUnit.uiOffsetSize
+            else:
+                ulAbbrevOffset = self.__read_uint(ulPos, tUnit.uiOffsetSize)
+                ulPos += tUnit.uiOffsetSize
+                tUnit.uiAddressSize = self.__tBuffer[ulPos]
+                ulPos += 1
+
+            tUnit.ulDieStart = ulPos
+            tUnit.atAbbrevs = self.__get_abbrevs(ulAbbrevOffset)
+
+            yield tUnit
+
+            ulPos = tUnit.ulEnd
+
+    def iter_debug_symbols(self):
+        """Iterate over all symbols which can be derived from the types.
+
+        This yields tuples with the name and the value of each enumerator,
+        the size of each structure as "SIZEOF_<struct>" and the offset of
+        each structure member as "OFFSETOF_<struct>_<member>". Just like the
+        old readelf based parser, the contents of structures are not
+        searched for further enumerations or structures.
+        """
+        atWantedEnumerator = frozenset([DW_AT_name, DW_AT_const_value])
+        atWantedStructure = frozenset([
+            DW_AT_name,
+            DW_AT_byte_size,
+            DW_AT_declaration,
+        ])
+        atWantedMember = frozenset([DW_AT_name, DW_AT_data_member_location])
+        atWantedUnit = frozenset([DW_AT_str_offsets_base])
+
+        for tUnit in self.__iter_units():
+            atAbbrevs = tUnit.atAbbrevs
+            atFixedSizes = dict({})
+            ulPos = tUnit.ulDieStart
+            ulEnd = tUnit.ulEnd
+
+            iDepth = 0
+            # This is the depth of the structure which is processed right
+            # now or -1 if no structure is active.
+            iStructureDepth = -1
+            # This is the name of the active structure or None if the
+            # members should be ignored.
+            strStructureName = None
+
+            while ulPos < ulEnd:
+                ulCode, ulPos = self.__read_uleb128(ulPos)
+                if ulCode == 0:
+                    iDepth -= 1
+                    continue
+
+                tAbbrev = atAbbrevs.get(ulCode)
+                if tAbbrev is None:
+                    raise Exception('Unknown abbreviation code %d.' % ulCode)
+                ulTag, fHasChildren, atAttributes = tAbbrev
+
+                iDieDepth = iDepth
+                if fHasChildren is True:
+                    iDepth += 1
+
+                if iStructureDepth != -1 and iDieDepth <= iStructureDepth:
+                    # This DIE is not part of the structure anymore.
+                    iStructureDepth = -1
+                    strStructureName = None
+
+                if iDieDepth == 0:
+                    # This is the unit DIE.
+                    atValues, ulPos = self.__read_attributes(
+                        tUnit,
+                        atAttributes,
+                        ulPos,
+                        atWantedUnit
+                    )
+                    if DW_AT_str_offsets_base in atValues:
+                        tUnit.ulStrOffsetsBase = \
+                            atValues[DW_AT_str_offsets_base][1]
+                    continue
+
+                atWanted = None
+                if iStructureDepth != -1:
+                    if(
+                        ulTag == DW_TAG_member and
+                        iDieDepth == iStructureDepth + 1 and
+                        strStructureName is not None
+                    ):
+                        atWanted = atWantedMember
+                elif ulTag == DW_TAG_enumerator:
+                    atWanted = atWantedEnumerator
+                elif ulTag == DW_TAG_structure_type:
+                    atWanted = atWantedStructure
+
+                if atWanted is None:
+                    # Skip the DIE as fast as possible.
+                    sizFixed = atFixedSizes.get(ulCode, -1)
+                    if sizFixed == -1:
+                        sizFixed = self.__get_fixed_size(tUnit, atAttributes)
+                        atFixedSizes[ulCode] = sizFixed
+                    if sizFixed is not None:
+                        ulPos += sizFixed
+                    else:
+                        atValues, ulPos = self.__read_attributes(
+                            tUnit,
+                            atAttributes,
+                            ulPos,
+                            ()
+                        )
+                    continue
+
+                atValues, ulPos = self.__read_attributes(
+                    tUnit,
+                    atAttributes,
+                    ulPos,
+                    atWanted
+                )
+                tName = atValues.get(DW_AT_name, (None, None))[1]
+
+                if ulTag == DW_TAG_enumerator:
+                    if DW_AT_const_value in atValues and tName is not None:
+                        ulForm, tValue = atValues[DW_AT_const_value]
+                        if isinstance(tValue, int):
+                            yield (tName, tValue)
+
+                elif ulTag == DW_TAG_structure_type:
+                    iStructureDepth = iDieDepth
+                    strStructureName = None
+                    fIsDeclaration = (
+                        DW_AT_declaration in atValues and
+                        atValues[DW_AT_declaration][1] != 0
+                    )
+                    # A declaration is ignored. There is a complete
+                    # definition somewhere else.
+                    if tName is not None and fIsDeclaration is False:
+                        strStructureName = tName
+                        tSize = atValues.get(DW_AT_byte_size, (None, None))[1]
+                        if isinstance(tSize, int):
+                            yield (
+                                'SIZEOF_' + tName,
+                                tSize
+                            )
+
+                else:
+                    # This is a member of the active structure.
+                    tLocation = atValues.get(DW_AT_data_member_location)
+                    if tName is not None and tLocation is not None:
+                        ulOffset = self.__get_member_offset(*tLocation)
+                        if ulOffset is not None:
+                            yield (
+                                'OFFSETOF_%s_%s' % (strStructureName, tName),
+                                ulOffset
+                            )
+
+    def __get_member_offset(self, ulForm, tValue):
+        # The location is either a constant or a location expression.
+        if isinstance(tValue, tuple):
+            ulStart, ulEnd = tValue
+            if(
+                ulStart < ulEnd and
+                self.__tBuffer[ulStart] == DW_OP_plus_uconst
+            ):
+                ulOffset, ulPos = self.__read_uleb128(ulStart + 1)
+                if ulPos == ulEnd:
+                    return ulOffset
+            return None
+        return tValue
+
+    def __split_macro(self, strMacro):
+        tMatch = s_reMacro.match(strMacro)
+        if tMatch is None:
+            return None
+        return (tMatch.group(1), tMatch.group(2))
+
+    def __iter_macinfo(self, ulPos, ulEnd):
+        tBuffer = self.__tBuffer
+        while ulPos < ulEnd:
+            ucType = tBuffer[ulPos]
+            ulPos += 1
+            if ucType == 0:
+                # This is the end of one unit. The next one follows.
+                continue
+            elif ucType in (DW_MACINFO_define, DW_MACINFO_undef):
+                ulLine, ulPos = self.__read_uleb128(ulPos)
+                strMacro, ulPos = self.__read_cstring(ulPos, ulEnd)
+                if ucType == DW_MACINFO_define:
+                    tMacro = self.__split_macro(strMacro)
+                    if tMacro is not None:
+                        yield tMacro
+            elif ucType == DW_MACINFO_start_file:
+                ulLine, ulPos = self.__read_uleb128(ulPos)
+                ulFile, ulPos = self.__read_uleb128(ulPos)
+            elif ucType == DW_MACINFO_end_file:
+                pass
+            elif ucType == DW_MACINFO_vendor_ext:
+                ulConstant, ulPos = self.__read_uleb128(ulPos)
+                strDummy, ulPos = self.__read_cstring(ulPos, ulEnd)
+            else:
+                raise Exception('Unknown macinfo type: 0x%02x' % ucType)
+
+    def __skip_macro_operands(self, tUnit, aucForms, ulPos):
+        for ucForm in aucForms:
+            tValue, ulPos = self.__read_form(tUnit, ucForm, None, ulPos)
+        return ulPos
+
+    def __iter_macro(self, ulPos, ulEnd):
+        tBuffer = self.__tBuffer
+        while ulPos < ulEnd:
+            # Every unit starts with a header.
+            tUnit = DwarfUnit()
+            tUnit.uiVersion = self.__read_uint(ulPos, 2)
+            ucFlags = tBuffer[ulPos + 2]
+            ulPos += 3
+            if tUnit.uiVersion != 4 and tUnit.uiVersion != 5:
+                raise Exception(
+                    'Unsupported macro version: %d' % tUnit.uiVersion
+                )
+            tUnit.uiOffsetSize = 4
+            if (ucFlags & 0x01) != 0:
+                tUnit.uiOffsetSize = 8
+            tUnit.uiAddressSize = tUnit.uiOffsetSize
+            tUnit.ulEnd = ulEnd
+            if (ucFlags & 0x02) != 0:
+                # Skip the offset into the ".debug_line" section.
+                ulPos += tUnit.uiOffsetSize
+            atOperands = dict({})
+            if (ucFlags & 0x04) != 0:
+                ucCount = tBuffer[ulPos]
+                ulPos += 1
+                for uiIdx in range(ucCount):
+                    ucOpcode = tBuffer[ulPos]
+                    ulForms, ulPos = self.__read_uleb128(ulPos + 1)
+                    atOperands[ucOpcode] = bytearray(
+                        tBuffer[ulPos:ulPos + ulForms]
+                    )
+                    ulPos += ulForms
+
+            # Loop over all entries of the unit.
+            while ulPos < ulEnd:
+                ucOpcode = tBuffer[ulPos]
+                ulPos += 1
+                if ucOpcode == 0:
+                    break
+                elif ucOpcode in atOperands:
+                    ulPos = self.__skip_macro_operands(
+                        tUnit,
+                        atOperands[ucOpcode],
+                        ulPos
+                    )
+                elif ucOpcode in (DW_MACRO_define, DW_MACRO_undef):
+                    ulLine, ulPos = self.__read_uleb128(ulPos)
+                    strMacro, ulPos = self.__read_cstring(ulPos, ulEnd)
+                    if ucOpcode == DW_MACRO_define:
+                        tMacro = self.__split_macro(strMacro)
+                        if tMacro is not None:
+                            yield tMacro
+                elif ucOpcode in (DW_MACRO_define_strp, DW_MACRO_undef_strp):
+                    # These are "DW_MACRO_GNU_define_indirect" and
+                    # "DW_MACRO_GNU_undef_indirect" in the GNU extension.
+                    ulLine, ulPos = self.__read_uleb128(ulPos)
+                    ulOffset = self.__read_uint(ulPos, tUnit.uiOffsetSize)
+                    ulPos += tUnit.uiOffsetSize
+                    if ucOpcode == DW_MACRO_define_strp:
+                        tMacro = self.__split_macro(
+                            self.__get_string('.debug_str', ulOffset)
+                        )
+                        if tMacro is not None:
+                            yield tMacro
+                elif ucOpcode in (DW_MACRO_define_sup, DW_MACRO_undef_sup):
+                    # The string is in a supplementary file which is not
+                    # available here.
+                    ulLine, ulPos = self.__read_uleb128(ulPos)
+                    ulPos += tUnit.uiOffsetSize
+                elif ucOpcode in (DW_MACRO_define_strx, DW_MACRO_undef_strx):
+                    raise Exception(
+                        'Macros with string indices are not supported.'
+                    )
+                elif ucOpcode == DW_MACRO_start_file:
+                    ulLine, ulPos = self.__read_uleb128(ulPos)
+                    ulFile, ulPos = self.__read_uleb128(ulPos)
+                elif ucOpcode == DW_MACRO_end_file:
+                    pass
+                elif ucOpcode in (DW_MACRO_import, DW_MACRO_import_sup):
+                    # All imported units are part of the section and
+                    # decoded exactly once when the loop reaches them.
+                    ulPos += tUnit.uiOffsetSize
+                else:
+                    raise Exception('Unknown macro opcode: 0x%02x' % ucOpcode)
+
+    def iter_macro_definitions(self):
+        """Iterate over all macro definitions in the ELF file.
+
+        This yields tuples with the name and the value of each macro without
+        parameters. Both the ".debug_macinfo" section of DWARF 2 to 4 and
+        the ".debug_macro" section of DWARF 5 and the GNU extension are
+        decoded. Every unit is visited once, no matter how often it is
+        imported.
+        """
+        tSection = self.__get_section('.debug_macinfo')
+        if tSection is not None:
+            for tMacro in self.__iter_macinfo(*tSection):
+                yield tMacro
+
+        tSection = self.__get_section('.debug_macro')
+        if tSection is not None:
+            for tMacro in self.__iter_macro(*tSection):
+                yield tMacro
@@ -0,0 +1,674 @@
+# -*- coding: utf-8 -*-
+
+# ***************************************************************************
+# *   Copyright (C) 2019 by Hilscher GmbH                                   *
+# *   netXsupport@hilscher.com                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation; either version 2 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program; if not, write to the                         *
+# *   Free Software Foundation, Inc.,                                       *
+# *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+# ***************************************************************************
+
+
+import mmap
+import struct
+
+
+# Section header types.
+SHT_NULL = 0
+SHT_PROGBITS = 1
+SHT_SYMTAB = 2
+SHT_STRTAB = 3
+SHT_RELA = 4
+SHT_NOBITS = 8
+SHT_REL = 9
+SHT_DYNSYM = 11
+SHT_GROUP = 17
+SHT_SYMTAB_SHNDX = 18
+
+# Section header flags.
+SHF_WRITE = 0x1
+SHF_ALLOC = 0x2
+SHF_EXECINSTR = 0x4
+SHF_TLS = 0x400
+SHF_EXCLUDE = 0x80000000
+
+# Program header types.
+PT_LOAD = 1
+PT_TLS = 7
+
+# Special section indices.
+SHN_UNDEF = 0
+SHN_LORESERVE = 0xff00
+SHN_XINDEX = 0xffff
+
+# Symbol bindings, types and visibilities.
+STB_LOCAL = 0
+STB_GLOBAL = 1
+STB_WEAK = 2
+STV_DEFAULT = 0
+
+
+class ElfReader:
+    """Read the headers, sections and symbols of an ELF file without any
+    external tools.
+
+    The file is mapped into memory and only the requested parts are decoded.
+    Both ELF32 and ELF64 in little and big endian are supported.
+    """
+
+    # The name of the ELF file.
+    __strFileName = None
+
+    # The file object and the memory map of the complete file.
+    __tFile = None
+    __tMap = None
+
+    # This is True for ELF64 files.
+    __fIs64 = None
+
+    # The struct byte order prefix, either '<' or '>'.
+    __strEndian = None
+
+    # The entry point from the file header.
+    __ulEntry = None
+
+    # The machine from the file header.
+    __uiMachine = None
+
+    # The relevant fields of the file header as a dict.
+    __tHeader = None
+
+    # All section headers as a list of dicts.
+    __atSectionHeaders = None
+
+    # All program headers as a list of dicts.
+    __atProgramHeaders = None
+
+    # The index of the section name string table.
+    __uiShStrNdx = None
+
+    def __init__(self, strFileName):
+        self.__strFileName = strFileName
+
+        tFile = open(strFileName, 'rb')
+        try:
+            tMap = mmap.mmap(tFile.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, mmap.error):
+            tFile.close()
+            raise Exception(
+                'Failed to map "%s". It is not an ELF file.' % strFileName
+            )
+        self.__tFile = tFile
+        self.__tMap = tMap
+
+        try:
+            self.__parse_file_header()
+            self.__parse_section_headers()
+            self.__parse_program_headers()
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tExcType, tExcValue, tTraceback):
+        self.close()
+
+    def close(self):
+        if self.__tMap is not None:
+            self.__tMap.close()
+            self.__tMap = None
+        if self.__tFile is not None:
+            self.__tFile.close()
+            self.__tFile = None
+
+    def __unpack(self, strFormat, ulOffset):
+        strFormat = self.__strEndian + strFormat
+        if (ulOffset + struct.calcsize(strFormat)) > len(self.__tMap):
+            raise Exception(
+                'The ELF file "%s" is truncated.' % self.__strFileName
+            )
+        return struct.unpack_from(strFormat, self.__tMap, ulOffset)
+
+    def __parse_file_header(self):
+        tMap = self.__tMap
+        if len(tMap) < 16 or tMap[0:4] != b'\x7fELF':
+            raise Exception(
+                'The file "%s" is not an ELF file.' % self.__strFileName
+            )
+
+        ucClass, ucData = struct.unpack_from('BB', tMap, 4)
+        if ucClass == 1:
+            self.__fIs64 = False
+        elif ucClass == 2:
+            self.__fIs64 = True
+        else:
+            raise Exception('Unknown ELF class: %d' % ucClass)
+
+        if ucData == 1:
+            self.__strEndian = '<'
+        elif ucData == 2:
+            self.__strEndian = '>'
+        else:
+            raise Exception('Unknown ELF data encoding: %d' % ucData)
+
+        if self.__fIs64 is True:
+            (
+                uiType,
+                uiMachine,
+                ulVersion,
+                ulEntry,
+                ulPhOff,
+                ulShOff,
+                ulFlags,
+                uiEhSize,
+                uiPhEntSize,
+                uiPhNum,
+                uiShEntSize,
+                uiShNum,
+                uiShStrNdx
+            ) = self.__unpack('HHIQQQIHHHHHH', 16)
+        else:
+            (
+                uiType,
+                uiMachine,
+                ulVersion,
+                ulEntry,
+                ulPhOff,
+                ulShOff,
+                ulFlags,
+                uiEhSize,
+                uiPhEntSize,
+                uiPhNum,
+                uiShEntSize,
+                uiShNum,
+                uiShStrNdx
+            ) = self.__unpack('HHIIIIIHHHHHH', 16)
+
+        self.__uiMachine = uiMachine
+        self.__ulEntry = ulEntry
+
+        # The real number of sections and the string table index may be
+        # stored in the first section header.
+        if ulShOff != 0 and (uiShNum == 0 or uiShStrNdx == SHN_XINDEX):
+            tFirst = self.__read_section_header(ulShOff)
+            if uiShNum == 0:
+                uiShNum = tFirst['sh_size']
+            if uiShStrNdx == SHN_XINDEX:
+                uiShStrNdx = tFirst['sh_link']
+
+        self.__tHeader = dict({
+            'e_type': uiType,
+            'e_phoff': ulPhOff,
+            'e_shoff': ulShOff,
+            'e_phentsize': uiPhEntSize,
+            'e_phnum': uiPhNum,
+            'e_shentsize': uiShEntSize,
+            'e_shnum': uiShNum
+        })
+        self.__uiShStrNdx = uiShStrNdx
+
+    def __read_section_header(self, ulOffset):
+        if self.__fIs64 is True:
+            (
+                ulName,
+                ulType,
+                ulFlags,
+                ulAddr,
+                ulOffsetData,
+                ulSize,
+                ulLink,
+                ulInfo,
+                ulAlign,
+                ulEntSize
+            ) = self.__unpack('IIQQQQIIQQ', ulOffset)
+        else:
+            (
+                ulName,
+                ulType,
+                ulFlags,
+                ulAddr,
+                ulOffsetData,
+                ulSize,
+                ulLink,
+                ulInfo,
+                ulAlign,
+                ulEntSize
+            ) = self.__unpack('IIIIIIIIII', ulOffset)
+
+        return dict({
+            'sh_name': ulName,
+            'sh_type': ulType,
+            'sh_flags': ulFlags,
+            'sh_addr': ulAddr,
+            'sh_offset': ulOffsetData,
+            'sh_size': ulSize,
+            'sh_link': ulLink,
+            'sh_info': ulInfo,
+            'sh_addralign': ulAlign,
+            'sh_entsize': ulEntSize
+        })
+
+    def __parse_section_headers(self):
+        tHeader = self.__tHeader
+        atSectionHeaders = []
+        ulShOff = tHeader['e_shoff']
+        if ulShOff != 0:
+            for uiIdx in range(tHeader['e_shnum']):
+                atSectionHeaders.append(
+                    self.__read_section_header(
+                        ulShOff + uiIdx * tHeader['e_shentsize']
+                    )
+                )
+
+        # Resolve the section names.
+        if self.__uiShStrNdx < len(atSectionHeaders):
+            tStrTab = atSectionHeaders[self.__uiShStrNdx]
+            for tSection in atSectionHeaders:
+                tSection['name'] = self.__get_string(
+                    tStrTab,
+                    tSection['sh_name']
+                )
+        else:
+            for tSection in atSectionHeaders:
+                tSection['name'] = ''
+
+        for uiIdx, tSection in enumerate(atSectionHeaders):
+            tSection['index'] = uiIdx
+
+        self.__atSectionHeaders = atSectionHeaders
+
+    def __parse_program_headers(self):
+        tHeader = self.__tHeader
+        atProgramHeaders = []
+        ulPhOff = tHeader['e_phoff']
+        if ulPhOff != 0:
+            for uiIdx in range(tHeader['e_phnum']):
+                ulOffset = ulPhOff + uiIdx * tHeader['e_phentsize']
+                if self.__fIs64 is True:
+                    (
+                        ulType,
+                        ulFlags,
+                        ulOffsetData,
+                        ulVAddr,
+                        ulPAddr,
+                        ulFileSz,
+                        ulMemSz,
+                        ulAlign
+                    ) = self.__unpack('IIQQQQQQ', ulOffset)
+                else:
+                    (
+                        ulType,
+                        ulOffsetData,
+                        ulVAddr,
+                        ulPAddr,
+                        ulFileSz,
+                        ulMemSz,
+                        ulFlags,
+                        ulAlign
+                    ) = self.__unpack('IIIIIIII', ulOffset)
+                atProgramHeaders.append(dict({
+                    'p_type': ulType,
+                    'p_offset': ulOffsetData,
+                    'p_vaddr': ulVAddr,
+                    'p_paddr': ulPAddr,
+                    'p_filesz': ulFileSz,
+                    'p_memsz': ulMemSz,
+                    'p_flags': ulFlags,
+                    'p_align': ulAlign
+                }))
+        self.__atProgramHeaders = atProgramHeaders
+
+    def __get_string(self, tStrTab, ulIndex):
+        ulStart = tStrTab['sh_offset'] + ulIndex
+        ulEnd = tStrTab['sh_offset'] + tStrTab['sh_size']
+        if ulStart >= ulEnd:
+            return ''
+        ulTerm = self.__tMap.find(b'\0', ulStart, ulEnd)
+        if ulTerm == -1:
+            ulTerm = ulEnd
+        return self.__tMap[ulStart:ulTerm].decode('utf-8', 'replace')
+
+    def __get_lma(self, tSection):
+        # This follows the rules of the BFD library. The LMA of an
+        # allocated section is derived from the program header which
+        # contains the section.
+        ulLma = tSection['sh_addr']
+        if (tSection['sh_flags'] & SHF_ALLOC) == 0:
+            return ulLma
+
+        # If all physical addresses are 0 and there are several loadable
+        # segments, the physical addresses are not used at all.
+        fHasPAddr = False
+        uiLoadSegments = 0
+        for tPhdr in self.__atProgramHeaders:
+            if tPhdr['p_paddr'] != 0:
+                fHasPAddr = True
+                break
+            elif tPhdr['p_type'] == PT_LOAD and tPhdr['p_memsz'] != 0:
+                uiLoadSegments += 1
+        if fHasPAddr is False and uiLoadSegments > 1:
+            return ulLma
+
+        fIsLoad = (tSection['sh_type'] != SHT_NOBITS)
+        ulAddr = tSection['sh_addr']
+        ulSize = tSection['sh_size']
+        ulOffset = tSection['sh_offset']
+        for tPhdr in self.__atProgramHeaders:
+            if(
+                (
+                    tPhdr['p_type'] == PT_LOAD and
+                    (tSection['sh_flags'] & SHF_TLS) == 0
+                ) or tPhdr['p_type'] == PT_TLS
+            ):
+                fInVma = (
+                    ulAddr >= tPhdr['p_vaddr'] and
+                    (ulAddr + ulSize) <= (tPhdr['p_vaddr'] + tPhdr['p_memsz'])
+                )
+                if fIsLoad is True:
+                    fInSegment = (
+                        fInVma and
+                        ulOffset >= tPhdr['p_offset'] and
+                        (ulOffset + ulSize) <= (
+                            tPhdr['p_offset'] + tPhdr['p_filesz']
+                        )
+                    )
+                else:
+                    fInSegment = fInVma
+                if fInSegment is True:
+                    if fIsLoad is True:
+                        ulLma = (
+                            tPhdr['p_paddr'] + ulOffset - tPhdr['p_offset']
+                        )
+                    else:
+                        ulLma = tPhdr['p_paddr'] + ulAddr - tPhdr['p_vaddr']
+                    break
+
+        return ulLma
+
+    def __get_flags(self, tSection):
+        # Translate the section flags to the BFD names used by objdump.
+        strName = tSection['name']
+        ulType = tSection['sh_type']
+        ulFlags = tSection['sh_flags']
+
+        fContents = (ulType != SHT_NOBITS)
+        fAlloc = ((ulFlags & SHF_ALLOC) != 0)
+        fLoad = fAlloc and fContents
+
+        # Does a relocation section point to this section?
+        fReloc = False
+        for tOther in self.__atSectionHeaders:
+            if(
+                tOther['sh_type'] in (SHT_REL, SHT_RELA) and
+                (tOther['sh_flags'] & SHF_ALLOC) == 0 and
+                tOther['sh_info'] == tSection['index']
+            ):
+                fReloc = True
+                break
+
+        astrFlags = []
+        if fContents is True:
+            astrFlags.append('CONTENTS')
+        if fAlloc is True:
+            astrFlags.append('ALLOC')
+        if fLoad is True:
+            astrFlags.append('LOAD')
+        if fReloc is True:
+            astrFlags.append('RELOC')
+        if (ulFlags & SHF_WRITE) == 0:
+            astrFlags.append('READONLY')
+        if (ulFlags & SHF_EXECINSTR) != 0:
+            astrFlags.append('CODE')
+        elif fLoad is True:
+            astrFlags.append('DATA')
+        if(
+            strName.startswith('.debug') or
+            strName.startswith('.zdebug') or
+            strName.startswith('.gnu.linkonce.wi.') or
+            strName.startswith('.line') or
+            strName.startswith('.stab')
+        ):
+            astrFlags.append('DEBUGGING')
+        if (ulFlags & SHF_EXCLUDE) != 0:
+            astrFlags.append('EXCLUDE')
+        if ulType == SHT_GROUP:
+            astrFlags.append('GROUP')
+        if (ulFlags & SHF_TLS) != 0:
+            astrFlags.append('THREAD_LOCAL')
+        return astrFlags
+
+    def __is_bfd_section(self, tSection):
+        # BFD does not show the symbol tables, their string tables and the
+        # section name string table.
+        ulType = tSection['sh_type']
+        uiIdx = tSection['index']
+        if uiIdx == 0 or ulType == SHT_NULL:
+            return False
+        if ulType in (SHT_SYMTAB, SHT_SYMTAB_SHNDX):
+            return False
+        if ulType == SHT_STRTAB:
+            if uiIdx == self.__uiShStrNdx:
+                return False
+            for tOther in self.__atSectionHeaders:
+                if(
+                    tOther['sh_type'] == SHT_SYMTAB and
+                    tOther['sh_link'] == uiIdx
+                ):
+                    return False
+        if ulType in (SHT_REL, SHT_RELA):
+            # Relocations for other sections are hidden, just like BFD
+            # attaches them to their target.
+            if (tSection['sh_flags'] & SHF_ALLOC) == 0:
+                return False
+        return True
+
+    def get_buffer(self):
+        # The buffer is only valid until the reader is closed.
+        return self.__tMap
+
+    def get_endian(self):
+        return self.__strEndian
+
+    def get_type(self):
+        return self.__tHeader['e_type']
+
+    def get_entry(self):
+        return self.__ulEntry
+
+    def get_machine(self):
+        return self.__uiMachine
+
+    def is_64bit(self):
+        return self.__fIs64
+
+    def get_section_headers(self):
+        return self.__atSectionHeaders
+
+    def get_program_headers(self):
+        return self.__atProgramHeaders
+
+    def get_section_by_name(self, strName):
+        tResult = None
+        for tSection in self.__atSectionHeaders:
+            if tSection['name'] == strName:
+                tResult = tSection
+                break
+        return tResult
+
+    def get_section_data(self, tSection):
+        if tSection['sh_type'] == SHT_NOBITS:
+            return b''
+        ulStart = tSection['sh_offset']
+        ulEnd = ulStart + tSection['sh_size']
+        if ulEnd > len(self.__tMap):
+            raise Exception(
+                'Section "%s" exceeds the ELF file "%s".' % (
+                    tSection['name'],
+                    self.__strFileName
+                )
+            )
+        return self.__tMap[ulStart:ulEnd]
+
+    def get_segment_table(self):
+        """Get all sections in the same form as "objdump -h" lists them.
+
+        Each entry is a dict with the keys 'idx', 'name', 'size', 'vma',
+        'lma', 'file_off', 'align' and 'flags'.
+        """
+        atSegments = []
+        uiIdx = 0
+        for tSection in self.__atSectionHeaders:
+            if self.__is_bfd_section(tSection) is True:
+                atSegments.append(dict({
+                    'idx':      uiIdx,
+                    'name':     tSection['name'],
+                    'size':     tSection['sh_size'],
+                    'vma':      tSection['sh_addr'],
+                    'lma':      self.__get_lma(tSection),
+                    'file_off': tSection['sh_offset'],
+                    'align':    max(tSection['sh_addralign'], 1),
+                    'flags':    self.__get_flags(tSection)
+                }))
+                uiIdx += 1
+        return atSegments
+
+    def get_binary(self, astrSectionNames=None):
+        """Build a flat binary image like "objcopy -O binary" does.
+
+        All loadable sections are placed at their LMA relative to the
+        lowest LMA. Gaps between the sections are filled with 0. If
+        astrSectionNames is not None or empty, only the named sections are
+        considered.
+        """
+        atLoadable = []
+        for tSection in self.__atSectionHeaders:
+            if self.__is_bfd_section(tSection) is not True:
+                continue
+            if(
+                astrSectionNames and
+                tSection['name'] not in astrSectionNames
+            ):
+                continue
+            if(
+                tSection['sh_type'] == SHT_NOBITS or
+                (tSection['sh_flags'] & SHF_ALLOC) == 0 or
+                tSection['sh_size'] == 0
+            ):
+                continue
+            atLoadable.append((self.__get_lma(tSection), tSection))
+
+        if len(atLoadable) == 0:
+            return b''
+
+        ulLow = min([ulLma for ulLma, tSection in atLoadable])
+        ulHigh = max([
+            ulLma + tSection['sh_size'] for ulLma, tSection in atLoadable
+        ])
+
+        aucImage = bytearray(ulHigh - ulLow)
+        tImage = memoryview(aucImage)
+        tMap = self.__tMap
+        for ulLma, tSection in atLoadable:
+            ulOffset = ulLma - ulLow
+            ulSize = tSection['sh_size']
+            ulFileOffset = tSection['sh_offset']
+            if (ulFileOffset + ulSize) > len(tMap):
+                raise Exception(
+                    'Section "%s" exceeds the ELF file "%s".' % (
+                        tSection['name'],
+                        self.__strFileName
+                    )
+                )
+            tImage[ulOffset:ulOffset + ulSize] = tMap[
+                ulFileOffset:ulFileOffset + ulSize
+            ]
+        tImage.release()
+
+        return bytes(aucImage)
+
+    def iter_symbols(self):
+        """Iterate over all symbols in the dynamic and static symbol table.
+
+        Each symbol is a dict with the keys 'name', 'value', 'size', 'type',
+        'bind', 'visibility' and 'shndx'.
+        """
+        atSectionHeaders = self.__atSectionHeaders
+        for tSymTab in atSectionHeaders:
+            ulType = tSymTab['sh_type']
+            if ulType != SHT_DYNSYM and ulType != SHT_SYMTAB:
+                continue
+
+            if tSymTab['sh_link'] >= len(atSectionHeaders):
+                raise Exception('Invalid string table for symbol table.')
+            tStrTab = atSectionHeaders[tSymTab['sh_link']]
+
+            # Look for an extended section index table.
+            tShndxData = None
+            for tSection in atSectionHeaders:
+                if(
+                    tSection['sh_type'] == SHT_SYMTAB_SHNDX and
+                    tSection['sh_link'] == tSymTab['index']
+                ):
+                    tShndxData = tSection
+                    break
+
+            if self.__fIs64 is True:
+                strFormat = 'IBBHQQ'
+            else:
+                strFormat = 'IIIBBH'
+            sizEntry = struct.calcsize(self.__strEndian + strFormat)
+            ulEntSize = tSymTab['sh_entsize']
+            if ulEntSize == 0:
+                ulEntSize = sizEntry
+            ulStart = tSymTab['sh_offset']
+            uiCount = tSymTab['sh_size'] // ulEntSize
+            for uiIdx in range(uiCount):
+                ulOffset = ulStart + uiIdx * ulEntSize
+                if self.__fIs64 is True:
+                    (
+                        ulName,
+                        ucInfo,
+                        ucOther,
+                        uiShndx,
+                        ulValue,
+                        ulSize
+                    ) = self.__unpack(strFormat, ulOffset)
+                else:
+                    (
+                        ulName,
+                        ulValue,
+                        ulSize,
+                        ucInfo,
+                        ucOther,
+                        uiShndx
+                    ) = self.__unpack(strFormat, ulOffset)
+
+                if uiShndx == SHN_XINDEX and tShndxData is not None:
+                    uiShndx = self.__unpack(
+                        'I',
+                        tShndxData['sh_offset'] + 4 * uiIdx
+                    )[0]
+
+                yield dict({
+                    'name': self.__get_string(tStrTab, ulName),
+                    'value': ulValue,
+                    'size': ulSize,
+                    'type': ucInfo & 0x0f,
+                    'bind': ucInfo >> 4,
+                    'visibility': ucOther & 0x03,
+                    'shndx': uiShndx
+                })
@@ -21,13 +21,20 @@
 # ***************************************************************************
 
 
+import collections
+import copy
 import os
 import re
 import subprocess
+import tempfile
+import threading
 
 # NOTE: this is only for debug.
 import datetime
 
+import dwarf_reader
+import elf_reader
+
 
 def run_cmd(aCmd, stdout=subprocess.PIPE):
     strOutput = None
@@ -42,7 +49,165 @@ def run_cmd(aCmd, stdout=subprocess.PIPE):
     return strOutput
 
 
-def get_segment_table(env, strFileName, astrSegmentsToConsider=None):
+class ElfCache:
+    """Memoize the results of the ELF queries for the whole process.
+
+    An entry is identified by the path, the size and the modification time
+    of the ELF file and the tool which produced the result. This way a
+    rebuilt ELF is never mixed up with an old one. The least recently used
+    files are dropped if there are more than the configured number of
+    entries.
+    """
+
+    # All cached files. The key is (path, size, mtime_ns, tool), the value
+    # is a dictionary with the results of the different queries.
+    __atEntries = None
+
+    # The maximum number of files in the cache.
+    __uiMaxEntries = None
+
+    # The statistics.
+    __ulHits = None
+    __ulMisses = None
+    __ulEvictions = None
+
+    # SCons runs actions in parallel threads with "-j".
+    __tLock = None
+
+    def __init__(self, uiMaxEntries=64):
+        self.__atEntries = collections.OrderedDict()
+        self.__uiMaxEntries = uiMaxEntries
+        self.__ulHits = 0
+        self.__ulMisses = 0
+        self.__ulEvictions = 0
+        self.__tLock = threading.Lock()
+
+    def __get_key(self, strFileName, strTool):
+        tStat = os.stat(strFileName)
+        ulMTime = getattr(tStat, 'st_mtime_ns', None)
+        if ulMTime is None:
+            ulMTime = int(tStat.st_mtime * 1000000000)
+        return (os.path.abspath(strFileName), tStat.st_size, ulMTime, strTool)
+
+    def set_max_entries(self, uiMaxEntries):
+        with self.__tLock:
+            self.__uiMaxEntries = uiMaxEntries
+            self.__evict()
+
+    def __evict(self):
+        while len(self.__atEntries) > self.__uiMaxEntries:
+            self.__atEntries.popitem(last=False)
+            self.__ulEvictions += 1
+
+    def get(self, strFileName, strTool, strKind, fnCreate):
+        tKey = self.__get_key(strFileName, strTool)
+        with self.__tLock:
+            atEntry = self.__atEntries.pop(tKey, None)
+            if atEntry is not None:
+                # Move the file to the end of the LRU list.
+                self.__atEntries[tKey] = atEntry
+                if strKind in atEntry:
+                    self.__ulHits += 1
+                    return copy.deepcopy(atEntry[strKind])
+            self.__ulMisses += 1
+
+        tResult = fnCreate()
+
+        with self.__tLock:
+            atEntry = self.__atEntries.pop(tKey, None)
+            if atEntry is None:
+                # Remove all older versions of the same file.
+                for tOldKey in list(self.__atEntries.keys()):
+                    if tOldKey[0] == tKey[0] and tOldKey[3] == tKey[3]:
+                        del self.__atEntries[tOldKey]
+                atEntry = dict({})
+            atEntry[strKind] = tResult
+            self.__atEntries[tKey] = atEntry
+            self.__evict()
+
+        return copy.deepcopy(tResult)
+
+    def clear(self):
+        with self.__tLock:
+            self.__atEntries.clear()
+
+    def get_statistics(self):
+        with self.__tLock:
+            return dict({
+                'hits': self.__ulHits,
+                'misses': self.__ulMisses,
+                'evictions': self.__ulEvictions,
+                'entries': len(self.__atEntries)
+            })
+
+
+# This is the cache for all ELF files in this process.
+s_tElfCache = ElfCache()
+
+
+def set_cache_size(uiMaxEntries):
+    s_tElfCache.set_max_entries(uiMaxEntries)
+
+
+def get_cache_statistics():
+    return s_tElfCache.get_statistics()
+
+
+def print_cache_statistics():
+    tStatistics = s_tElfCache.get_statistics()
+    ulLookups = tStatistics['hits'] + tStatistics['misses']
+    if ulLookups != 0:
+        print(
+            'ELF cache: %d lookups, %d hits, %d misses, %d evictions.' % (
+                ulLookups,
+                tStatistics['hits'],
+                tStatistics['misses'],
+                tStatistics['evictions']
+            )
+        )
+
+
+def __use_native_reader(env):
+    # The native ELF reader is used by default. Set "ELF_SUPPORT_NATIVE" to
+    # False in the environment to use the external tools instead.
+    fNative = True
+    if 'ELF_SUPPORT_NATIVE' in env:
+        fNative = bool(env['ELF_SUPPORT_NATIVE'])
+    return fNative
+
+
+def __get_tool_id(env, strToolKey):
+    # The native reader produces the same results for all tools.
+    strTool = 'native'
+    if __use_native_reader(env) is not True:
+        strTool = env[strToolKey]
+    return strTool
+
+
+def __open_native_reader(env, strFileName):
+    # Open the ELF file with the native reader. Return None if the reader is
+    # disabled or can not handle the file. The caller falls back to the
+    # external tools in this case.
+    tReader = None
+    if __use_native_reader(env) is True:
+        try:
+            tReader = elf_reader.ElfReader(strFileName)
+        except Exception as e:
+            print('Failed to read "%s" with the native ELF reader: %s' % (
+                strFileName,
+                str(e)
+            ))
+            print('Falling back to the external tools.')
+    return tReader
+
+
+def __get_segment_table(env, strFileName):
+    tReader = __open_native_reader(env, strFileName)
+    if tReader is not None:
+        with tReader:
+            atSegments = tReader.get_segment_table()
+        return atSegments
+
     atSegments = []
     aCmd = [env['OBJDUMP'], '-h', '-w', strFileName]
     strOutput = run_cmd(aCmd)
@@ -58,23 +223,36 @@ def get_segment_table(env, strFileName, astrSegmentsToConsider=None):
         r'[ \t]+([a-zA-Z ,]+)',
         strOutput
     ):
-        strName = match_obj.group(2)
+        uiAlign = eval(match_obj.group(7))
+        astrFlags = match_obj.group(8).split(', ')
+        atSegments.append(dict({
+            'idx':      int(match_obj.group(1)),
+            'name':     match_obj.group(2),
+            'size':     int(match_obj.group(3), 16),
+            'vma':      int(match_obj.group(4), 16),
+            'lma':      int(match_obj.group(5), 16),
+            'file_off': int(match_obj.group(6), 16),
+            'align':    uiAlign,
+            'flags':    astrFlags
+        }))
+    return atSegments
+
+
+def get_segment_table(env, strFileName, astrSegmentsToConsider=None):
+    atAllSegments = s_tElfCache.get(
+        strFileName,
+        __get_tool_id(env, 'OBJDUMP'),
+        'segments',
+        lambda: __get_segment_table(env, strFileName)
+    )
+
+    atSegments = []
+    for tSegment in atAllSegments:
         if(
             astrSegmentsToConsider is None or
-            strName in astrSegmentsToConsider
+            tSegment['name'] in astrSegmentsToConsider
         ):
-            uiAlign = eval(match_obj.group(7))
-            astrFlags = match_obj.group(8).split(', ')
-            atSegments.append(dict({
-                'idx':      int(match_obj.group(1)),
-                'name':     strName,
-                'size':     int(match_obj.group(3), 16),
-                'vma':      int(match_obj.group(4), 16),
-                'lma':      int(match_obj.group(5), 16),
-                'file_off': int(match_obj.group(6), 16),
-                'align':    uiAlign,
-                'flags':    astrFlags
-            }))
+            atSegments.append(tSegment)
     return atSegments
 
 
@@ -94,7 +272,22 @@ def segment_is_loadable(tSegment):
     )
 
 
-def get_symbol_table(env, strFileName):
+def __get_symbol_table(env, strFileName):
+    tReader = __open_native_reader(env, strFileName)
+    if tReader is not None:
+        atSymbols = dict({})
+        with tReader:
+            for tSymbol in tReader.iter_symbols():
+                # Only global symbols defined in a regular section are used.
+                uiShndx = tSymbol['shndx']
+                if(
+                    tSymbol['bind'] == elf_reader.STB_GLOBAL and
+                    uiShndx != elf_reader.SHN_UNDEF and
+                    uiShndx < elf_reader.SHN_LORESERVE
+                ):
+                    atSymbols[tSymbol['name']] = tSymbol['value']
+        return atSymbols
+
     aCmd = [env['READELF'], '--symbols', '--wide', strFileName]
     strOutput = run_cmd(aCmd)
 
@@ -121,6 +314,15 @@ def get_symbol_table(env, strFileName):
     return atSymbols
 
 
+def get_symbol_table(env, strFileName):
+    return s_tElfCache.get(
+        strFileName,
+        __get_tool_id(env, 'READELF'),
+        'symbols',
+        lambda: __get_symbol_table(env, strFileName)
+    )
+
+
 def get_debug_structure(env, strFileName):
     aCmd = [env['READELF'], '--debug-dump=info', strFileName]
     proc = subprocess.Popen(aCmd, stdout=subprocess.PIPE)
@@ -276,14 +478,68 @@ def __iter_debug_info(tNode, atDebugInfo, atSymbols):
             __iter_debug_info(tChild, atDebugInfo, atSymbols)
 
 
-def get_debug_symbols(env, strFileName):
+def __get_debug_symbols(env, strFileName):
+    tReader = __open_native_reader(env, strFileName)
+    if tReader is not None:
+        try:
+            with tReader:
+                tDwarf = dwarf_reader.DwarfReader(tReader)
+                atAllSymbols = dict(tDwarf.iter_debug_symbols())
+            return atAllSymbols
+        except Exception as e:
+            print('Failed to decode the debug information of "%s": %s' % (
+                strFileName,
+                str(e)
+            ))
+            print('Falling back to the external tools.')
+
     atDebugInfo = get_debug_structure(env, strFileName)
     atAllSymbols = dict({})
     __iter_debug_info(atDebugInfo, atDebugInfo, atAllSymbols)
     return atAllSymbols
 
 
-def get_macro_definitions(env, strFileName):
+def get_debug_symbols(env, strFileName):
+    return s_tElfCache.get(
+        strFileName,
+        __get_tool_id(env, 'READELF'),
+        'debug_symbols',
+        lambda: __get_debug_symbols(env, strFileName)
+    )
+
+
+def __merge_macro(atMergedMacros, strName, strValue):
+    # Does the macro already exist?
+    if strName in atMergedMacros:
+        # Yes, it exists already. Is the value the same?
+        if(
+            atMergedMacros[strName] is not None and
+            atMergedMacros[strName] != strValue
+        ):
+            # The macro exists more than one time with different
+            # values. Now that's a problem.
+            atMergedMacros[strName] = None
+    else:
+        atMergedMacros[strName] = strValue
+
+
+def __get_macro_definitions(env, strFileName):
+    tReader = __open_native_reader(env, strFileName)
+    if tReader is not None:
+        try:
+            atMergedMacros = dict({})
+            with tReader:
+                tDwarf = dwarf_reader.DwarfReader(tReader)
+                for strName, strValue in tDwarf.iter_macro_definitions():
+                    __merge_macro(atMergedMacros, strName, strValue)
+            return atMergedMacros
+        except Exception as e:
+            print('Failed to decode the macros of "%s": %s' % (
+                strFileName,
+                str(e)
+            ))
+            print('Falling back to the external tools.')
+
     aCmd = [env['READELF'], '--debug-dump=macro', strFileName]
     proc = subprocess.Popen(aCmd, stdout=subprocess.PIPE)
     strOutput = proc.communicate()[0].decode("utf-8", "replace")
@@ -316,19 +572,7 @@ def get_macro_definitions(env, strFileName):
             if tObj is not None:
                 strName = tObj.group(1)
                 strValue = tObj.group(2)
-
-                # Does the macro already exist?
-                if strName in atMergedMacros:
-                    # Yes, it exists already. Is the value the same?
-                    if(
-                        atMergedMacros[strName] is not None and
-                        atMergedMacros[strName] != strValue
-                    ):
-                        # The macro exists more than one time with different
-                        # values. Now that's a problem.
-                        atMergedMacros[strName] = None
-                else:
-                    atMergedMacros[strName] = strValue
+                __merge_macro(atMergedMacros, strName, strValue)
 
     time_end = datetime.datetime.now()
     print('Time used:', str(time_end - time_start))
@@ -336,6 +580,67 @@ def get_macro_definitions(env, strFileName):
     return atMergedMacros
 
 
+def get_macro_definitions(env, strFileName):
+    return s_tElfCache.get(
+        strFileName,
+        __get_tool_id(env, 'READELF'),
+        'macros',
+        lambda: __get_macro_definitions(env, strFileName)
+    )
+
+
+def __get_binary_data_objcopy(env, strFileName, astrSegmentsToConsider):
+    # Extract the binary to a temporary file.
+    tBinFile, strBinFileName = tempfile.mkstemp()
+    os.close(tBinFile)
+
+    astrCmd = [
+        env['OBJCOPY'],
+        '--output-target=binary'
+    ]
+    if astrSegmentsToConsider is not None:
+        for strSegment in astrSegmentsToConsider:
+            astrCmd.append('--only-section=%s' % strSegment)
+    astrCmd.append(strFileName)
+    astrCmd.append(strBinFileName)
+
+    try:
+        subprocess.check_call(astrCmd)
+    except Exception as e:
+        print("Failed to call external program:")
+        print(astrCmd)
+        print(e)
+        os.remove(strBinFileName)
+        raise
+
+    # Get the binary data.
+    tBinFile = open(strBinFileName, 'rb')
+    strData = tBinFile.read()
+    tBinFile.close()
+
+    # Remove the temp file.
+    os.remove(strBinFileName)
+
+    return strData
+
+
+def get_binary_data(env, strFileName, astrSegmentsToConsider=None):
+    # Get the contents of all loadable segments as a flat binary, just like
+    # "objcopy --output-target=binary" would write it. Only the segments in
+    # the list are used if astrSegmentsToConsider is not None or empty.
+    tReader = __open_native_reader(env, strFileName)
+    if tReader is not None:
+        with tReader:
+            strData = tReader.get_binary(astrSegmentsToConsider)
+    else:
+        strData = __get_binary_data_objcopy(
+            env,
+            strFileName,
+            astrSegmentsToConsider
+        )
+    return strData
+
+
 def get_load_address(atSegments):
     # Set an invalid lma
     ulLowestLma = 0x100000000
@@ -378,13 +683,32 @@ def get_estimated_bin_size(atSegments):
     return ulBiggestOffset
 
 
-def get_exec_address(env, strElfFileName):
+def __get_exec_address(env, strElfFileName):
     # Get the start address.
     # Try the global symbol first, then fall back to the file header.
     # The global symbol is better, as it holds not only the plain address, but
     # also thumb information.
     # The address from the file header does not have any thumb information.
     tResult = None
+
+    tReader = __open_native_reader(env, strElfFileName)
+    if tReader is not None:
+        with tReader:
+            for tSymbol in tReader.iter_symbols():
+                uiShndx = tSymbol['shndx']
+                if(
+                    tSymbol['name'] == 'start' and
+                    tSymbol['bind'] == elf_reader.STB_GLOBAL and
+                    tSymbol['visibility'] == elf_reader.STV_DEFAULT and
+                    uiShndx != elf_reader.SHN_UNDEF and
+                    uiShndx < elf_reader.SHN_LORESERVE
+                ):
+                    tResult = tSymbol['value']
+                    break
+            if tResult is None:
+                tResult = tReader.get_entry()
+        return tResult
+
     aCmd0 = [env['READELF'], '--syms', strElfFileName]
     proc = subprocess.Popen(aCmd0, stdout=subprocess.PIPE)
     strOutput0 = proc.communicate()[0].decode("utf-8", "replace")
@@ -420,3 +744,12 @@ def get_exec_address(env, strElfFileName):
             raise Exception('Failed to extract start address.')
 
     return tResult
+
+
+def get_exec_address(env, strElfFileName):
+    return s_tElfCache.get(
+        strElfFileName,
+        __get_tool_id(env, 'READELF'),
+        'exec_address',
+        lambda: __get_exec_address(env, strElfFileName)
+    )
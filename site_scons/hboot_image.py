@@ -2,6 +2,7 @@
 
 
 import hboot_image_compiler.hboot_image
+import hboot_image_compiler.signing_service
 
 import os.path
 
@@ -93,6 +94,23 @@ def __hboot_get_patch_table(env):
     return strPatchDefinition
 
 
+def __hboot_get_signing_service(env):
+    # Start the signing service once for the whole build.
+    strSigningService = None
+    if 'HBOOTIMAGE_SIGNING_SERVICE' in env:
+        tSigningService = env['HBOOTIMAGE_SIGNING_SERVICE']
+        if tSigningService is True:
+            strSigningService = \
+                hboot_image_compiler.signing_service.start_service()
+        elif tSigningService:
+            strSigningService = \
+                hboot_image_compiler.signing_service.start_service(
+                    str(tSigningService)
+                )
+
+    return strSigningService
+
+
 def __hboot_definition_scan(node, env, path):
     # This is the list of dependencies.
     atDependencies = []
@@ -189,6 +207,8 @@ def __hboot_image_action(target, source, env):
 
     strPatchDefinition = __hboot_get_patch_table(env)
 
+    strSigningService = __hboot_get_signing_service(env)
+
     strAsicTyp = env['ASIC_TYP']
     tCompiler = hboot_image_compiler.hboot_image.HbootImage(
         env,
@@ -199,6 +219,7 @@ def __hboot_image_action(target, source, env):
         known_files=atKnownFiles,
         defines=atDefines,
         keyrom=strKeyRom,
+        signing_service=strSigningService,
         verbose=fVerbose
     )
     tCompiler.parse_image(source[0].get_path())
@@ -297,6 +318,8 @@ def ApplyToEnv(env):
     env['HBOOTIMAGE_DEFINES'] = None
     env['HBOOTIMAGE_VERBOSE'] = False
     env['HBOOTIMAGE_NO_DEPENDENCY_SCAN'] = False
+    # Set this to True or a socket path to sign with the signing service.
+    env['HBOOTIMAGE_SIGNING_SERVICE'] = None
 
     hboot_image_act = SCons.Action.Action(
         __hboot_image_action,
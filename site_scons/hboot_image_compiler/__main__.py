@@ -21,11 +21,13 @@
 # ***************************************************************************
 
 import argparse
-import os.path
 import re
+import sys
 
+import batch_compiler
 import hboot_image
 import hboot_image_version
+import signing_service
 
 
 tParser = argparse.ArgumentParser(usage='hboot_image [options]')
@@ -34,7 +36,7 @@ tParser.add_argument(
     action='version',
     version=hboot_image_version.VERSION_STRING
 )
-tGroupe = tParser.add_mutually_exclusive_group(required=True)
+tGroupe = tParser.add_mutually_exclusive_group(required=False)
 tGroupe.add_argument('-n', '--netx-type',
                      dest='strNetxType',
                      choices=[
@@ -144,44 +146,50 @@ tParser.add_argument('--openssl-rand-off',
                      action='store_const', const=True,
                      metavar='SSLRAND',
                      help='Set openssl randomization true or false.')
+tParser.add_argument('--signing-service',
+                     dest='strSigningService',
+                     required=False,
+                     default=None,
+                     metavar='SOCKET',
+                     help='Sign with the signing service on the Unix socket '
+                          'SOCKET. It is started if it is not running yet.')
+tParser.add_argument('--batch',
+                     dest='strBatchFile',
+                     required=False,
+                     default=None,
+                     metavar='FILE',
+                     help='Build all images listed in the manifest FILE.')
+tParser.add_argument('-j', '--jobs',
+                     dest='uiJobs',
+                     required=False,
+                     default=None,
+                     type=int,
+                     metavar='N',
+                     help='Use N processes in batch mode. The default is '
+                          'the number of CPUs.')
 tParser.add_argument('strInputFile',
+                     nargs='?',
                      metavar='FILE',
                      help='Read the HBoot definition from FILE.')
 tParser.add_argument('strOutputFile',
+                     nargs='?',
                      metavar='FILE',
                      help='Write the HBoot image to FILE.')
 tArgs = tParser.parse_args()
 
-# Set the default for the patch table here.
-atDefaultPatchTables = {
-    'NETX56': 'hboot_netx56_patch_table.xml',
-    'NETX90': 'hboot_netx90_patch_table.xml',
-    'NETX90B': 'hboot_netx90b_patch_table.xml',
-    'NETX90C': 'hboot_netx90c_patch_table.xml',
-    'NETX90_MPW': 'hboot_netx90_mpw_patch_table.xml',
-    'NETX4000_RELAXED': 'hboot_netx4000_relaxed_patch_table.xml',
-    'NETX4000': 'hboot_netx4000_patch_table.xml',
-    'NETX4100': 'hboot_netx4000_patch_table.xml'
-}
+# A single image needs the netX type and the input and output files.
+if tArgs.strBatchFile is None:
+    if tArgs.strNetxType is None:
+        tParser.error('one of the arguments -n/--netx-type '
+                      '--netx-type-public is required')
+    if tArgs.strInputFile is None or tArgs.strOutputFile is None:
+        tParser.error('the input and output files are required')
+    strNetxType = batch_compiler.get_netx_type(tArgs.strNetxType)
 
-if tArgs.strNetxType == 'netx90':
-    strNetxType = 'NETX90C'
-elif tArgs.strNetxType == 'netx90_rev0':
-    strNetxType = 'NETX90'
-elif tArgs.strNetxType == 'netx90_rev1':
-    strNetxType = 'NETX90B'
-elif tArgs.strNetxType == 'netx90_rev2':
-    strNetxType = 'NETX90C'
-elif tArgs.strNetxType == 'netx90_mpw':
-    strNetxType = 'NETX90_MPW'
-else:
-    strNetxType = tArgs.strNetxType
-
-if tArgs.strPatchTablePath is None:
-    tArgs.strPatchTablePath = os.path.join(
-        os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
-        atDefaultPatchTables[strNetxType]
-    )
+    if tArgs.strPatchTablePath is None:
+        tArgs.strPatchTablePath = batch_compiler.get_default_patch_table(
+            strNetxType
+        )
 
 # Parse all alias definitions.
 atKnownFiles = {}
@@ -237,11 +245,39 @@ if tArgs.astrIncludePaths is None:
 if tArgs.astrSnipLib is None:
     tArgs.astrSnipLib = []
 
+# Start the signing service or connect to a running one.
+strSigningService = None
+if tArgs.strSigningService is not None:
+    strSigningService = signing_service.start_service(
+        tArgs.strSigningService
+    )
+
 tEnv = {'OBJCOPY': tArgs.strObjCopy,
         'OBJDUMP': tArgs.strObjDump,
         'READELF': tArgs.strReadElf,
         'HBOOT_INCLUDE': tArgs.astrIncludePaths}
 
+# Build all images of the manifest in batch mode.
+if tArgs.strBatchFile is not None:
+    atJobs = batch_compiler.read_manifest(
+        tArgs.strBatchFile,
+        tArgs.strPatchTablePath
+    )
+    tSettings = {
+        'env': tEnv,
+        'defines': atDefinitions,
+        'includes': tArgs.astrIncludePaths,
+        'known_files': atKnownFiles,
+        'verbose': tArgs.fVerbose,
+        'sniplibs': tArgs.astrSnipLib,
+        'keyrom': tArgs.strKeyRomPath,
+        'openssloptions': tArgs.astrOpensslOptions,
+        'opensslexe': tArgs.strOpensslExe,
+        'opensslrandoff': tArgs.fOpensslRandOff,
+        'signing_service': strSigningService
+    }
+    sys.exit(batch_compiler.run_batch(atJobs, tSettings, tArgs.uiJobs))
+
 tCompiler = hboot_image.HbootImage(
     tEnv,
     strNetxType,
@@ -254,7 +290,8 @@ tCompiler = hboot_image.HbootImage(
     keyrom=tArgs.strKeyRomPath,
     openssloptions=tArgs.astrOpensslOptions,
     opensslexe=tArgs.strOpensslExe,
-    opensslrandoff=tArgs.fOpensslRandOff
+    opensslrandoff=tArgs.fOpensslRandOff,
+    signing_service=strSigningService
 )
 tCompiler.parse_image(tArgs.strInputFile)
 tCompiler.write(tArgs.strOutputFile)
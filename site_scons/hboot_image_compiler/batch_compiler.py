@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+
+# ***************************************************************************
+# *   Copyright (C) 2019 by Hilscher GmbH                                   *
+# *   netXsupport@hilscher.com                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation; either version 2 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program; if not, write to the                         *
+# *   Free Software Foundation, Inc.,                                       *
+# *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+# ***************************************************************************
+
+import multiprocessing
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+import xml.etree.ElementTree
+
+if sys.version_info[0] == 2:
+    from hboot_image import HbootImage
+    import patch_definitions
+    import snippet_library
+elif sys.version_info[0] == 3:
+    from .hboot_image import HbootImage
+    from . import patch_definitions
+    from . import snippet_library
+
+
+# Map the public netX names to the internal ones.
+atPublicNetxTypes = {
+    'netx90': 'NETX90C',
+    'netx90_rev0': 'NETX90',
+    'netx90_rev1': 'NETX90B',
+    'netx90_rev2': 'NETX90C',
+    'netx90_mpw': 'NETX90_MPW'
+}
+
+# Set the default for the patch table here.
+atDefaultPatchTables = {
+    'NETX56': 'hboot_netx56_patch_table.xml',
+    'NETX90': 'hboot_netx90_patch_table.xml',
+    'NETX90B': 'hboot_netx90b_patch_table.xml',
+    'NETX90C': 'hboot_netx90c_patch_table.xml',
+    'NETX90_MPW': 'hboot_netx90_mpw_patch_table.xml',
+    'NETX4000_RELAXED': 'hboot_netx4000_relaxed_patch_table.xml',
+    'NETX4000': 'hboot_netx4000_patch_table.xml',
+    'NETX4100': 'hboot_netx4000_patch_table.xml'
+}
+
+
+def get_netx_type(strNetxType):
+    return atPublicNetxTypes.get(strNetxType, strNetxType)
+
+
+def get_default_patch_table(strNetxType):
+    strFileName = atDefaultPatchTables.get(strNetxType)
+    if strFileName is None:
+        raise Exception('Unknown netX type: "%s".' % strNetxType)
+    return os.path.join(
+        os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+        strFileName
+    )
+
+
+# The settings of the current process. They are set once in the parent and
+# inherited or re-created by the workers in the pool initializer.
+s_tSettings = None
+
+# All patch definitions loaded in this process, indexed by the path.
+s_atPatchDefinitions = {}
+
+# The snippet library of this process.
+s_cSnippetLibrary = None
+
+
+def __get_patch_definitions(strPatchTablePath):
+    cPatchDefinitions = s_atPatchDefinitions.get(strPatchTablePath)
+    if cPatchDefinitions is None:
+        cPatchDefinitions = patch_definitions.PatchDefinitions()
+        cPatchDefinitions.read_patch_definition(strPatchTablePath)
+        s_atPatchDefinitions[strPatchTablePath] = cPatchDefinitions
+    return cPatchDefinitions
+
+
+def __worker_init(tSettings, strSnipLibDatabase):
+    global s_tSettings
+    global s_cSnippetLibrary
+
+    s_tSettings = tSettings
+
+    # Load all patch tables which are not inherited from the parent yet.
+    for strPatchTablePath in tSettings['patch_tables']:
+        __get_patch_definitions(strPatchTablePath)
+
+    # Open the snippet index which was already filled by the parent. A
+    # connection must not be shared between processes, so each worker opens
+    # its own one.
+    s_cSnippetLibrary = snippet_library.SnippetLibrary(
+        strSnipLibDatabase,
+        tSettings['sniplibs'],
+        debug=tSettings['verbose'],
+        rescan=False
+    )
+
+
+def compile_job(tJob):
+    tSettings = s_tSettings
+
+    tStartTime = time.time()
+    fOk = False
+    strError = None
+    try:
+        # The defines of the job overwrite the global ones.
+        atDefinitions = dict(tSettings['defines'])
+        atDefinitions.update(tJob['defines'])
+
+        tCompiler = HbootImage(
+            tSettings['env'],
+            tJob['netx_type'],
+            defines=atDefinitions,
+            includes=tSettings['includes'],
+            known_files=tSettings['known_files'],
+            patch_definition=__get_patch_definitions(tJob['patch_table']),
+            snippet_library=s_cSnippetLibrary,
+            verbose=tSettings['verbose'],
+            keyrom=tSettings['keyrom'],
+            openssloptions=tSettings['openssloptions'],
+            opensslexe=tSettings['opensslexe'],
+            opensslrandoff=tSettings['opensslrandoff'],
+            signing_service=tSettings.get('signing_service')
+        )
+        tCompiler.parse_image(tJob['input'])
+        tCompiler.write(tJob['output'])
+        fOk = True
+    except Exception:
+        strError = traceback.format_exc()
+
+    return (tJob['output'], fOk, time.time() - tStartTime, strError)
+
+
+def read_manifest(strManifestPath, strPatchTablePath=None):
+    """ Read all jobs from a batch manifest.
+
+    The manifest looks like this:
+      <HBootImageBatch>
+        <Job input="a.xml" output="a.bin" netx_type="NETX90">
+          <Define name="NAME" value="VALUE"/>
+        </Job>
+      </HBootImageBatch>
+    Relative paths are relative to the folder of the manifest.
+    """
+    strBasePath = os.path.dirname(os.path.abspath(strManifestPath))
+    tXml = xml.etree.ElementTree.parse(strManifestPath)
+    tRoot = tXml.getroot()
+    if tRoot.tag != 'HBootImageBatch':
+        raise Exception(
+            'The manifest "%s" has no "HBootImageBatch" root node.' %
+            strManifestPath
+        )
+
+    atJobs = []
+    for tNode in tRoot.findall('Job'):
+        for strAttr in ['input', 'output', 'netx_type']:
+            if tNode.get(strAttr) is None:
+                raise Exception(
+                    'Job %d in "%s" has no "%s" attribute.' % (
+                        len(atJobs),
+                        strManifestPath,
+                        strAttr
+                    )
+                )
+        strNetxType = get_netx_type(tNode.get('netx_type'))
+
+        # The patch table of the command line overrides the defaults.
+        strJobPatchTable = tNode.get('patch_table')
+        if strJobPatchTable is not None:
+            strJobPatchTable = os.path.join(strBasePath, strJobPatchTable)
+        elif strPatchTablePath is not None:
+            strJobPatchTable = strPatchTablePath
+        else:
+            strJobPatchTable = get_default_patch_table(strNetxType)
+
+        atDefinitions = {}
+        for tDefine in tNode.findall('Define'):
+            strName = tDefine.get('name')
+            if strName is None:
+                raise Exception('A define in "%s" has no name.' %
+                                strManifestPath)
+            atDefinitions[strName] = tDefine.get('value', '')
+
+        atJobs.append({
+            'input': os.path.join(strBasePath, tNode.get('input')),
+            'output': os.path.join(strBasePath, tNode.get('output')),
+            'netx_type': strNetxType,
+            'patch_table': os.path.abspath(strJobPatchTable),
+            'defines': atDefinitions
+        })
+
+    return atJobs
+
+
+def run_batch(atJobs, tSettings, uiProcesses=None):
+    """ Compile all jobs in a process pool and print a summary.
+
+    The patch tables are loaded and the snippet libraries are scanned only
+    once. Returns 0 if all jobs succeeded, 1 otherwise.
+    """
+    global s_tSettings
+
+    tStartTime = time.time()
+
+    # Collect all patch tables.
+    astrPatchTables = []
+    for tJob in atJobs:
+        if tJob['patch_table'] not in astrPatchTables:
+            astrPatchTables.append(tJob['patch_table'])
+    tSettings = dict(tSettings)
+    tSettings['patch_tables'] = astrPatchTables
+
+    # Load the patch tables here. Forked workers inherit them.
+    s_tSettings = tSettings
+    for strPatchTablePath in astrPatchTables:
+        __get_patch_definitions(strPatchTablePath)
+
+    # Scan the snippet libraries once into a temporary database which is
+    # shared by all workers.
+    strTempFolder = tempfile.mkdtemp()
+    try:
+        strSnipLibDatabase = os.path.join(strTempFolder, 'sniplib.db')
+        cSnippetLibrary = snippet_library.SnippetLibrary(
+            strSnipLibDatabase,
+            tSettings['sniplibs'],
+            debug=tSettings['verbose']
+        )
+        cSnippetLibrary.scan()
+        cSnippetLibrary.close()
+
+        if uiProcesses is None:
+            uiProcesses = multiprocessing.cpu_count()
+        uiProcesses = max(1, min(uiProcesses, len(atJobs)))
+
+        if uiProcesses == 1:
+            __worker_init(tSettings, strSnipLibDatabase)
+            atResults = [compile_job(tJob) for tJob in atJobs]
+            s_cSnippetLibrary.close()
+        else:
+            tPool = multiprocessing.Pool(
+                processes=uiProcesses,
+                initializer=__worker_init,
+                initargs=(tSettings, strSnipLibDatabase)
+            )
+            try:
+                atResults = tPool.map(compile_job, atJobs, chunksize=1)
+            finally:
+                tPool.close()
+                tPool.join()
+    finally:
+        shutil.rmtree(strTempFolder, True)
+
+    # Print the results.
+    uiFailed = 0
+    for strOutput, fOk, tElapsed, strError in atResults:
+        if fOk is True:
+            print('[OK]     %8.3fs  %s' % (tElapsed, strOutput))
+        else:
+            uiFailed += 1
+            print('[FAILED] %8.3fs  %s' % (tElapsed, strOutput))
+            print(strError)
+    print('%d of %d images built in %.3fs with %d processes.' % (
+        len(atResults) - uiFailed,
+        len(atResults),
+        time.time() - tStartTime,
+        uiProcesses
+    ))
+
+    iResult = 0
+    if uiFailed != 0:
+        iResult = 1
+    return iResult
@@ -22,29 +22,37 @@
 
 import array
 import ast
-import base64
 import binascii
+import collections
 import hashlib
+import keyword
 import math
+import multiprocessing
+import multiprocessing.pool
 import os
 import os.path
 import re
 import platform
 import subprocess
 import sys
-import tempfile
+import threading
 import xml.dom.minidom
-import xml.etree.ElementTree
 
 import elf_support
 
 if sys.version_info[0] == 2:
+    import key_registry
     import option_compiler
     import patch_definitions
+    import signer
+    import signing_service
     import snippet_library
 elif sys.version_info[0] == 3:
+    from . import key_registry
     from . import option_compiler
     from . import patch_definitions
+    from . import signer
+    from . import signing_service
     from . import snippet_library
 
 
@@ -54,6 +62,9 @@ class ResolveDefines(ast.NodeTransformer):
     def setDefines(self, atDefines):
         self.__atDefines = atDefines
 
+    def getDefines(self):
+        return self.__atDefines
+
     def visit_Name(self, node):
         tNode = None
         strName = node.id
@@ -78,6 +89,264 @@ class ResolveDefines(ast.NodeTransformer):
         return tNode
 
 
+class ExpressionCache:
+    """ Evaluate "%%expr%%" expressions with compiled code objects.
+
+    The code object of an expression is cached together with the values of
+    all defines it uses. Plain names and integers skip the AST completely.
+    """
+    # A plain name.
+    __tNamePattern = re.compile(r'[A-Za-z_][A-Za-z0-9_]*$')
+
+    # A decimal or hexadecimal integer.
+    __tIntegerPattern = re.compile(r'(?:[0-9]+|0[xX][0-9a-fA-F]+)$')
+
+    # Protect the caches. SCons runs the actions in several threads.
+    __tLock = None
+
+    # The names used by each expression.
+    __atNames = None
+
+    # The code objects indexed by the expression and the define values.
+    __atCode = None
+
+    # The maximum number of code objects.
+    __uiMaxEntries = None
+
+    def __init__(self, uiMaxEntries=4096):
+        self.__tLock = threading.Lock()
+        self.__atNames = {}
+        self.__atCode = collections.OrderedDict()
+        self.__uiMaxEntries = uiMaxEntries
+
+    def evaluate(self, strExpression, tResolver):
+        atDefines = tResolver.getDefines()
+
+        # A plain name is replaced with the value of the define.
+        if(
+            self.__tNamePattern.match(strExpression) is not None and
+            keyword.iskeyword(strExpression) is False
+        ):
+            if strExpression not in atDefines:
+                raise Exception('Unknown constant "%s".' % strExpression)
+            tValue = atDefines[strExpression]
+            if type(tValue) is int or type(tValue) is str:
+                return tValue
+
+        # An integer is returned as it is.
+        elif self.__tIntegerPattern.match(strExpression) is not None:
+            try:
+                return int(strExpression, 0)
+            except ValueError:
+                # Let the compiler report the error.
+                pass
+
+        # Get the names of all defines in the expression.
+        tAstNode = None
+        with self.__tLock:
+            astrNames = self.__atNames.get(strExpression)
+        if astrNames is None:
+            tAstNode = ast.parse(strExpression, mode='eval')
+            astrNames = tuple(sorted(set(
+                tNode.id for tNode in ast.walk(tAstNode)
+                if isinstance(tNode, ast.Name)
+            )))
+            with self.__tLock:
+                self.__atNames[strExpression] = astrNames
+
+        # Look for a code object with the same define values.
+        try:
+            tKey = (
+                strExpression,
+                tuple(
+                    (type(atDefines.get(strName)), atDefines.get(strName))
+                    for strName in astrNames
+                )
+            )
+            hash(tKey)
+        except TypeError:
+            tKey = None
+
+        tCode = None
+        if tKey is not None:
+            with self.__tLock:
+                tCode = self.__atCode.pop(tKey, None)
+                if tCode is not None:
+                    # Insert the entry again to mark it as recently used.
+                    self.__atCode[tKey] = tCode
+
+        if tCode is None:
+            if tAstNode is None:
+                tAstNode = ast.parse(strExpression, mode='eval')
+            tAstResolved = tResolver.visit(tAstNode)
+            tCode = compile(tAstResolved, 'lala', mode='eval')
+            if tKey is not None:
+                with self.__tLock:
+                    self.__atCode[tKey] = tCode
+                    while len(self.__atCode) > self.__uiMaxEntries:
+                        self.__atCode.popitem(last=False)
+
+        return eval(tCode)
+
+
+# The expression cache of this process.
+s_tExpressionCache = ExpressionCache()
+
+
+class SnippetTemplates:
+    """ Cache the compiled and instantiated snippets of this process.
+
+    A compiled snippet is the snippet text split at the "%%expr%%" slots.
+    An instance is the parsed XML of a snippet with one set of replacements.
+    """
+    # The pattern for the substitution slots.
+    __tSlotPattern = re.compile('%%(.+?)%%')
+
+    # Protect the caches. SCons runs the actions in several threads.
+    __tLock = None
+
+    # The compiled snippets indexed by the snippet text.
+    __atCompiled = None
+
+    # The parsed "Root" nodes indexed by the snippet text and replacements.
+    __atInstances = None
+
+    # The maximum number of entries in each cache.
+    __uiMaxEntries = None
+
+    def __init__(self, uiMaxEntries=256):
+        self.__tLock = threading.Lock()
+        self.__atCompiled = collections.OrderedDict()
+        self.__atInstances = collections.OrderedDict()
+        self.__uiMaxEntries = uiMaxEntries
+
+    def __cache_get(self, atCache, tKey):
+        with self.__tLock:
+            tValue = atCache.pop(tKey, None)
+            if tValue is not None:
+                # Insert the entry again to mark it as recently used.
+                atCache[tKey] = tValue
+        return tValue
+
+    def __cache_put(self, atCache, tKey, tValue):
+        with self.__tLock:
+            atCache[tKey] = tValue
+            while len(atCache) > self.__uiMaxEntries:
+                atCache.popitem(last=False)
+
+    def get_slots(self, strText):
+        # All odd elements of the list are expressions.
+        astrParts = self.__cache_get(self.__atCompiled, strText)
+        if astrParts is None:
+            astrParts = self.__tSlotPattern.split(strText)
+            self.__cache_put(self.__atCompiled, strText, astrParts)
+        return astrParts
+
+    def instantiate(self, strText, atReplace, fnEvaluate):
+        """ Get the "Root" node of a snippet with the replacements.
+
+        The returned node is shared and must not be modified.
+        """
+        try:
+            tKey = (strText, frozenset(atReplace.items()))
+        except TypeError:
+            # Some values can not be hashed. Do not cache the result.
+            tKey = None
+
+        tResult = None
+        if tKey is not None:
+            tResult = self.__cache_get(self.__atInstances, tKey)
+
+        if tResult is None:
+            # Replace all slots.
+            astrText = list(self.get_slots(strText))
+            for uiIndex in range(1, len(astrText), 2):
+                astrText[uiIndex] = fnEvaluate(astrText[uiIndex])
+
+            tXml = xml.dom.minidom.parseString(
+                '<?xml version="1.0" encoding="utf-8"?><Root>%s</Root>' %
+                ''.join(astrText)
+            )
+            tResult = tXml.documentElement
+
+            if tKey is not None:
+                self.__cache_put(self.__atInstances, tKey, tResult)
+
+        return tResult
+
+
+# The snippet templates of this process.
+s_tSnippetTemplates = SnippetTemplates()
+
+
+class PreprocessedImages:
+    """ Cache the preprocessed image definitions of this process.
+
+    SCons scans an image for dependencies and builds it later in the same
+    run. Both steps need the same expanded document, so it is created only
+    once. An entry is valid as long as the definition and all included files
+    and snippets did not change.
+    """
+    # Protect the cache. SCons runs the actions in several threads.
+    __tLock = None
+
+    # The documents and their dependencies indexed by the configuration.
+    __atImages = None
+
+    # The maximum number of entries in the cache.
+    __uiMaxEntries = None
+
+    def __init__(self, uiMaxEntries=64):
+        self.__tLock = threading.Lock()
+        self.__atImages = collections.OrderedDict()
+        self.__uiMaxEntries = uiMaxEntries
+
+    def __get_stamp(self, strPath):
+        try:
+            tStat = os.stat(strPath)
+            tStamp = (tStat.st_mtime, tStat.st_size)
+        except OSError:
+            tStamp = None
+        return tStamp
+
+    def get_stamps(self, astrPaths):
+        return tuple(
+            (strPath, self.__get_stamp(strPath)) for strPath in astrPaths
+        )
+
+    def get(self, tKey):
+        """ Get the document and the dependencies for the configuration.
+
+        The returned document is shared and must not be modified.
+        """
+        with self.__tLock:
+            tEntry = self.__atImages.pop(tKey, None)
+            if tEntry is not None:
+                # Insert the entry again to mark it as recently used.
+                self.__atImages[tKey] = tEntry
+
+        tResult = None
+        if tEntry is not None:
+            tXml, astrDependencies, atStamps = tEntry
+            # Check all files which were used by the preprocessor.
+            for strPath, tStamp in atStamps:
+                if self.__get_stamp(strPath) != tStamp:
+                    break
+            else:
+                tResult = (tXml, astrDependencies)
+        return tResult
+
+    def put(self, tKey, tXml, astrDependencies, atStamps):
+        with self.__tLock:
+            self.__atImages[tKey] = (tXml, list(astrDependencies), atStamps)
+            while len(self.__atImages) > self.__uiMaxEntries:
+                self.__atImages.popitem(last=False)
+
+
+# The preprocessed images of this process.
+s_tPreprocessedImages = PreprocessedImages()
+
+
 class HbootImage:
     __fVerbose = False
 
@@ -119,11 +388,15 @@ class HbootImage:
     __IMAGE_TYPE_ALTERNATIVE = 5
     __sizHashDw = None
 
-    __XmlKeyromContents = None
+    # The keys of the keyrom indexed by the "index" attribute.
+    __atKeyromContents = None
     __cfg_openssl = 'openssl'
     __cfg_openssloptions = None
     __fOpensslRandOff = False
 
+    # This signs the certificates and hash tables.
+    __cSigner = None
+
     # This is the revision for the netX10, netX51 and netX52 Secmem zone.
     __SECMEM_ZONE2_REV1_0 = 0x81
 
@@ -149,6 +422,20 @@ class HbootImage:
 
     __fMoreChunksAllowed = None
 
+    # The number of threads for building the chunks. 1 builds all chunks
+    # in the calling thread.
+    __uiChunkThreads = None
+
+    # These chunks depend on the current offset in the image or on other
+    # chunks. They are built in order after all other chunks.
+    __astrSequentialChunks = [
+        'XIP',
+        'Skip',
+        'SkipIncomplete',
+        'HashTable',
+        'Next'
+    ]
+
     __ulPaddingPreSize = None
     __ucPaddingPreValue = None
     __ulMinImageSize = None
@@ -159,6 +446,9 @@ class HbootImage:
         strPatchDefinition = None
         strKeyromFile = None
         strCfgOpenssl = None
+        cSnippetLibrary = None
+        cSigner = None
+        strSigningService = None
         astrIncludePaths = []
         astrSnippetSearchPaths = []
         atKnownFiles = {}
@@ -166,6 +456,7 @@ class HbootImage:
         atOpensslOptions = []
         fVerbose = False
         fOpensslRandOff = False
+        uiChunkThreads = None
 
         # Parse the kwargs.
         for strKey, tValue in iter(kwargs.items()):
@@ -175,6 +466,15 @@ class HbootImage:
             elif strKey == 'keyrom':
                 strKeyromFile = tValue
 
+            elif strKey == 'snippet_library':
+                cSnippetLibrary = tValue
+
+            elif strKey == 'signer':
+                cSigner = tValue
+
+            elif strKey == 'signing_service':
+                strSigningService = tValue
+
             elif strKey == 'sniplibs':
                 if tValue is None:
                     pass
@@ -212,6 +512,9 @@ class HbootImage:
             elif strKey == 'opensslrandoff':
                 fOpensslRandOff = bool(tValue)
 
+            elif strKey == 'chunk_threads':
+                uiChunkThreads = tValue
+
         # Set the default search path if nothing was specified.
         if len(astrSnippetSearchPaths) == 0:
             astrSnippetSearchPaths = ['sniplib']
@@ -220,6 +523,11 @@ class HbootImage:
 
         self.__fOpensslRandOff = fOpensslRandOff
 
+        # Use one thread per CPU for the chunks by default.
+        if uiChunkThreads is None:
+            uiChunkThreads = multiprocessing.cpu_count()
+        self.__uiChunkThreads = max(1, int(uiChunkThreads))
+
         # Do not override anything in the pre-calculated header yet.
         self.__atHeaderOverride = [None] * 16
 
@@ -244,6 +552,25 @@ class HbootImage:
         # Set the OpenSSL Path.
         self.__cfg_openssl = strCfgOpenssl
 
+        # Use the signer which was passed. Otherwise send the requests to the
+        # signing service or get the best signer for the OpenSSL
+        # configuration.
+        if cSigner is not None:
+            self.__cSigner = cSigner
+        elif strSigningService is not None:
+            self.__cSigner = signing_service.SigningClient(
+                strSigningService,
+                strCfgOpenssl or 'openssl',
+                atOpensslOptions,
+                not fOpensslRandOff
+            )
+        else:
+            self.__cSigner = signer.get_signer(
+                strCfgOpenssl or 'openssl',
+                atOpensslOptions,
+                not fOpensslRandOff
+            )
+
         if self.__fVerbose:
             print('[HBootImage] Configuration: netX type = %s' % strNetxType)
             print('[HBootImage] Configuration: patch definitions = "%s"' %
@@ -289,15 +616,24 @@ class HbootImage:
                         )
                     )
 
-        if strPatchDefinition is not None:
+        # The patch definition is either the path to the XML file or an
+        # already parsed PatchDefinitions object.
+        if isinstance(strPatchDefinition, patch_definitions.PatchDefinitions):
+            self.__cPatchDefinitions = strPatchDefinition
+        elif strPatchDefinition is not None:
             self.__cPatchDefinitions = patch_definitions.PatchDefinitions()
             self.__cPatchDefinitions.read_patch_definition(strPatchDefinition)
 
-        self.__cSnippetLibrary = snippet_library.SnippetLibrary(
-            ':memory:',
-            astrSnippetSearchPaths,
-            debug=self.__fVerbose
-        )
+        # Use an existing snippet library if one was passed. Otherwise create
+        # a new one for the search paths.
+        if cSnippetLibrary is not None:
+            self.__cSnippetLibrary = cSnippetLibrary
+        else:
+            self.__cSnippetLibrary = snippet_library.get_shared_library(
+                ':memory:',
+                astrSnippetSearchPaths,
+                debug=self.__fVerbose
+            )
 
         self.__strNetxType = strNetxType
         self.__tImageType = None
@@ -320,11 +656,8 @@ class HbootImage:
             if self.__fVerbose:
                 print('[HBootImage] Init: Reading key ROM file "%s".' %
                       strKeyromFile)
-            # Parse the XML file.
-            tFile = open(strKeyromFile, 'rt')
-            strXml = tFile.read()
-            tFile.close()
-            self.__XmlKeyromContents = xml.etree.ElementTree.fromstring(strXml)
+            # The keyrom is parsed only once for all images.
+            self.__atKeyromContents = key_registry.get_keyrom(strKeyromFile)
 
         self.__resolver = ResolveDefines()
 
@@ -349,10 +682,10 @@ class HbootImage:
         return ''.join(astrText)
 
     def __parse_re_match(self, tMatch):
-        strExpression = tMatch.group(1)
-        tAstNode = ast.parse(strExpression, mode='eval')
-        tAstResolved = self.__resolver.visit(tAstNode)
-        tResult = eval(compile(tAstResolved, 'lala', mode='eval'))
+        return self.__evaluate_expression(tMatch.group(1))
+
+    def __evaluate_expression(self, strExpression):
+        tResult = s_tExpressionCache.evaluate(strExpression, self.__resolver)
         if tResult is None:
             raise Exception('Invalid expression: "%s"' % strExpression)
         return tResult
@@ -459,11 +792,13 @@ class HbootImage:
         atReplace.update(self.__atGlobalDefines)
         atReplace.update(tSnippetAttr[1])
 
-        # Replace and convert to XML.
-        tSnippetNode = self.__plaintext_to_xml_with_replace(
+        # Replace and convert to XML. Snippets with the same text and
+        # replacements share one parsed node.
+        self.__resolver.setDefines(atReplace)
+        tSnippetNode = s_tSnippetTemplates.instantiate(
             strSnippetText,
             atReplace,
-            False
+            self.__evaluate_expression
         )
 
         # Add the snippet file to the dependencies.
@@ -685,6 +1020,8 @@ class HbootImage:
         aBootBlock[2] = ulFlashOffset
 
     def __build_standard_header(self, atChunks):
+        """ Build the header for the chunk data atChunks. This is a DWORD
+        buffer without the terminating DWORD of 0. """
 
         ulMagicCookie = None
         ulSignature = None
@@ -734,9 +1071,10 @@ class HbootImage:
                 'configured, please update the HBOOT image compiler.'
             )
 
-        # Get the hash for the image.
+        # Get the hash for the chunks and the terminating DWORD.
         tHash = hashlib.sha224()
-        tHash.update(atChunks.tobytes())
+        tHash.update(atChunks)
+        tHash.update(b'\0\0\0\0')
         aulHash = array.array('I', tHash.digest())
 
         # Get the parameter0 value.
@@ -750,7 +1088,7 @@ class HbootImage:
         aBootBlock[0x01] = 0                    # reserved
         aBootBlock[0x02] = 0                    # reserved
         aBootBlock[0x03] = 0                    # reserved
-        aBootBlock[0x04] = len(atChunks)        # chunks dword size
+        aBootBlock[0x04] = len(atChunks) + 1    # chunks dword size
         aBootBlock[0x05] = 0                    # reserved
         aBootBlock[0x06] = ulSignature          # The image signature.
         aBootBlock[0x07] = ulParameter0         # Image parameters.
@@ -982,7 +1320,7 @@ class HbootImage:
 
                 # Get the hash for the chunk.
                 tHash = hashlib.sha384()
-                tHash.update(atChunk.tobytes())
+                tHash.update(atChunk)
                 strHash = tHash.digest()
                 aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
                 atChunk.extend(aulHash)
@@ -1010,7 +1348,7 @@ class HbootImage:
 
                 # Get the hash for the chunk.
                 tHash = hashlib.sha384()
-                tHash.update(atChunk.tobytes())
+                tHash.update(atChunk)
                 strHash = tHash.digest()
                 aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
                 atChunk.extend(aulHash)
@@ -1062,35 +1400,11 @@ class HbootImage:
             pulLoadAddress = None
 
         # Extract the binary.
-        tBinFile, strBinFileName = tempfile.mkstemp()
-        os.close(tBinFile)
-
-        astrCmd = [
-            self.__tEnv['OBJCOPY'],
-            '--output-target=binary'
-        ]
-        if astrSegmentsToDump is not None:
-            for strSegment in astrSegmentsToDump:
-                astrCmd.append('--only-section=%s' % strSegment)
-        astrCmd.append(strAbsFilePath)
-        astrCmd.append(strBinFileName)
-        # subprocess.check_call(astrCmd)
-
-        try:
-            subprocess.check_call(astrCmd)
-        except Exception as e:
-            print("Failed to call external program:")
-            print(astrCmd)
-            print(e)
-            raise
-
-        # Get the application data.
-        tBinFile = open(strBinFileName, 'rb')
-        strData = tBinFile.read()
-        tBinFile.close()
-
-        # Remove the temp file.
-        os.remove(strBinFileName)
+        strData = elf_support.get_binary_data(
+            self.__tEnv,
+            strAbsFilePath,
+            astrSegmentsToDump
+        )
 
         # Print an info message if the extracted data is empty.
         if len(strData) == 0:
@@ -1432,7 +1746,7 @@ class HbootImage:
 
         # Get the hash for the chunk.
         tHash = hashlib.sha384()
-        tHash.update(aulChunk.tostring())
+        tHash.update(aulChunk)
         strHash = tHash.digest()
         aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
         aulChunk.extend(aulHash)
@@ -1850,7 +2164,7 @@ class HbootImage:
 
             # Get the hash for the chunk.
             tHash = hashlib.sha384()
-            tHash.update(aulChunk.tobytes())
+            tHash.update(aulChunk)
             strHash = tHash.digest()
             aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
             aulChunk.extend(aulHash)
@@ -1861,7 +2175,7 @@ class HbootImage:
 
             # Get the hash for the chunk.
             tHash = hashlib.sha384()
-            tHash.update(aulChunk.tostring())
+            tHash.update(aulChunk)
             strHash = tHash.digest()
 
         tChunkAttributes['fIsFinished'] = True
@@ -1890,7 +2204,7 @@ class HbootImage:
 
         # Get the hash for the chunk.
         tHash = hashlib.sha384()
-        tHash.update(aulChunk.tobytes())
+        tHash.update(aulChunk)
         strHash = tHash.digest()
         aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
         aulChunk.extend(aulHash)
@@ -2014,7 +2328,7 @@ class HbootImage:
 
         # Get the hash for the chunk.
         tHash = hashlib.sha384()
-        tHash.update(aulChunk.tostring())
+        tHash.update(aulChunk)
         strHash = tHash.digest()
         aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
         aulChunk.extend(aulHash)
@@ -2264,7 +2578,7 @@ class HbootImage:
 
         # Get the hash for the chunk.
         tHash = hashlib.sha384()
-        tHash.update(aulChunk.tobytes())
+        tHash.update(aulChunk)
         strHash = tHash.digest()
         aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
         aulChunk.extend(aulHash)
@@ -2332,7 +2646,7 @@ class HbootImage:
 
         # Get the hash for the chunk.
         tHash = hashlib.sha384()
-        tHash.update(aulChunk.tostring())
+        tHash.update(aulChunk)
         strHash = tHash.digest()
         aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
         aulChunk.extend(aulHash)
@@ -2381,7 +2695,7 @@ class HbootImage:
 
         # Get the hash for the chunk.
         tHash = hashlib.sha384()
-        tHash.update(aulChunk.tostring())
+        tHash.update(aulChunk)
         strHash = tHash.digest()
         aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
         aulChunk.extend(aulHash)
@@ -2528,7 +2842,7 @@ class HbootImage:
 
         # Get the hash for the chunk.
         tHash = hashlib.sha384()
-        tHash.update(aulChunk.tobytes())
+        tHash.update(aulChunk)
         strHash = tHash.digest()
         aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
         aulChunk.extend(aulHash)
@@ -2654,29 +2968,22 @@ class HbootImage:
 
     def __keyrom_get_key(self, uiIndex):
         # This needs the keyrom data.
-        if self.__XmlKeyromContents is None:
+        if self.__atKeyromContents is None:
             raise Exception('No Keyrom contents specified!')
 
-        # Find the requested key and hash.
-        tNode = self.__XmlKeyromContents.find('Entry/[@index="%d"]' % uiIndex)
-        if tNode is None:
+        # Find the requested key.
+        tEntry = self.__atKeyromContents.get('%d' % uiIndex)
+        if tEntry is None:
             raise Exception('Key %d was not found!' % uiIndex)
-        tNode_key = tNode.find('Key')
-        if tNode_key is None:
-            raise Exception('Key %d has no "Key" child!' % uiIndex)
-        tNode_hash = tNode.find('Hash')
-        if tNode_hash is None:
-            raise Exception('Key %d has no "Hash" child!' % uiIndex)
-
-        strKeyBase64 = tNode_key.text
-
-        # Decode the BASE64 data. Now we have the key pair in DER format.
-        strKeyDER = base64.b64decode(strKeyBase64)
+        strKeyDER, strError = tEntry
+        if strError is not None:
+            raise Exception('Key %d %s!' % (uiIndex, strError))
 
         return strKeyDER
 
-    def __get_cert_mod_exp(self, tNodeParent, strKeyDER, fIsPublicKey):
-        # Extract all information from the key.
+    def __openssl_get_key(self, strKeyDER, fIsPublicKey):
+        # Extract all information from the text dump of OpenSSL. This is only
+        # used for keys which can not be decoded by the key registry.
         if len(strKeyDER) > 1000:
             astrCmd = [
                 self.__cfg_openssl,
@@ -2721,7 +3028,7 @@ class HbootImage:
         # The text dump of an RSA key has " modulus:", while an ECC key has
         # "priv:".
         iKeyTyp_1ECC_2RSA = None
-        atAttr = None
+        atKey = None
         strMatchExponent = 'publicExponent:'
         strMatchModulus = 'modulus:'
         if fIsPublicKey is True:
@@ -2743,69 +3050,15 @@ class HbootImage:
             ulExpHex = int(tMatch.group(2), 16)
             if ulExp != ulExpHex:
                 raise Exception('Decimal version differs from hex version!')
-            if (ulExp < 0) or (ulExp > 0xffffff):
-                raise Exception('The exponent exceeds the allowed range of a '
-                                '24bit unsigned integer!')
-            strData = (
-                chr(ulExp & 0xff) +
-                chr((ulExp >> 8) & 0xff) +
-                chr((ulExp >> 16) & 0xff)
-            )
-            aucExp = array.array('B', strData)
 
             # Extract the modulus "N".
             aucMod = self.__openssl_get_data_block(strStdout, strMatchModulus)
             self.__openssl_cut_leading_zero(aucMod)
             self.__openssl_convert_to_little_endian(aucMod)
 
-            __atKnownRsaSizes = {
-                0: {'mod': 256, 'exp': 3, 'rsa': 2048},
-                1: {'mod': 384, 'exp': 3, 'rsa': 3072},
-                2: {'mod': 512, 'exp': 3, 'rsa': 4096}
-            }
-
-            sizMod = len(aucMod)
-            sizExp = len(aucExp)
-            uiId = None
-            for uiElementId, atAttr in __atKnownRsaSizes.items():
-                if (sizMod == atAttr['mod']) and (sizExp == atAttr['exp']):
-                    # Found the RSA type.
-                    if(
-                        (self.__strNetxType == 'NETX90_MPW') or
-                        (self.__strNetxType == 'NETX90') or
-                        (self.__strNetxType == 'NETX90B') or
-                        (self.__strNetxType == 'NETX90C')
-                    ):
-                        uiId = uiElementId + 1
-                    else:
-                        uiId = uiElementId
-                    break
-
-            if uiId is None:
-                strErr = (
-                    'The modulo has a size of %d bytes. '
-                    'The public exponent has a size of %d bytes.\n'
-                    'These values can not be mapped to a RSA bit size. '
-                    'Known sizes are:\n' % (
-                        sizMod,
-                        sizExp
-                    )
-                )
-                for uiElementId, atAttr in __atKnownRsaSizes.items():
-                    strErr += (
-                        '  RSA%d: %d bytes modulo, '
-                        '%d bytes public exponent\n' % (
-                            atAttr['rsa'],
-                            atAttr['mod'],
-                            atAttr['exp']
-                        )
-                    )
-                raise Exception(strErr)
-
-            atAttr = {
-                'id': uiId,
+            atKey = {
                 'mod': aucMod,
-                'exp': aucExp
+                'exp': ulExp
             }
 
         elif strStdout.find('priv:') != -1:
@@ -2861,6 +3114,110 @@ class HbootImage:
             if ulCofactor != ulCofactorHex:
                 raise Exception('Decimal version differs from hex version!')
 
+            atKey = {
+                'd': aucPriv,
+                'Qx': aucPubX,
+                'Qy': aucPubY,
+                'p': aucPrime,
+                'a': aucA,
+                'b': aucB,
+                'Gx': aucGenX,
+                'Gy': aucGenY,
+                'n': aucOrder,
+                'cof': ulCofactor
+            }
+
+        else:
+            raise Exception('Unknown key format.')
+
+        return iKeyTyp_1ECC_2RSA, atKey
+
+    def __get_cert_mod_exp(self, tNodeParent, strKeyDER, fIsPublicKey):
+        # Extract all information from the key. The key registry decodes
+        # each key only once for all images.
+        iKeyTyp_1ECC_2RSA, atKey = key_registry.get_key(
+            strKeyDER,
+            fIsPublicKey,
+            self.__openssl_get_key
+        )
+
+        # The registry shares its results. Copy all numbers before they are
+        # used here.
+        atAttr = None
+        if iKeyTyp_1ECC_2RSA == 2:
+            ulExp = atKey['exp']
+            if (ulExp < 0) or (ulExp > 0xffffff):
+                raise Exception('The exponent exceeds the allowed range of a '
+                                '24bit unsigned integer!')
+            aucExp = array.array('B', [
+                ulExp & 0xff,
+                (ulExp >> 8) & 0xff,
+                (ulExp >> 16) & 0xff
+            ])
+            aucMod = array.array('B', atKey['mod'])
+
+            __atKnownRsaSizes = {
+                0: {'mod': 256, 'exp': 3, 'rsa': 2048},
+                1: {'mod': 384, 'exp': 3, 'rsa': 3072},
+                2: {'mod': 512, 'exp': 3, 'rsa': 4096}
+            }
+
+            sizMod = len(aucMod)
+            sizExp = len(aucExp)
+            uiId = None
+            for uiElementId, atAttr in __atKnownRsaSizes.items():
+                if (sizMod == atAttr['mod']) and (sizExp == atAttr['exp']):
+                    # Found the RSA type.
+                    if(
+                        (self.__strNetxType == 'NETX90_MPW') or
+                        (self.__strNetxType == 'NETX90') or
+                        (self.__strNetxType == 'NETX90B') or
+                        (self.__strNetxType == 'NETX90C')
+                    ):
+                        uiId = uiElementId + 1
+                    else:
+                        uiId = uiElementId
+                    break
+
+            if uiId is None:
+                strErr = (
+                    'The modulo has a size of %d bytes. '
+                    'The public exponent has a size of %d bytes.\n'
+                    'These values can not be mapped to a RSA bit size. '
+                    'Known sizes are:\n' % (
+                        sizMod,
+                        sizExp
+                    )
+                )
+                for uiElementId, atAttr in __atKnownRsaSizes.items():
+                    strErr += (
+                        '  RSA%d: %d bytes modulo, '
+                        '%d bytes public exponent\n' % (
+                            atAttr['rsa'],
+                            atAttr['mod'],
+                            atAttr['exp']
+                        )
+                    )
+                raise Exception(strErr)
+
+            atAttr = {
+                'id': uiId,
+                'mod': aucMod,
+                'exp': aucExp
+            }
+
+        else:
+            aucPriv = array.array('B', atKey['d'])
+            aucPubX = array.array('B', atKey['Qx'])
+            aucPubY = array.array('B', atKey['Qy'])
+            aucPrime = array.array('B', atKey['p'])
+            aucA = array.array('B', atKey['a'])
+            aucB = array.array('B', atKey['b'])
+            aucGenX = array.array('B', atKey['Gx'])
+            aucGenY = array.array('B', atKey['Gy'])
+            aucOrder = array.array('B', atKey['n'])
+            ulCofactor = atKey['cof']
+
             __atKnownEccSizes = {
                 0: 32,
                 1: 48,
@@ -2918,9 +3275,6 @@ class HbootImage:
                 'cof': ulCofactor
             }
 
-        else:
-            raise Exception('Unknown key format.')
-
         return iKeyTyp_1ECC_2RSA, atAttr
 
     def __cert_parse_binding(self, tNodeParent, strName):
@@ -3433,53 +3787,8 @@ class HbootImage:
                 __atRootCert['RootPublicKey']['idx']
             )
 
-            # Create a temporary file for the keypair.
-            iFile, strPathKeypair = tempfile.mkstemp(
-                suffix='der',
-                prefix='tmp_hboot_image',
-                dir=None,
-                text=False
-            )
-            os.close(iFile)
-
-            # Create a temporary file for the data to sign.
-            iFile, strPathSignatureInputData = tempfile.mkstemp(
-                suffix='bin',
-                prefix='tmp_hboot_image',
-                dir=None,
-                text=False
-            )
-            os.close(iFile)
-
-            # Write the DER key to the temporary file.
-            tFile = open(strPathKeypair, 'wb')
-            tFile.write(strKeyDER)
-            tFile.close()
-
-            # Write the data to sign to the temporary file.
-            tFile = open(strPathSignatureInputData, 'wb')
-            tFile.write(atData.tostring())
-            tFile.close()
-
-            astrCmd = [
-                self.__cfg_openssl,
-                'dgst',
-                '-sign', strPathKeypair,
-                '-keyform', 'DER',
-                '-sha384'
-            ]
-            if self.__cfg_openssloptions:
-                astrCmd.extend(self.__cfg_openssloptions)
-            if not self.__fOpensslRandOff:
-                astrCmd.extend([
-                    '-sigopt', 'rsa_padding_mode:pss',
-                    '-sigopt', 'rsa_pss_saltlen:-1'])
-            astrCmd.append(strPathSignatureInputData)
-            strSignature = subprocess.check_output(astrCmd)
-
-            # Remove the temp files.
-            os.remove(strPathKeypair)
-            os.remove(strPathSignatureInputData)
+            # Sign the data.
+            strSignature = self.__cSigner.sign(strKeyDER, atData.tobytes())
 
             # Append the signature to the chunk.
             aulSignature = array.array('B', strSignature)
@@ -3606,53 +3915,8 @@ class HbootImage:
             # Get the key in DER encoded format.
             strKeyDER = __atCert['Key']['der']
 
-            # Create a temporary file for the keypair.
-            iFile, strPathKeypair = tempfile.mkstemp(
-                suffix='der',
-                prefix='tmp_hboot_image',
-                dir=None,
-                text=False
-            )
-            os.close(iFile)
-
-            # Create a temporary file for the data to sign.
-            iFile, strPathSignatureInputData = tempfile.mkstemp(
-                suffix='bin',
-                prefix='tmp_hboot_image',
-                dir=None,
-                text=False
-            )
-            os.close(iFile)
-
-            # Write the DER key to the temporary file.
-            tFile = open(strPathKeypair, 'wb')
-            tFile.write(strKeyDER)
-            tFile.close()
-
-            # Write the data to sign to the temporary file.
-            tFile = open(strPathSignatureInputData, 'wb')
-            tFile.write(atData.tostring())
-            tFile.close()
-
-            astrCmd = [
-                self.__cfg_openssl,
-                'dgst',
-                '-sign', strPathKeypair,
-                '-keyform', 'DER',
-                '-sha384'
-            ]
-            if self.__cfg_openssloptions:
-                astrCmd.extend(self.__cfg_openssloptions)
-            if not self.__fOpensslRandOff:
-                astrCmd.extend([
-                    '-sigopt', 'rsa_padding_mode:pss',
-                    '-sigopt', 'rsa_pss_saltlen:-1'])
-            astrCmd.append(strPathSignatureInputData)
-            strSignature = subprocess.check_output(astrCmd)
-
-            # Remove the temp files.
-            os.remove(strPathKeypair)
-            os.remove(strPathSignatureInputData)
+            # Sign the data.
+            strSignature = self.__cSigner.sign(strKeyDER, atData.tobytes())
 
             # Append the signature to the chunk.
             aulSignature = array.array('B', strSignature)
@@ -3805,53 +4069,8 @@ class HbootImage:
             # Get the key in DER encoded format.
             strKeyDER = __atCert['Key']['der']
 
-            # Create a temporary file for the keypair.
-            iFile, strPathKeypair = tempfile.mkstemp(
-                suffix='der',
-                prefix='tmp_hboot_image',
-                dir=None,
-                text=False
-            )
-            os.close(iFile)
-
-            # Create a temporary file for the data to sign.
-            iFile, strPathSignatureInputData = tempfile.mkstemp(
-                suffix='bin',
-                prefix='tmp_hboot_image',
-                dir=None,
-                text=False
-            )
-            os.close(iFile)
-
-            # Write the DER key to the temporary file.
-            tFile = open(strPathKeypair, 'wb')
-            tFile.write(strKeyDER)
-            tFile.close()
-
-            # Write the data to sign to the temporary file.
-            tFile = open(strPathSignatureInputData, 'wb')
-            tFile.write(atData.tostring())
-            tFile.close()
-
-            astrCmd = [
-                self.__cfg_openssl,
-                'dgst',
-                '-sign', strPathKeypair,
-                '-keyform', 'DER',
-                '-sha384'
-            ]
-            if self.__cfg_openssloptions:
-                astrCmd.extend(self.__cfg_openssloptions)
-            if not self.__fOpensslRandOff:
-                astrCmd.extend([
-                    '-sigopt', 'rsa_padding_mode:pss',
-                    '-sigopt', 'rsa_pss_saltlen:-1'])
-            astrCmd.append(strPathSignatureInputData)
-            strSignature = subprocess.check_output(astrCmd)
-
-            # Remove the temp files.
-            os.remove(strPathKeypair)
-            os.remove(strPathSignatureInputData)
+            # Sign the data.
+            strSignature = self.__cSigner.sign(strKeyDER, atData.tobytes())
 
             # Append the signature to the chunk.
             aulSignature = array.array('B', strSignature)
@@ -4039,53 +4258,8 @@ class HbootImage:
             # Get the key in DER encoded format.
             strKeyDER = __atCert['Key']['der']
 
-            # Create a temporary file for the keypair.
-            iFile, strPathKeypair = tempfile.mkstemp(
-                suffix='der',
-                prefix='tmp_hboot_image',
-                dir=None,
-                text=False
-            )
-            os.close(iFile)
-
-            # Create a temporary file for the data to sign.
-            iFile, strPathSignatureInputData = tempfile.mkstemp(
-                suffix='bin',
-                prefix='tmp_hboot_image',
-                dir=None,
-                text=False
-            )
-            os.close(iFile)
-
-            # Write the DER key to the temporary file.
-            tFile = open(strPathKeypair, 'wb')
-            tFile.write(strKeyDER)
-            tFile.close()
-
-            # Write the data to sign to the temporary file.
-            tFile = open(strPathSignatureInputData, 'wb')
-            tFile.write(atData.tostring())
-            tFile.close()
-
-            astrCmd = [
-                self.__cfg_openssl,
-                'dgst',
-                '-sign', strPathKeypair,
-                '-keyform', 'DER',
-                '-sha384'
-            ]
-            if self.__cfg_openssloptions:
-                astrCmd.extend(self.__cfg_openssloptions)
-            if not self.__fOpensslRandOff:
-                astrCmd.extend([
-                    '-sigopt', 'rsa_padding_mode:pss',
-                    '-sigopt', 'rsa_pss_saltlen:-1'])
-            astrCmd.append(strPathSignatureInputData)
-            strSignature = subprocess.check_output(astrCmd)
-
-            # Remove the temp files.
-            os.remove(strPathKeypair)
-            os.remove(strPathSignatureInputData)
+            # Sign the data.
+            strSignature = self.__cSigner.sign(strKeyDER, atData.tobytes())
 
             # Append the signature to the chunk.
             aulSignature = array.array('B', strSignature)
@@ -4176,7 +4350,7 @@ class HbootImage:
 
         # Get the hash for the chunk.
         tHash = hashlib.sha384()
-        tHash.update(aulChunk.tobytes())
+        tHash.update(aulChunk)
         strHash = tHash.digest()
         aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
         aulChunk.extend(aulHash)
@@ -4434,7 +4608,7 @@ class HbootImage:
 
             # Get the hash for the chunk.
             tHash = hashlib.sha384()
-            tHash.update(aulChunk.tobytes())
+            tHash.update(aulChunk)
             strHash = tHash.digest()
             aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
             aulChunk.extend(aulHash)
@@ -4508,46 +4682,13 @@ class HbootImage:
             # Get the key in DER encoded format.
             strKeyDER = __atCert['Key']['der']
 
-            # Create a temporary file for the keypair.
-            iFile, strPathKeypair = tempfile.mkstemp(
-                suffix='der',
-                prefix='tmp_hboot_image',
-                dir=None,
-                text=False
-            )
-            os.close(iFile)
-
-            # Create a temporary file for the data to sign.
-            iFile, strPathSignatureInputData = tempfile.mkstemp(
-                suffix='bin',
-                prefix='tmp_hboot_image',
-                dir=None,
-                text=False
-            )
-            os.close(iFile)
-
-            # Write the DER key to the temporary file.
-            tFile = open(strPathKeypair, 'wb')
-            tFile.write(strKeyDER)
-            tFile.close()
-
-            # Write the data to sign to the temporary file.
-            tFile = open(strPathSignatureInputData, 'wb')
-            tFile.write(aulChunk.tostring())
-            tFile.close()
-
+            # Sign the chunk.
             if iKeyTyp_1ECC_2RSA == 1:
-                astrCmd = [
-                    self.__cfg_openssl,
-                    'dgst',
-                    '-sign', strPathKeypair,
-                    '-keyform', 'DER',
-                    '-sha384'
-                ]
-                if self.__cfg_openssloptions:
-                    astrCmd.extend(self.__cfg_openssloptions)
-                astrCmd.append(strPathSignatureInputData)
-                strEccSignature = subprocess.check_output(astrCmd)
+                strEccSignature = self.__cSigner.sign(
+                    strKeyDER,
+                    aulChunk.tobytes(),
+                    False
+                )
                 aucEccSignature = array.array('B', strEccSignature)
 
                 # Parse the signature.
@@ -4557,29 +4698,15 @@ class HbootImage:
                 )
 
             elif iKeyTyp_1ECC_2RSA == 2:
-                astrCmd = [
-                    self.__cfg_openssl,
-                    'dgst',
-                    '-sign', strPathKeypair,
-                    '-keyform', 'DER',
-                    '-sha384'
-                ]
-                if self.__cfg_openssloptions:
-                    astrCmd.extend(self.__cfg_openssloptions)
-                if not self.__fOpensslRandOff:
-                    astrCmd.extend([
-                        '-sigopt', 'rsa_padding_mode:pss',
-                        '-sigopt', 'rsa_pss_saltlen:-1'])
-                astrCmd.append(strPathSignatureInputData)
-                strSignatureMirror = subprocess.check_output(astrCmd)
+                strSignatureMirror = self.__cSigner.sign(
+                    strKeyDER,
+                    aulChunk.tobytes(),
+                    True
+                )
                 aucSignature = array.array('B', strSignatureMirror)
                 # Mirror the signature.
                 aucSignature.reverse()
 
-            # Remove the temp files.
-            os.remove(strPathKeypair)
-            os.remove(strPathSignatureInputData)
-
             # Append the signature to the chunk.
             aulChunk.fromstring(aucSignature.tostring())
 
@@ -4919,46 +5046,13 @@ class HbootImage:
                 # Get the key in DER encoded format.
                 strKeyDER = __atData['Key']['der']
 
-                # Create a temporary file for the keypair.
-                iFile, strPathKeypair = tempfile.mkstemp(
-                    suffix='der',
-                    prefix='tmp_hboot_image',
-                    dir=None,
-                    text=False
-                )
-                os.close(iFile)
-
-                # Create a temporary file for the data to sign.
-                iFile, strPathSignatureInputData = tempfile.mkstemp(
-                    suffix='bin',
-                    prefix='tmp_hboot_image',
-                    dir=None,
-                    text=False
-                )
-                os.close(iFile)
-
-                # Write the DER key to the temporary file.
-                tFile = open(strPathKeypair, 'wb')
-                tFile.write(strKeyDER)
-                tFile.close()
-
-                # Write the data to sign to the temporary file.
-                tFile = open(strPathSignatureInputData, 'wb')
-                tFile.write(aulChunk.tostring())
-                tFile.close()
-
+                # Sign the chunk.
                 if iKeyTyp_1ECC_2RSA == 1:
-                    astrCmd = [
-                        self.__cfg_openssl,
-                        'dgst',
-                        '-sign', strPathKeypair,
-                        '-keyform', 'DER',
-                        '-sha384'
-                    ]
-                    if self.__cfg_openssloptions:
-                        astrCmd.extend(self.__cfg_openssloptions)
-                    astrCmd.append(strPathSignatureInputData)
-                    strEccSignature = subprocess.check_output(astrCmd)
+                    strEccSignature = self.__cSigner.sign(
+                        strKeyDER,
+                        aulChunk.tobytes(),
+                        False
+                    )
                     aucEccSignature = array.array('B', strEccSignature)
 
                     # Parse the signature.
@@ -4968,29 +5062,15 @@ class HbootImage:
                     )
 
                 elif iKeyTyp_1ECC_2RSA == 2:
-                    astrCmd = [
-                        self.__cfg_openssl,
-                        'dgst',
-                        '-sign', strPathKeypair,
-                        '-keyform', 'DER',
-                        '-sha384'
-                    ]
-                    if self.__cfg_openssloptions:
-                        astrCmd.extend(self.__cfg_openssloptions)
-                    if not self.__fOpensslRandOff:
-                        astrCmd.extend([
-                            '-sigopt', 'rsa_padding_mode:pss',
-                            '-sigopt', 'rsa_pss_saltlen:-1'])
-                    astrCmd.append(strPathSignatureInputData)
-                    strSignatureMirror = subprocess.check_output(astrCmd)
+                    strSignatureMirror = self.__cSigner.sign(
+                        strKeyDER,
+                        aulChunk.tobytes(),
+                        True
+                    )
                     aucSignature = array.array('B', strSignatureMirror)
                     # Mirror the signature.
                     aucSignature.reverse()
 
-                # Remove the temp files.
-                os.remove(strPathKeypair)
-                os.remove(strPathSignatureInputData)
-
                 # Append the fill-up.
                 aulChunk.extend([0] * sizFillUpInDwords)
 
@@ -5059,7 +5139,7 @@ class HbootImage:
 
         # Get the hash for the chunk.
         tHash = hashlib.sha384()
-        tHash.update(aulChunk.tostring())
+        tHash.update(aulChunk)
         strHash = tHash.digest()
         aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
         aulChunk.extend(aulHash)
@@ -5103,7 +5183,7 @@ class HbootImage:
 
         # Get the hash for the chunk.
         tHash = hashlib.sha384()
-        tHash.update(aulChunk.tostring())
+        tHash.update(aulChunk)
         strHash = tHash.digest()
         aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
         aulChunk.extend(aulHash)
@@ -5639,12 +5719,65 @@ class HbootImage:
 
         return atChunks
 
+    def __build_independent_chunk(self, tJob):
+        uiChunkIndex, atChunks = tJob
+        tAttr = atChunks[uiChunkIndex]
+
+        # The chunk does not depend on its offset. Poison the offset to
+        # find chunks which use it anyway.
+        atState = {
+            'uiPass': 0,
+            'atChunks': [],
+            'ulCurrentOffset': None,
+            'fMoreChunksAllowed': True
+        }
+
+        # Return the exception to raise it in the order of the chunks.
+        tError = None
+        try:
+            tAttr['pfnParser'](tAttr, atState, uiChunkIndex, atChunks)
+        except Exception as tException:
+            tError = tException
+        return tError
+
+    def __build_independent_chunks(self, atChunks):
+        # Collect all chunks which do not depend on their offset or on other
+        # chunks.
+        atJobs = []
+        for uiChunkIndex, tAttr in enumerate(atChunks):
+            if tAttr['strName'] not in self.__astrSequentialChunks:
+                atJobs.append((uiChunkIndex, atChunks))
+
+        uiThreads = min(self.__uiChunkThreads, len(atJobs))
+        if uiThreads > 1:
+            tPool = multiprocessing.pool.ThreadPool(uiThreads)
+            try:
+                atErrors = tPool.map(self.__build_independent_chunk, atJobs)
+            finally:
+                tPool.close()
+                tPool.join()
+        else:
+            atErrors = []
+            for tJob in atJobs:
+                atErrors.append(self.__build_independent_chunk(tJob))
+                if atErrors[-1] is not None:
+                    break
+
+        # Raise the error of the first failed chunk.
+        for tError in atErrors:
+            if tError is not None:
+                raise tError
+
     def __parse_chunks(self, atChunks):
         # Get the initial offset.
         ulOffsetInitial = self.__ulStartOffset
         if self.__fHasHeader is True:
             ulOffsetInitial += 64
 
+        # Build all chunks which do not depend on the offset first. This can
+        # run in parallel.
+        self.__build_independent_chunks(atChunks)
+
         # Create a new state.
         atState = {
             'uiPass': 0,
@@ -5653,7 +5786,8 @@ class HbootImage:
             'fMoreChunksAllowed': True
         }
 
-        # All operations should be finished in 2 passes.
+        # Now all chunks with a known size are finished. The remaining
+        # operations should be finished in 2 passes.
         fAllChunksAreFinished = None
         for uiPass in range(0, 2):
             # Set the current pass.
@@ -5677,12 +5811,13 @@ class HbootImage:
                     tAttr['pfnParser'](tAttr, atState, uiChunkIndex, atChunks)
                     # Update the global finish state.
                     fAllChunksAreFinished &= tAttr['fIsFinished']
-                    # Update the current position.
-                    if self.__tImageType == self.__IMAGE_TYPE_SECMEM:
-                        sizChunkInBytes = len(tAttr['atData'])
-                    else:
-                        sizChunkInBytes = len(tAttr['atData']) * 4
-                    atState['ulCurrentOffset'] += sizChunkInBytes
+
+                # Update the current position.
+                if self.__tImageType == self.__IMAGE_TYPE_SECMEM:
+                    sizChunkInBytes = len(tAttr['atData'])
+                else:
+                    sizChunkInBytes = len(tAttr['atData']) * 4
+                atState['ulCurrentOffset'] += sizChunkInBytes
 
             if fAllChunksAreFinished is True:
                 break
@@ -5690,9 +5825,80 @@ class HbootImage:
         if fAllChunksAreFinished is False:
             raise Exception('Some chunks are still not finished.')
 
-        # Collect all data from the chunks.
+        # Keep the data of all chunks. They are copied into the image
+        # buffer when the image is written.
         for tAttr in atChunks:
-            self.__atChunkData.extend(tAttr['atData'])
+            self.__atChunkData.append(tAttr['atData'])
+
+    def __get_preprocessed_image(self, strInput):
+        """ Read the image definition, replace all defines and preprocess it.
+
+        The document is shared with all other images of this process which
+        use the same file and configuration. It must not be modified.
+        """
+        # The result depends on the complete preprocessor configuration.
+        try:
+            tKey = (
+                os.path.abspath(strInput),
+                os.getcwd(),
+                self.__strNetxType,
+                frozenset(
+                    (strKey, type(tValue), tValue)
+                    for strKey, tValue in self.__atGlobalDefines.items()
+                ),
+                frozenset(self.__atKnownFiles.items()),
+                tuple(self.__astrIncludePaths),
+                self.__cSnippetLibrary
+            )
+            hash(tKey)
+        except TypeError:
+            # Some defines can not be hashed. Do not cache the result.
+            tKey = None
+
+        tResult = None
+        if tKey is not None:
+            tResult = s_tPreprocessedImages.get(tKey)
+
+        if tResult is not None:
+            tXml, astrDependencies = tResult
+            self.__astrDependencies = list(astrDependencies)
+            if self.__fVerbose:
+                print('[HBootImage] Reusing the preprocessed image "%s".' %
+                      strInput)
+        else:
+            # Initialize the list of dependencies.
+            self.__astrDependencies = []
+
+            # Get the state of the input before reading it.
+            atInputStamps = s_tPreprocessedImages.get_stamps([strInput])
+
+            # Read the complete input file as plain text.
+            tFile = open(strInput, 'rt')
+            strFileContents = tFile.read()
+            tFile.close()
+
+            # Replace and convert to XML.
+            tXml = self.__plaintext_to_xml_with_replace(
+                strFileContents,
+                self.__atGlobalDefines,
+                True
+            )
+
+            # Preprocess the image.
+            self.__preprocess(tXml)
+
+            if tKey is not None:
+                atStamps = atInputStamps + s_tPreprocessedImages.get_stamps(
+                    self.__astrDependencies
+                )
+                s_tPreprocessedImages.put(
+                    tKey,
+                    tXml,
+                    self.__astrDependencies,
+                    atStamps
+                )
+
+        return tXml
 
     def parse_image(self, tInput):
         # Parsing an image requires the patch definition.
@@ -5702,25 +5908,10 @@ class HbootImage:
                 'function, but none was specified!'
             )
 
-        # Initialize the list of dependencies.
-        self.__astrDependencies = []
-
-        # Read the complete input file as plain text.
-        tFile = open(tInput, 'rt')
-        strFileContents = tFile.read()
-        tFile.close()
-
-        # Replace and convert to XML.
-        tXml = self.__plaintext_to_xml_with_replace(
-            strFileContents,
-            self.__atGlobalDefines,
-            True
-        )
+        # Read and preprocess the image. This also sets the dependencies.
+        tXml = self.__get_preprocessed_image(tInput)
         tXmlRootNode = tXml.documentElement
 
-        # Preprocess the image.
-        self.__preprocess(tXml)
-
         # Get the type of the image. Default to "REGULAR".
         strType = tXmlRootNode.getAttribute('type')
         if len(strType) != 0:
@@ -5781,11 +5972,8 @@ class HbootImage:
                     fHasEndMarker = fBool
         self.__fHasEndMarker = fHasEndMarker
 
-        # SECMEM images are byte based, all other images are DWORD based.
-        if self.__tImageType == self.__IMAGE_TYPE_SECMEM:
-            self.__atChunkData = array.array('B')
-        else:
-            self.__atChunkData = array.array('I')
+        # No chunks yet.
+        self.__atChunkData = []
 
         # Get the hash size.
         # Default to 12 DWORDS for info page images.
@@ -5972,13 +6160,29 @@ class HbootImage:
     def write(self, strTargetPath):
         """ Write all compiled chunks to the file strTargetPath . """
 
+        # Get the size of all chunks in bytes.
+        sizChunks = 0
+        for atData in self.__atChunkData:
+            sizChunks += len(atData) * atData.itemsize
+
+        # This is the size of an additional hash after the chunks.
+        sizChunksHash = 0
+
+        # Only regular images get a standard header.
+        fBuildHeader = False
+
         if self.__tImageType == self.__IMAGE_TYPE_SECMEM:
             # Collect data for zone 2 and 3.
             aucZone2 = None
             aucZone3 = None
 
+            # Combine all chunks.
+            aucChunkData = array.array('B')
+            for atData in self.__atChunkData:
+                aucChunkData.extend(atData)
+
             # Get the size of the complete image.
-            uiImageSize = self.__atChunkData.buffer_info()[1]
+            uiImageSize = len(aucChunkData)
 
             # Up to 29 bytes fit into zone 2.
             if uiImageSize <= 29:
@@ -5989,7 +6193,7 @@ class HbootImage:
                 aucZone2.append(uiImageSize)
 
                 # Add the options.
-                aucZone2.extend(self.__atChunkData)
+                aucZone2.extend(aucChunkData)
 
                 # Fill up zone2 to 29 bytes.
                 if uiImageSize < 29:
@@ -6013,7 +6217,7 @@ class HbootImage:
                 aucTmp.append(uiImageSize)
 
                 # Add the options.
-                aucTmp.extend(self.__atChunkData)
+                aucTmp.extend(aucChunkData)
 
                 # Fill up the data to 61 bytes.
                 if uiImageSize < 61:
@@ -6043,82 +6247,67 @@ class HbootImage:
                     'or less, but it has %d bytes.' % uiImageSize
                 )
 
-            # Get a copy of the chunk data.
-            atChunks = array.array('B')
-            atChunks.extend(aucZone2)
-            atChunks.extend(aucZone3)
+            # Zone 2 and 3 replace the chunks.
+            atZones = array.array('B')
+            atZones.extend(aucZone2)
+            atZones.extend(aucZone3)
+            atChunkData = [atZones]
+            sizChunks = len(atZones)
 
             # Do not add headers in a SECMEM image.
-            atHeader = array.array('B')
+            atHeader = None
 
             # Do not add end markers in a SECMEM image.
-            atEndMarker = array.array('B')
+            atEndMarker = None
 
         elif(
             (self.__tImageType == self.__IMAGE_TYPE_COM_INFO_PAGE) or
             (self.__tImageType == self.__IMAGE_TYPE_APP_INFO_PAGE)
         ):
-            atChunks = self.__atChunkData
+            atChunkData = self.__atChunkData
 
             # The chunk data must have a size of 4048 bytes (1012 DWORDS).
-            sizChunksInDWORDs = len(atChunks)
+            sizChunksInDWORDs = sizChunks // 4
             if sizChunksInDWORDs != 1012:
                 raise Exception(
                     'The info page data without the hash must be 1012 '
                     'bytes, but it is %d bytes.' % sizChunksInDWORDs
                 )
 
-            # Build the hash for the info page.
-            tHash = hashlib.sha384()
-            tHash.update(atChunks.tostring())
-            strHash = tHash.digest()
-            aulHash = array.array('I', strHash)
-            atChunks.extend(aulHash)
-
-        else:
-            # Get a copy of the chunk data.
-            atChunks = array.array('I', self.__atChunkData)
-
-            # Terminate the chunks with a DWORD of 0.
-            atChunks.append(0x00000000)
-
-            # Generate the standard header.
-            atHeaderStandard = self.__build_standard_header(atChunks)
+            # The hash for the info page follows the chunks.
+            sizChunksHash = 48
 
-            # Insert flasher parameters if selected.
-            if self.__fSetFlasherParameters is True:
-                self.__set_flasher_parameters(atHeaderStandard)
+            atHeader = None
+            atEndMarker = None
 
-            # Combine the standard header with the overrides.
-            atHeader = self.__combine_headers(atHeaderStandard)
+        else:
+            atChunkData = self.__atChunkData
 
-            # Get a fresh copy of the chunk data.
-            atChunks = array.array('I', self.__atChunkData)
+            # The header is built from the chunks in the image buffer.
+            fBuildHeader = True
+            atHeader = None
 
             # Terminate the chunks with a DWORD of 0.
             atEndMarker = array.array('I', [0x00000000])
 
         # Get the size of the header, chunks and end marker.
         # Exclude any pre-padding.
-        ulFileSize = 0
+        sizHeader = 0
         if self.__fHasHeader is True:
-            ulFileSize += len(atHeader)*4
-        ulFileSize += len(atChunks)*4
-        if self.__fHasEndMarker is True:
-            ulFileSize += len(atEndMarker)*4
+            sizHeader = 64
+        sizEndMarker = 0
+        if self.__fHasEndMarker is True and atEndMarker is not None:
+            sizEndMarker = len(atEndMarker) * 4
+        ulFileSize = sizHeader + sizChunks + sizChunksHash + sizEndMarker
 
         print("Min. image size: 0x%08x" % self.__ulMinImageSize)
         print("File size:       0x%08x" % ulFileSize)
 
         # If a minimum size is set and the file is too small, extend it.
-        atFiller = None
+        sizFiller = 0
         if self.__ulMinImageSize > ulFileSize:
             ulFillSize = self.__ulMinImageSize - ulFileSize
-            ulFillSizeDwords = int(ulFillSize/4)
-            atFiller = array.array(
-                'I',
-                [self.__ulMinImageSizeFillValue] * ulFillSizeDwords
-            )
+            sizFiller = int(ulFillSize/4) * 4
             ulFileSize = self.__ulMinImageSize
 
         # If a maximum size is set, check the size
@@ -6131,31 +6320,66 @@ class HbootImage:
                 self.__ulMaxImageSize
             ))
 
-        # Write all components to the output file.
-        tFile = open(strTargetPath, 'wb')
-        if self.__ulPaddingPreSize != 0:
-            atPadding = array.array(
-                'B',
-                [self.__ucPaddingPreValue] * self.__ulPaddingPreSize
+        # Allocate the complete image and copy all chunks into it.
+        sizPadding = self.__ulPaddingPreSize
+        sizOffsetChunks = sizPadding + sizHeader
+        sizOffsetEnd = sizOffsetChunks + sizChunks + sizChunksHash
+        aucImage = bytearray(sizOffsetEnd + sizEndMarker + sizFiller)
+        tImage = memoryview(aucImage)
+
+        if sizPadding != 0:
+            tImage[0:sizPadding] = (
+                bytearray([self.__ucPaddingPreValue]) * sizPadding
             )
-            atPadding.tofile(tFile)
-        if self.__fHasHeader is True:
-            atHeader.tofile(tFile)
-        atChunks.tofile(tFile)
-        if self.__fHasEndMarker is True:
-            atEndMarker.tofile(tFile)
-        if atFiller is not None:
-            atFiller.tofile(tFile)
-        tFile.close()
 
-    def dependency_scan(self, strInput):
-        tXml = xml.dom.minidom.parse(strInput)
+        sizOffset = sizOffsetChunks
+        for atData in atChunkData:
+            tData = memoryview(atData).cast('B')
+            tImage[sizOffset:sizOffset + len(tData)] = tData
+            sizOffset += len(tData)
+        tChunks = tImage[sizOffsetChunks:sizOffsetChunks + sizChunks]
+
+        if sizChunksHash != 0:
+            # Build the hash for the info page.
+            tHash = hashlib.sha384()
+            tHash.update(tChunks)
+            tImage[sizOffset:sizOffset + sizChunksHash] = tHash.digest()
+
+        if fBuildHeader is True:
+            # Generate the standard header.
+            atHeaderStandard = self.__build_standard_header(tChunks.cast('I'))
 
-        # Initialize the list of dependencies.
-        self.__astrDependencies = []
+            # Insert flasher parameters if selected.
+            if self.__fSetFlasherParameters is True:
+                self.__set_flasher_parameters(atHeaderStandard)
 
-        # Preprocess the image.
-        self.__preprocess(tXml)
+            # Combine the standard header with the overrides.
+            atHeader = self.__combine_headers(atHeaderStandard)
+
+        if sizHeader != 0 and atHeader is not None:
+            tImage[sizPadding:sizOffsetChunks] = memoryview(atHeader).cast('B')
+
+        if sizEndMarker != 0:
+            tImage[sizOffsetEnd:sizOffsetEnd + sizEndMarker] = \
+                memoryview(atEndMarker).cast('B')
+
+        if sizFiller != 0:
+            atFiller = array.array(
+                'I',
+                [self.__ulMinImageSizeFillValue]
+            )
+            tImage[sizOffsetEnd + sizEndMarker:] = \
+                memoryview(atFiller).cast('B').tobytes() * (sizFiller // 4)
+
+        # Write the complete image to the output file.
+        tFile = open(strTargetPath, 'wb')
+        tFile.write(aucImage)
+        tFile.close()
+
+    def dependency_scan(self, strInput):
+        # Read and preprocess the image. The build step of the same process
+        # reuses the result.
+        tXml = self.__get_preprocessed_image(strInput)
 
         # Scan the complete definition for "File" nodes.
         atFileNodes = tXml.getElementsByTagName('File')
@@ -0,0 +1,558 @@
+# -*- coding: utf-8 -*-
+
+# ***************************************************************************
+# *   Copyright (C) 2019 by Hilscher GmbH                                   *
+# *   netXsupport@hilscher.com                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation; either version 2 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program; if not, write to the                         *
+# *   Free Software Foundation, Inc.,                                       *
+# *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+# ***************************************************************************
+
+import base64
+import binascii
+import hashlib
+import os
+import threading
+import xml.etree.ElementTree
+
+
+# Object identifiers of the supported key types as DER contents.
+OID_RSA_ENCRYPTION = bytearray(binascii.unhexlify('2a864886f70d010101'))
+OID_EC_PUBLIC_KEY = bytearray(binascii.unhexlify('2a8648ce3d0201'))
+OID_PRIME_FIELD = bytearray(binascii.unhexlify('2a8648ce3d0101'))
+
+# The explicit parameters of the supported named curves. They are indexed by
+# the DER contents of the curve OID. The generator is the uncompressed point
+# without the leading 0x04.
+atNamedCurves = {
+    # prime256v1 / secp256r1
+    '2a8648ce3d030107': {
+        'p': 'ffffffff00000001000000000000000000000000ffffffffffffffff'
+             'ffffffff',
+        'a': 'ffffffff00000001000000000000000000000000ffffffffffffffff'
+             'fffffffc',
+        'b': '5ac635d8aa3a93e7b3ebbd55769886bc651d06b0cc53b0f63bce3c3e'
+             '27d2604b',
+        'G': '6b17d1f2e12c4247f8bce6e563a440f277037d812deb33a0f4a13945'
+             'd898c2964fe342e2fe1a7f9b8ee7eb4a7c0f9e162bce33576b315ece'
+             'cbb6406837bf51f5',
+        'n': 'ffffffff00000000ffffffffffffffffbce6faada7179e84f3b9cac2'
+             'fc632551',
+        'cof': 1
+    },
+    # secp384r1
+    '2b81040022': {
+        'p': 'ffffffffffffffffffffffffffffffffffffffffffffffffffffffff'
+             'fffffffeffffffff0000000000000000ffffffff',
+        'a': 'ffffffffffffffffffffffffffffffffffffffffffffffffffffffff'
+             'fffffffeffffffff0000000000000000fffffffc',
+        'b': 'b3312fa7e23ee7e4988e056be3f82d19181d9c6efe8141120314088f'
+             '5013875ac656398d8a2ed19d2a85c8edd3ec2aef',
+        'G': 'aa87ca22be8b05378eb1c71ef320ad746e1d3b628ba79b9859f741e0'
+             '82542a385502f25dbf55296c3a545e3872760ab73617de4a96262c6f'
+             '5d9e98bf9292dc29f8f41dbd289a147ce9da3113b5f0b8c00a60b1ce'
+             '1d7e819d7a431d7c90ea0e5f',
+        'n': 'ffffffffffffffffffffffffffffffffffffffffffffffffc7634d81'
+             'f4372ddf581a0db248b0a77aecec196accc52973',
+        'cof': 1
+    },
+    # brainpoolP256r1
+    '2b2403030208010107': {
+        'p': 'a9fb57dba1eea9bc3e660a909d838d726e3bf623d52620282013481d'
+             '1f6e5377',
+        'a': '7d5a0975fc2c3057eef67530417affe7fb8055c126dc5c6ce94a4b44'
+             'f330b5d9',
+        'b': '26dc5c6ce94a4b44f330b5d9bbd77cbf958416295cf7e1ce6bccdc18'
+             'ff8c07b6',
+        'G': '8bd2aeb9cb7e57cb2c4b482ffc81b7afb9de27e1e3bd23c23a4453bd'
+             '9ace3262547ef835c3dac4fd97f8461a14611dc9c27745132ded8e54'
+             '5c1d54c72f046997',
+        'n': 'a9fb57dba1eea9bc3e660a909d838d718c397aa3b561a6f7901e0e82'
+             '974856a7',
+        'cof': 1
+    },
+    # brainpoolP384r1
+    '2b240303020801010b': {
+        'p': '8cb91e82a3386d280f5d6f7e50e641df152f7109ed5456b412b1da19'
+             '7fb71123acd3a729901d1a71874700133107ec53',
+        'a': '7bc382c63d8c150c3c72080ace05afa0c2bea28e4fb22787139165ef'
+             'ba91f90f8aa5814a503ad4eb04a8c7dd22ce2826',
+        'b': '04a8c7dd22ce28268b39b55416f0447c2fb77de107dcd2a62e880ea5'
+             '3eeb62d57cb4390295dbc9943ab78696fa504c11',
+        'G': '1d1c64f068cf45ffa2a63a81b7c13f6b8847a3e77ef14fe3db7fcafe'
+             '0cbd10e8e826e03436d646aaef87b2e247d4af1e8abe1d7520f9c2a4'
+             '5cb1eb8e95cfd55262b70b29feec5864e19c054ff99129280e464621'
+             '7791811142820341263c5315',
+        'n': '8cb91e82a3386d280f5d6f7e50e641df152f7109ed5456b31f166e6c'
+             'ac0425a7cf3ab6af6b7fc3103b883202e9046565',
+        'cof': 1
+    },
+    # brainpoolP512r1
+    '2b240303020801010d': {
+        'p': 'aadd9db8dbe9c48b3fd4e6ae33c9fc07cb308db3b3c9d20ed6639cca'
+             '703308717d4d9b009bc66842aecda12ae6a380e62881ff2f2d82c685'
+             '28aa6056583a48f3',
+        'a': '7830a3318b603b89e2327145ac234cc594cbdd8d3df91610a83441ca'
+             'ea9863bc2ded5d5aa8253aa10a2ef1c98b9ac8b57f1117a72bf2c7b9'
+             'e7c1ac4d77fc94ca',
+        'b': '3df91610a83441caea9863bc2ded5d5aa8253aa10a2ef1c98b9ac8b5'
+             '7f1117a72bf2c7b9e7c1ac4d77fc94cadc083e67984050b75ebae5dd'
+             '2809bd638016f723',
+        'G': '81aee4bdd82ed9645a21322e9c4c6a9385ed9f70b5d916c1b43b62ee'
+             'f4d0098eff3b1f78e2d0d48d50d1687b93b97d5f7c6d5047406a5e68'
+             '8b352209bcb9f8227dde385d566332ecc0eabfa9cf7822fdf209f700'
+             '24a57b1aa000c55b881f8111b2dcde494a5f485e5bca4bd88a2763ae'
+             'd1ca2b2fa8f0540678cd1e0f3ad80892',
+        'n': 'aadd9db8dbe9c48b3fd4e6ae33c9fc07cb308db3b3c9d20ed6639cca'
+             '70330870553e5c414ca92619418661197fac10471db1d381085ddadd'
+             'b58796829ca90069',
+        'cof': 1
+    }
+}
+
+
+class DerFormatError(Exception):
+    pass
+
+
+class DerDecoder:
+    """ A minimal DER decoder for RSA and EC keys.
+
+    It understands PKCS#1, PKCS#8, SEC1 and SubjectPublicKeyInfo structures.
+    Keys with named curves are expanded with the parameters from
+    atNamedCurves, just like "openssl ec -param_enc explicit" does.
+    """
+    TAG_INTEGER = 0x02
+    TAG_BIT_STRING = 0x03
+    TAG_OCTET_STRING = 0x04
+    TAG_OID = 0x06
+    TAG_SEQUENCE = 0x30
+    TAG_CONTEXT_0 = 0xa0
+    TAG_CONTEXT_1 = 0xa1
+
+    def __read_element(self, aucData, uiOffset):
+        # Return the tag, the contents and the offset of the next element.
+        if uiOffset + 2 > len(aucData):
+            raise DerFormatError('Unexpected end of data.')
+        ucTag = aucData[uiOffset]
+        sizLength = aucData[uiOffset + 1]
+        uiOffset += 2
+        if sizLength & 0x80:
+            sizLengthBytes = sizLength & 0x7f
+            if sizLengthBytes == 0 or sizLengthBytes > 4:
+                raise DerFormatError('Invalid length.')
+            if uiOffset + sizLengthBytes > len(aucData):
+                raise DerFormatError('Unexpected end of data.')
+            sizLength = 0
+            for ucByte in aucData[uiOffset:uiOffset + sizLengthBytes]:
+                sizLength = (sizLength << 8) | ucByte
+            uiOffset += sizLengthBytes
+        if uiOffset + sizLength > len(aucData):
+            raise DerFormatError('Unexpected end of data.')
+        aucContents = aucData[uiOffset:uiOffset + sizLength]
+        return ucTag, aucContents, uiOffset + sizLength
+
+    def __read_sequence(self, aucData):
+        # Split the contents of a constructed element into its elements.
+        atElements = []
+        uiOffset = 0
+        while uiOffset < len(aucData):
+            ucTag, aucContents, uiOffset = self.__read_element(
+                aucData,
+                uiOffset
+            )
+            atElements.append((ucTag, aucContents))
+        return atElements
+
+    def __read_single(self, aucData, ucTag):
+        ucTagElement, aucContents, uiOffset = self.__read_element(aucData, 0)
+        if ucTagElement != ucTag or uiOffset != len(aucData):
+            raise DerFormatError('Expected a single element 0x%02x.' % ucTag)
+        return aucContents
+
+    def __expect(self, tElement, ucTag):
+        if tElement[0] != ucTag:
+            raise DerFormatError('Expected tag 0x%02x, found 0x%02x.' % (
+                ucTag,
+                tElement[0]
+            ))
+        return tElement[1]
+
+    def __integer(self, tElement):
+        aucData = self.__expect(tElement, self.TAG_INTEGER)
+        if len(aucData) == 0 or aucData[0] & 0x80:
+            raise DerFormatError('Negative integers are not supported.')
+        return int(binascii.hexlify(aucData), 16)
+
+    def __bit_string(self, tElement):
+        aucData = self.__expect(tElement, self.TAG_BIT_STRING)
+        if len(aucData) == 0 or aucData[0] != 0:
+            raise DerFormatError('Only byte aligned bit strings are '
+                                 'supported.')
+        return aucData[1:]
+
+    def __algorithm(self, tElement):
+        # Return the OID and the parameters of an AlgorithmIdentifier.
+        atAlgorithm = self.__read_sequence(
+            self.__expect(tElement, self.TAG_SEQUENCE)
+        )
+        if len(atAlgorithm) == 0:
+            raise DerFormatError('Empty AlgorithmIdentifier.')
+        aucOid = self.__expect(atAlgorithm[0], self.TAG_OID)
+        tParameters = None
+        if len(atAlgorithm) > 1:
+            tParameters = atAlgorithm[1]
+        return aucOid, tParameters
+
+    def __rsa_private_key(self, aucData):
+        # RSAPrivateKey from PKCS#1.
+        atKey = self.__read_sequence(
+            self.__read_single(aucData, self.TAG_SEQUENCE)
+        )
+        if len(atKey) < 3 or self.__integer(atKey[0]) != 0:
+            raise DerFormatError('Invalid RSA private key.')
+        return {
+            'mod': self.__integer(atKey[1]),
+            'exp': self.__integer(atKey[2])
+        }
+
+    def __rsa_public_key(self, aucData):
+        # RSAPublicKey from PKCS#1.
+        atKey = self.__read_sequence(
+            self.__read_single(aucData, self.TAG_SEQUENCE)
+        )
+        if len(atKey) != 2:
+            raise DerFormatError('Invalid RSA public key.')
+        return {
+            'mod': self.__integer(atKey[0]),
+            'exp': self.__integer(atKey[1])
+        }
+
+    def __ec_parameters(self, tElement):
+        # Return the curve parameters for a named or explicit curve.
+        if tElement is None:
+            raise DerFormatError('The EC key has no curve parameters.')
+
+        if tElement[0] == self.TAG_OID:
+            strOid = binascii.hexlify(tElement[1]).decode('ascii')
+            if strOid not in atNamedCurves:
+                raise DerFormatError('Unknown named curve %s.' % strOid)
+            atCurve = atNamedCurves[strOid]
+            aucG = bytearray(binascii.unhexlify(atCurve['G']))
+            sizField = len(aucG) // 2
+            return {
+                'p': int(atCurve['p'], 16),
+                'a': int(atCurve['a'], 16),
+                'b': int(atCurve['b'], 16),
+                'Gx': int(binascii.hexlify(aucG[:sizField]), 16),
+                'Gy': int(binascii.hexlify(aucG[sizField:]), 16),
+                'n': int(atCurve['n'], 16),
+                'cof': atCurve['cof']
+            }
+
+        # ECParameters from SEC1 with an explicit prime field.
+        atParams = self.__read_sequence(
+            self.__expect(tElement, self.TAG_SEQUENCE)
+        )
+        if len(atParams) < 6 or self.__integer(atParams[0]) != 1:
+            raise DerFormatError('Unsupported EC parameters.')
+        atField = self.__read_sequence(
+            self.__expect(atParams[1], self.TAG_SEQUENCE)
+        )
+        if(
+            len(atField) != 2 or
+            self.__expect(atField[0], self.TAG_OID) != OID_PRIME_FIELD
+        ):
+            raise DerFormatError('Only prime fields are supported.')
+        atCurve = self.__read_sequence(
+            self.__expect(atParams[2], self.TAG_SEQUENCE)
+        )
+        if len(atCurve) < 2:
+            raise DerFormatError('Invalid curve.')
+        ulGx, ulGy = self.__ec_point(
+            self.__expect(atParams[3], self.TAG_OCTET_STRING)
+        )
+        return {
+            'p': self.__integer(atField[1]),
+            'a': int(binascii.hexlify(
+                self.__expect(atCurve[0], self.TAG_OCTET_STRING)
+            ), 16),
+            'b': int(binascii.hexlify(
+                self.__expect(atCurve[1], self.TAG_OCTET_STRING)
+            ), 16),
+            'Gx': ulGx,
+            'Gy': ulGy,
+            'n': self.__integer(atParams[4]),
+            'cof': self.__integer(atParams[5])
+        }
+
+    def __ec_point(self, aucPoint):
+        # The data must not be compressed.
+        if len(aucPoint) == 0 or aucPoint[0] != 0x04:
+            raise Exception('The data is compressed. '
+                            'This is not supported yet.')
+        sizField = (len(aucPoint) - 1) // 2
+        aucX = aucPoint[1:1 + sizField]
+        aucY = aucPoint[1 + sizField:]
+        return (
+            int(binascii.hexlify(aucX), 16),
+            int(binascii.hexlify(aucY), 16)
+        )
+
+    def __ec_multiply(self, ulK, ulX, ulY, atCurve):
+        # Compute k * (x, y) in affine coordinates. This is only needed for
+        # private keys without a public key, so speed does not matter.
+        ulP = atCurve['p']
+
+        def add(tP1, tP2):
+            if tP1 is None:
+                return tP2
+            if tP2 is None:
+                return tP1
+            (ulX1, ulY1) = tP1
+            (ulX2, ulY2) = tP2
+            if ulX1 == ulX2:
+                if (ulY1 + ulY2) % ulP == 0:
+                    return None
+                ulL = (3 * ulX1 * ulX1 + atCurve['a']) * \
+                    pow(2 * ulY1, ulP - 2, ulP)
+            else:
+                ulL = (ulY2 - ulY1) * pow(ulX2 - ulX1, ulP - 2, ulP)
+            ulL %= ulP
+            ulX3 = (ulL * ulL - ulX1 - ulX2) % ulP
+            return ulX3, (ulL * (ulX1 - ulX3) - ulY1) % ulP
+
+        tResult = None
+        tAddend = (ulX, ulY)
+        while ulK != 0:
+            if ulK & 1:
+                tResult = add(tResult, tAddend)
+            tAddend = add(tAddend, tAddend)
+            ulK >>= 1
+        if tResult is None:
+            raise DerFormatError('Invalid EC private key.')
+        return tResult
+
+    def __ec_private_key(self, aucData, tParameters):
+        # ECPrivateKey from SEC1.
+        atKey = self.__read_sequence(
+            self.__read_single(aucData, self.TAG_SEQUENCE)
+        )
+        if len(atKey) < 2 or self.__integer(atKey[0]) != 1:
+            raise DerFormatError('Invalid EC private key.')
+        aucPriv = self.__expect(atKey[1], self.TAG_OCTET_STRING)
+        aucPub = None
+        for tElement in atKey[2:]:
+            if tElement[0] == self.TAG_CONTEXT_0:
+                tParameters = self.__read_element(tElement[1], 0)[:2]
+            elif tElement[0] == self.TAG_CONTEXT_1:
+                aucPub = self.__bit_string(
+                    self.__read_element(tElement[1], 0)[:2]
+                )
+
+        atCurve = self.__ec_parameters(tParameters)
+        ulD = int(binascii.hexlify(aucPriv), 16)
+        if aucPub is None:
+            ulQx, ulQy = self.__ec_multiply(
+                ulD,
+                atCurve['Gx'],
+                atCurve['Gy'],
+                atCurve
+            )
+        else:
+            ulQx, ulQy = self.__ec_point(aucPub)
+
+        atCurve['d'] = ulD
+        atCurve['Qx'] = ulQx
+        atCurve['Qy'] = ulQy
+        return atCurve
+
+    def __private_key_info(self, atKey):
+        # PrivateKeyInfo from PKCS#8.
+        if len(atKey) < 3 or self.__integer(atKey[0]) != 0:
+            raise DerFormatError('Invalid PKCS#8 private key.')
+        aucOid, tParameters = self.__algorithm(atKey[1])
+        aucKey = self.__expect(atKey[2], self.TAG_OCTET_STRING)
+        if aucOid == OID_RSA_ENCRYPTION:
+            return 2, self.__rsa_private_key(aucKey)
+        elif aucOid == OID_EC_PUBLIC_KEY:
+            return 1, self.__ec_private_key(aucKey, tParameters)
+        raise DerFormatError('Unknown key algorithm.')
+
+    def __subject_public_key_info(self, atKey):
+        aucOid, tParameters = self.__algorithm(atKey[0])
+        aucKey = self.__bit_string(atKey[1])
+        if aucOid == OID_RSA_ENCRYPTION:
+            return 2, self.__rsa_public_key(aucKey)
+        raise DerFormatError('Only RSA public keys are supported.')
+
+    def decode(self, strKeyDER):
+        """ Decode a DER key.
+
+        Return a tuple with the key type (1 for ECC, 2 for RSA) and a
+        dictionary with the numbers of the key.
+        """
+        aucData = bytearray(strKeyDER)
+        atKey = self.__read_sequence(
+            self.__read_single(aucData, self.TAG_SEQUENCE)
+        )
+        if len(atKey) == 0:
+            raise DerFormatError('Empty key.')
+
+        if atKey[0][0] == self.TAG_SEQUENCE:
+            return self.__subject_public_key_info(atKey)
+        elif len(atKey) == 2:
+            return 2, self.__rsa_public_key(aucData)
+
+        ulVersion = self.__integer(atKey[0])
+        if ulVersion == 0 and atKey[1][0] == self.TAG_SEQUENCE:
+            return self.__private_key_info(atKey)
+        elif ulVersion == 0:
+            return 2, self.__rsa_private_key(aucData)
+        elif ulVersion == 1:
+            return 1, self.__ec_private_key(aucData, None)
+        raise DerFormatError('Unknown key format.')
+
+
+def _to_little_endian(ulValue, sizMin=0):
+    # Convert a number to a little endian byte string with at least sizMin
+    # bytes.
+    strHex = '%x' % ulValue
+    sizBytes = max((len(strHex) + 1) // 2, sizMin)
+    aucData = bytearray(binascii.unhexlify(strHex.zfill(sizBytes * 2)))
+    aucData.reverse()
+    return bytes(aucData)
+
+
+def _size_of(ulValue):
+    return max((len('%x' % ulValue) + 1) // 2, 1)
+
+
+def decode_key(strKeyDER, fIsPublicKey):
+    """ Decode the numbers of a DER key without OpenSSL.
+
+    The result has the same form as the text output of OpenSSL after the
+    leading zeros are cut and all numbers are converted to little endian.
+    RSA keys have "mod" and "exp", ECC keys have "d", "Qx", "Qy", "p", "a",
+    "b", "Gx", "Gy", "n" and "cof". Only the exponent and the cofactor are
+    plain integers.
+    """
+    iKeyTyp_1ECC_2RSA, atKey = DerDecoder().decode(strKeyDER)
+
+    if iKeyTyp_1ECC_2RSA == 2:
+        atAttr = {
+            'mod': _to_little_endian(atKey['mod']),
+            'exp': atKey['exp']
+        }
+    else:
+        if fIsPublicKey is True:
+            raise DerFormatError('Public ECC keys are not supported.')
+        # The private key and the curve coefficients are elements of the
+        # field, so they always have the size of the prime.
+        sizField = _size_of(atKey['p'])
+        atAttr = {
+            'd': _to_little_endian(atKey['d'], sizField),
+            'Qx': _to_little_endian(atKey['Qx'], sizField),
+            'Qy': _to_little_endian(atKey['Qy'], sizField),
+            'p': _to_little_endian(atKey['p']),
+            'a': _to_little_endian(atKey['a'], sizField),
+            'b': _to_little_endian(atKey['b'], sizField),
+            'Gx': _to_little_endian(atKey['Gx'], sizField),
+            'Gy': _to_little_endian(atKey['Gy'], sizField),
+            'n': _to_little_endian(atKey['n']),
+            'cof': atKey['cof']
+        }
+
+    return iKeyTyp_1ECC_2RSA, atAttr
+
+
+# The decoded keys of this process indexed by the hash of the DER data.
+s_atKeys = {}
+
+# The keyroms of this process indexed by their path.
+s_atKeyroms = {}
+
+s_tRegistryLock = threading.Lock()
+
+
+def get_key(strKeyDER, fIsPublicKey, fnFallback=None):
+    """ Return the decoded numbers of a DER key.
+
+    Each key is decoded only once per process. Keys which can not be decoded
+    natively are passed to fnFallback, if it is set. The result must not be
+    modified by the caller.
+    """
+    tKey = (hashlib.sha384(strKeyDER).digest(), fIsPublicKey is True)
+    with s_tRegistryLock:
+        tResult = s_atKeys.get(tKey)
+    if tResult is None:
+        try:
+            tResult = decode_key(strKeyDER, fIsPublicKey)
+        except DerFormatError:
+            if fnFallback is None:
+                raise
+            tResult = fnFallback(strKeyDER, fIsPublicKey)
+        with s_tRegistryLock:
+            s_atKeys[tKey] = tResult
+    return tResult
+
+
+def _keyrom_stamp(strKeyromFile):
+    tStat = os.stat(strKeyromFile)
+    return tStat.st_mtime, tStat.st_size
+
+
+def _parse_keyrom(strKeyromFile):
+    # Map the index attribute of each entry to the DER key or an error.
+    tFile = open(strKeyromFile, 'rt')
+    strXml = tFile.read()
+    tFile.close()
+    tXml = xml.etree.ElementTree.fromstring(strXml)
+
+    atEntries = {}
+    for tNode in tXml.findall('Entry'):
+        strIndex = tNode.get('index')
+        if strIndex is None or strIndex in atEntries:
+            continue
+        tNode_key = tNode.find('Key')
+        tNode_hash = tNode.find('Hash')
+        if tNode_key is None:
+            atEntries[strIndex] = (None, 'has no "Key" child')
+        elif tNode_hash is None:
+            atEntries[strIndex] = (None, 'has no "Hash" child')
+        else:
+            # Decode the BASE64 data. Now we have the key pair in DER format.
+            atEntries[strIndex] = (base64.b64decode(tNode_key.text), None)
+    return atEntries
+
+
+def get_keyrom(strKeyromFile):
+    """ Return the keys of a keyrom file.
+
+    The result maps the "index" attribute of each entry to a tuple with the
+    DER key and an error message. The file is parsed again only if it
+    changed.
+    """
+    strKeyromFile = os.path.abspath(strKeyromFile)
+    tStamp = _keyrom_stamp(strKeyromFile)
+    with s_tRegistryLock:
+        tCached = s_atKeyroms.get(strKeyromFile)
+    if tCached is not None and tCached[0] == tStamp:
+        atEntries = tCached[1]
+    else:
+        atEntries = _parse_keyrom(strKeyromFile)
+        with s_tRegistryLock:
+            s_atKeyroms[strKeyromFile] = (tStamp, atEntries)
+    return atEntries
@@ -39,7 +39,6 @@ import re
 import string
 import platform
 import subprocess
-import tempfile
 import xml.dom.minidom
 import xml.etree.ElementTree
 
@@ -49,6 +48,12 @@ if __name__ != '__main__':
     # No -> import the SCons module.
     import SCons.Script
 
+    from . import signer
+    from . import signing_service
+else:
+    import signer
+    import signing_service
+
 
 class AppImage:
     # This is the environment.
@@ -79,8 +84,12 @@ class AppImage:
     __fOpensslRandOff = False
     __signed_binding = False
 
+    # This signs the ASIG chunk.
+    __cSigner = None
+
     def __init__(self, tEnv, strNetxType, astrIncludePaths, atKnownFiles,
-                 ulSDRamSplitOffset, strOpensslExe, fOpensslRandOff):
+                 ulSDRamSplitOffset, strOpensslExe, fOpensslRandOff,
+                 strSigningService=None):
         self.__tEnv = tEnv
         self.__astrIncludePaths = astrIncludePaths
         self.__atKnownFiles = atKnownFiles
@@ -92,6 +101,21 @@ class AppImage:
         self.__cfg_openssloptions = []
         self.__fOpensslRandOff = fOpensslRandOff
 
+        # Send the signatures to the signing service if there is one.
+        if strSigningService is not None:
+            self.__cSigner = signing_service.SigningClient(
+                strSigningService,
+                strOpensslExe,
+                self.__cfg_openssloptions,
+                not fOpensslRandOff
+            )
+        else:
+            self.__cSigner = signer.get_signer(
+                strOpensslExe,
+                self.__cfg_openssloptions,
+                not fOpensslRandOff
+            )
+
     def segments_init(self):
         self.__tElfSegments = {}
 
@@ -401,26 +425,11 @@ class AppImage:
                 pulLoadAddress = int(strOverwriteAddress, 0)
 
             # Extract the binary.
-            tBinFile, strBinFileName = tempfile.mkstemp()
-            os.close(tBinFile)
-            astrCmd = [
-                self.__tEnv['OBJCOPY'],
-                '--output-target=binary'
-            ]
-            if astrSegmentsToDump is not None:
-                for strSegment in astrSegmentsToDump:
-                    astrCmd.append('--only-section=%s' % strSegment)
-            astrCmd.append(strAbsFilePath)
-            astrCmd.append(strBinFileName)
-            subprocess.check_call(astrCmd)
-
-            # Get the application data.
-            tBinFile = open(strBinFileName, 'rb')
-            strData = tBinFile.read()
-            tBinFile.close()
-
-            # Remove the temp file.
-            os.remove(strBinFileName)
+            strData = elf_support.get_binary_data(
+                self.__tEnv,
+                strAbsFilePath,
+                astrSegmentsToDump
+            )
 
         return strData, pulLoadAddress
 
@@ -1142,56 +1151,34 @@ class AppImage:
         # Get the key in DER encoded format.
         strKeyDER = __atCert['Key']['der']
 
-        # Create a temporary file for the keypair.
-        iFile, strPathKeypair = tempfile.mkstemp(
-            suffix='der',
-            prefix='tmp_hboot_image',
-            dir=None,
-            text=False
-        )
-        os.close(iFile)
-
-        # Create a temporary file for the data to sign.
-        iFile, strPathSignatureInputData = tempfile.mkstemp(
-            suffix='bin',
-            prefix='tmp_hboot_image',
-            dir=None,
-            text=False
-        )
-        os.close(iFile)
-
-        # Write the DER key to the temporary file.
-        tFile = open(strPathKeypair, 'wb')
-        tFile.write(strKeyDER)
-        tFile.close()
-
-        tFile = open(strPathSignatureInputData, 'wb')
+        # Collect the data to sign.
+        atSignatureInputData = []
         if self.__signed_binding is False:
-            # Write the data from the fw to the file
-            # Write the data to sign to the temporary file.
+            # Sign the data from the fw.
             aulChunk0Data = self.__atDataBlocks[0]['data']
-            tFile.write(aulChunk0Data[0:112])
-            tFile.write(aulChunk0Data[128:])
+            atSignatureInputData.append(aulChunk0Data[0:112])
+            atSignatureInputData.append(aulChunk0Data[128:])
             sizDataBlocks = len(self.__atDataBlocks)
             for sizCnt in range(1, sizDataBlocks):
-                tFile.write(self.__atDataBlocks[sizCnt]['header'])
-                tFile.write(self.__atDataBlocks[sizCnt]['data'])
+                atSignatureInputData.append(
+                    self.__atDataBlocks[sizCnt]['header']
+                )
+                atSignatureInputData.append(
+                    self.__atDataBlocks[sizCnt]['data']
+                )
         else:
-            # Write the data from the chunk to the file instead of the whole fw
-            tFile.write(aulChunk)
-        tFile.close()
+            # Sign the data from the chunk instead of the whole fw.
+            atSignatureInputData.append(aulChunk)
+        strSignatureInputData = b''.join(
+            self.__array_to_bytes(atData) for atData in atSignatureInputData
+        )
 
         if iKeyTyp_1ECC_2RSA == 1:
-            astrCmd = [
-                self.__cfg_openssl,
-                'dgst',
-                '-sign', strPathKeypair,
-                '-keyform', 'DER',
-                '-sha384'
-            ]
-            astrCmd.extend(self.__cfg_openssloptions)
-            astrCmd.append(strPathSignatureInputData)
-            strEccSignature = subprocess.check_output(astrCmd)
+            strEccSignature = self.__cSigner.sign(
+                strKeyDER,
+                strSignatureInputData,
+                False
+            )
             aucEccSignature = array.array('B', strEccSignature)
 
             # Parse the signature.
@@ -1201,29 +1188,15 @@ class AppImage:
             )
 
         elif iKeyTyp_1ECC_2RSA == 2:
-            astrCmd = [
-                self.__cfg_openssl,
-                'dgst',
-                '-sign', strPathKeypair,
-                '-keyform', 'DER',
-                '-sha384'
-            ]
-            if self.__cfg_openssloptions:
-                astrCmd.extend(self.__cfg_openssloptions)
-            if not self.__fOpensslRandOff:
-                astrCmd.extend([
-                    '-sigopt', 'rsa_padding_mode:pss',
-                    '-sigopt', 'rsa_pss_saltlen:-1'])
-            astrCmd.append(strPathSignatureInputData)
-            strSignatureMirror = subprocess.check_output(astrCmd)
+            strSignatureMirror = self.__cSigner.sign(
+                strKeyDER,
+                strSignatureInputData,
+                True
+            )
             aucSignature = array.array('B', strSignatureMirror)
             # Mirror the signature.
             aucSignature.reverse()
 
-        # Remove the temp files.
-        os.remove(strPathKeypair)
-        os.remove(strPathSignatureInputData)
-
         # Append the signature to the chunk.
         aulChunk.fromstring(aucSignature.tostring())
         # print("signature: %s " % aucSignature.tostring())
@@ -1270,6 +1243,12 @@ class AppImage:
         },
     ]
 
+    def __array_to_bytes(self, atData):
+        # Python 3.9 removed "tostring".
+        if hasattr(atData, 'tobytes'):
+            return atData.tobytes()
+        return atData.tostring()
+
     def __openssl_ecc_get_signature(self, aucSignature, sizKeyInBytes):
         # Get the start of the firt element, which is "r".
         uiLen = aucSignature[1]
@@ -1771,7 +1750,23 @@ def __app_image_action(target, source, env):
     for tTarget in target:
         astrDestinationPaths.append(tTarget.get_path())
 
-    tAppImage = AppImage(env, astrIncludePaths, atKnownFiles)
+    # Start the signing service once for the whole build.
+    strSigningService = None
+    if 'APPIMAGE_SIGNING_SERVICE' in env:
+        tSigningService = env['APPIMAGE_SIGNING_SERVICE']
+        if tSigningService is True:
+            strSigningService = signing_service.start_service()
+        elif tSigningService:
+            strSigningService = signing_service.start_service(
+                str(tSigningService)
+            )
+
+    tAppImage = AppImage(
+        env,
+        astrIncludePaths,
+        atKnownFiles,
+        strSigningService=strSigningService
+    )
     if strKeyRomPath is not None:
         tAppImage.read_keyrom(strKeyRomPath)
 
@@ -1839,6 +1834,8 @@ def ApplyToEnv(env):
     env['APPIMAGE_INCLUDE_PATHS'] = None
     env['APPIMAGE_VERBOSE'] = False
     env['APPIMAGE_KEYROM_XML'] = None
+    # Set this to True or a socket path to sign with the signing service.
+    env['APPIMAGE_SIGNING_SERVICE'] = None
 
     app_image_act = SCons.Action.Action(
         __app_image_action,
@@ -1968,6 +1965,15 @@ if __name__ == '__main__':
         metavar='SSLRAND',
         help='Set openssl randomization true or false.'
     )
+    tParser.add_argument(
+        '--signing-service',
+        dest='strSigningService',
+        required=False,
+        default=None,
+        metavar='SOCKET',
+        help='Sign with the signing service on the Unix socket SOCKET. It '
+             'is started if it is not running yet.'
+    )
     tArgs = tParser.parse_args()
 
     # Use a default logging level of "WARNING". Change it to "DEBUG" in
@@ -2013,6 +2019,13 @@ if __name__ == '__main__':
     }
 
     ulSDRamSplitOffset = int(tArgs.strSDRamSplitOffset, 0)
+
+    # Start the signing service or connect to a running one.
+    strSigningService = None
+    if tArgs.strSigningService is not None:
+        strSigningService = signing_service.start_service(
+            tArgs.strSigningService
+        )
     tAppImg = AppImage(
         tEnv,
         tArgs.strNetxType,
@@ -2020,7 +2033,8 @@ if __name__ == '__main__':
         atKnownFiles,
         ulSDRamSplitOffset,
         tArgs.strOpensslExe,
-        tArgs.fOpensslRandOff
+        tArgs.fOpensslRandOff,
+        strSigningService
     )
     if tArgs.strKeyRomPath is not None:
         tAppImg.read_keyrom(tArgs.strKeyRomPath)
@@ -138,24 +138,21 @@ class OptionCompiler:
                         ulAddress += 1
                         atElements.append(atTmp[0].strip())
 
-        # Set the labels as temporary constants.
-        self.__cPatchDefinitions.setTemporaryConstants(atLabels)
-
-        # Process all data elements.
+        # Process all data elements. The labels are temporary constants.
         atData = bytearray()
         for strElement in atElements:
             # Parse the data.
             tAstNode = ast.parse(strElement, mode='eval')
-            tAstResolved = self.__cPatchDefinitions.resolve_constants(tAstNode)
+            tAstResolved = self.__cPatchDefinitions.resolve_constants(
+                tAstNode,
+                atLabels
+            )
             ast.dump(tAstResolved)
             ulValue = eval(compile(tAstResolved, 'lala', mode='eval'))
 
             # Generate the data entry.
             atData.append(ulValue)
 
-        # Remove the labels as temporary constants.
-        self.__cPatchDefinitions.setTemporaryConstants([])
-
         return atData
 
     def __get_ddr_macro_data(self, tDataNode):
@@ -20,7 +20,13 @@
 # *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
 # ***************************************************************************
 
+import argparse
 import ast
+import glob
+import hashlib
+import json
+import os
+import threading
 import xml.dom.minidom
 
 # ----------------------------------------------------------------------------
@@ -74,103 +80,38 @@ class PatchDefinitions:
         self.m_cAstConstResolver.setConstants(self.m_atConstants)
 
     def read_patch_definition(self, tInput):
-        # A string must be the filename of the XML.
+        # A string must be the filename of the XML. Files are parsed only
+        # once per process.
         if isinstance(tInput, ("".__class__, u"".__class__)):
-            tXml = xml.dom.minidom.parse(tInput)
+            atPatchDefinitions, atConstants = load_patch_definition(tInput)
         elif isinstance(tInput, xml.dom.minidom.Document):
-            tXml = tInput
+            atPatchDefinitions, atConstants = parse_patch_definition(tInput)
         else:
             raise Exception('Unknown input document: %s' % repr(tInput))
 
-        # Loop over all children.
-        for tOptionsNode in tXml.documentElement.childNodes:
-            # Is this a node element with the name 'Options'?
-            if(
-                tOptionsNode.nodeType == tOptionsNode.ELEMENT_NODE and
-                tOptionsNode.localName == 'Options'
-            ):
-                # Loop over all children.
-                for tOptionNode in tOptionsNode.childNodes:
-                    # Is this a node element with the name 'Options'?
-                    if(
-                        tOptionNode.nodeType == tOptionNode.ELEMENT_NODE and
-                        tOptionNode.localName == 'Option'
-                    ):
-                        # Get the ID.
-                        strOptionId = tOptionNode.getAttribute('id')
-                        if strOptionId == '':
-                            raise Exception('Missing id attribute!')
-                        if strOptionId in self.m_atPatchDefinitions:
-                            raise Exception('ID %s double defined!' %
-                                            strOptionId)
-
-                        strOptionValue = tOptionNode.getAttribute('value')
-                        if strOptionValue == '':
-                            raise Exception('Missing value attribute!')
-                        ulOptionValue = int(strOptionValue, 0)
-
-                        # Loop over all children.
-                        atElements = []
-                        for tElmNode in tOptionNode.childNodes:
-                            # Is this a node element with the name 'Element'?
-                            if(
-                                tElmNode.nodeType == tElmNode.ELEMENT_NODE and
-                                tElmNode.localName == 'Element'
-                            ):
-                                # Get the ID.
-                                strElementId = tElmNode.getAttribute('id')
-                                if strElementId == '':
-                                    raise Exception('Missing id attribute!')
-
-                                # Get the size attribute.
-                                strSize = tElmNode.getAttribute('size')
-                                if strSize == '':
-                                    raise Exception('Missing size attribute!')
-                                ulSize = int(strSize, 0)
-
-                                # Get the type attribute.
-                                strType = tElmNode.getAttribute('type')
-                                if strType == '':
-                                    raise Exception('Missing type attribute!')
-                                ulType = int(strType, 0)
-
-                                atElements.append(
-                                    (strElementId, ulSize, ulType)
-                                )
-                        atDesc = dict({})
-                        atDesc['value'] = ulOptionValue
-                        atDesc['elements'] = atElements
-                        self.m_atPatchDefinitions[strOptionId] = atDesc
-
-            elif(
-                tOptionsNode.nodeType == tOptionsNode.ELEMENT_NODE and
-                tOptionsNode.localName == 'Definitions'
-            ):
-                # Loop over all children.
-                for tDefNode in tOptionsNode.childNodes:
-                    if(
-                        tDefNode.nodeType == tDefNode.ELEMENT_NODE and
-                        tDefNode.localName == 'Definition'
-                    ):
-                        # Get the name.
-                        strDefinitionName = tDefNode.getAttribute('name')
-                        if strDefinitionName == '':
-                            raise Exception('Missing name attribute!')
-                        if strDefinitionName in self.m_atConstants:
-                            raise Exception('Name "%s" double defined!' %
-                                            strDefinitionName)
-
-                        strDefinitionValue = tDefNode.getAttribute(
-                            'value'
-                        )
-                        if strDefinitionValue == '':
-                            raise Exception('Missing value attribute!')
-                        ulDefValue = int(strDefinitionValue, 0)
-
-                        self.m_atConstants[strDefinitionName] = ulDefValue
-
-    def resolve_constants(self, tAstNode):
-        return self.m_cAstConstResolver.visit(tAstNode)
+        # Copy the data. The parsed definitions are shared and must not be
+        # modified.
+        for strOptionId, atDesc in atPatchDefinitions.items():
+            if strOptionId in self.m_atPatchDefinitions:
+                raise Exception('ID %s double defined!' % strOptionId)
+            self.m_atPatchDefinitions[strOptionId] = atDesc
+        for strDefinitionName, ulDefValue in atConstants.items():
+            if strDefinitionName in self.m_atConstants:
+                raise Exception('Name "%s" double defined!' %
+                                strDefinitionName)
+            self.m_atConstants[strDefinitionName] = ulDefValue
+
+    def resolve_constants(self, tAstNode, atTemporaryConstants=None):
+        # The shared resolver must not be modified, as several chunks can be
+        # built in parallel. Temporary constants like the labels of an SPI
+        # macro get their own resolver.
+        if atTemporaryConstants is None:
+            tResolver = self.m_cAstConstResolver
+        else:
+            tResolver = RewriteName()
+            tResolver.setConstants(self.m_atConstants)
+            tResolver.setTemporaryConstants(atTemporaryConstants)
+        return tResolver.visit(tAstNode)
 
     def get_patch_definition(self, strOptionId):
         if strOptionId not in self.m_atPatchDefinitions:
@@ -180,3 +121,223 @@ class PatchDefinitions:
 
     def setTemporaryConstants(self, atConstants):
         self.m_cAstConstResolver.setTemporaryConstants(atConstants)
+
+
+def parse_patch_definition(tXml):
+    """ Read all options and constants from a patch definition document.
+
+    Return a dictionary with the options and a dictionary with the
+    constants.
+    """
+    atPatchDefinitions = {}
+    atConstants = {}
+
+    # Loop over all children.
+    for tOptionsNode in tXml.documentElement.childNodes:
+        # Is this a node element with the name 'Options'?
+        if(
+            tOptionsNode.nodeType == tOptionsNode.ELEMENT_NODE and
+            tOptionsNode.localName == 'Options'
+        ):
+            # Loop over all children.
+            for tOptionNode in tOptionsNode.childNodes:
+                # Is this a node element with the name 'Options'?
+                if(
+                    tOptionNode.nodeType == tOptionNode.ELEMENT_NODE and
+                    tOptionNode.localName == 'Option'
+                ):
+                    # Get the ID.
+                    strOptionId = tOptionNode.getAttribute('id')
+                    if strOptionId == '':
+                        raise Exception('Missing id attribute!')
+                    if strOptionId in atPatchDefinitions:
+                        raise Exception('ID %s double defined!' %
+                                        strOptionId)
+
+                    strOptionValue = tOptionNode.getAttribute('value')
+                    if strOptionValue == '':
+                        raise Exception('Missing value attribute!')
+                    ulOptionValue = int(strOptionValue, 0)
+
+                    # Loop over all children.
+                    atElements = []
+                    for tElmNode in tOptionNode.childNodes:
+                        # Is this a node element with the name 'Element'?
+                        if(
+                            tElmNode.nodeType == tElmNode.ELEMENT_NODE and
+                            tElmNode.localName == 'Element'
+                        ):
+                            # Get the ID.
+                            strElementId = tElmNode.getAttribute('id')
+                            if strElementId == '':
+                                raise Exception('Missing id attribute!')
+
+                            # Get the size attribute.
+                            strSize = tElmNode.getAttribute('size')
+                            if strSize == '':
+                                raise Exception('Missing size attribute!')
+                            ulSize = int(strSize, 0)
+
+                            # Get the type attribute.
+                            strType = tElmNode.getAttribute('type')
+                            if strType == '':
+                                raise Exception('Missing type attribute!')
+                            ulType = int(strType, 0)
+
+                            atElements.append(
+                                (strElementId, ulSize, ulType)
+                            )
+                    atDesc = dict({})
+                    atDesc['value'] = ulOptionValue
+                    atDesc['elements'] = atElements
+                    atPatchDefinitions[strOptionId] = atDesc
+
+        elif(
+            tOptionsNode.nodeType == tOptionsNode.ELEMENT_NODE and
+            tOptionsNode.localName == 'Definitions'
+        ):
+            # Loop over all children.
+            for tDefNode in tOptionsNode.childNodes:
+                if(
+                    tDefNode.nodeType == tDefNode.ELEMENT_NODE and
+                    tDefNode.localName == 'Definition'
+                ):
+                    # Get the name.
+                    strDefinitionName = tDefNode.getAttribute('name')
+                    if strDefinitionName == '':
+                        raise Exception('Missing name attribute!')
+                    if strDefinitionName in atConstants:
+                        raise Exception('Name "%s" double defined!' %
+                                        strDefinitionName)
+
+                    strDefinitionValue = tDefNode.getAttribute(
+                        'value'
+                    )
+                    if strDefinitionValue == '':
+                        raise Exception('Missing value attribute!')
+                    ulDefValue = int(strDefinitionValue, 0)
+
+                    atConstants[strDefinitionName] = ulDefValue
+
+    return atPatchDefinitions, atConstants
+
+
+# The version of the sidecar format.
+SIDECAR_FORMAT = 1
+
+
+def get_sidecar_path(strXmlPath):
+    # The pre-compiled sidecar is next to the XML file.
+    return os.path.splitext(strXmlPath)[0] + '.json'
+
+
+def __read_sidecar(strSidecarPath, strSourceHash):
+    # Return the contents of a sidecar or None if there is no valid sidecar
+    # for the XML file.
+    if os.path.isfile(strSidecarPath) is not True:
+        return None
+    try:
+        tFile = open(strSidecarPath, 'rt')
+        tSidecar = json.load(tFile)
+        tFile.close()
+        if(
+            tSidecar['format'] != SIDECAR_FORMAT or
+            tSidecar['source_sha1'] != strSourceHash
+        ):
+            return None
+        atPatchDefinitions = {}
+        for strOptionId, tOption in tSidecar['options'].items():
+            atPatchDefinitions[strOptionId] = {
+                'value': tOption['value'],
+                'elements': [
+                    tuple(tElement) for tElement in tOption['elements']
+                ]
+            }
+        atConstants = dict(tSidecar['constants'])
+    except (IOError, ValueError, KeyError, TypeError):
+        return None
+    return atPatchDefinitions, atConstants
+
+
+def write_sidecar(strXmlPath):
+    """ Pre-compile a patch definition to a JSON sidecar.
+
+    The sidecar is only used while it matches the SHA1 of the XML file.
+    """
+    tFile = open(strXmlPath, 'rb')
+    strXml = tFile.read()
+    tFile.close()
+
+    atPatchDefinitions, atConstants = parse_patch_definition(
+        xml.dom.minidom.parseString(strXml)
+    )
+    tSidecar = {
+        'format': SIDECAR_FORMAT,
+        'source_sha1': hashlib.sha1(strXml).hexdigest(),
+        'options': atPatchDefinitions,
+        'constants': atConstants
+    }
+    strSidecarPath = get_sidecar_path(strXmlPath)
+    tFile = open(strSidecarPath, 'wt')
+    json.dump(tSidecar, tFile, sort_keys=True)
+    tFile.close()
+    return strSidecarPath
+
+
+# The parsed patch definitions of this process indexed by the absolute path.
+s_atPatchDefinitions = {}
+s_tPatchDefinitionsLock = threading.Lock()
+
+
+def load_patch_definition(strXmlPath):
+    """ Return the options and constants of a patch definition file.
+
+    The result is shared by all users in this process and must not be
+    modified. A file is parsed again only if its modification time or size
+    changed. A valid sidecar is read instead of the XML.
+    """
+    strXmlPath = os.path.abspath(strXmlPath)
+    tStat = os.stat(strXmlPath)
+    tStamp = (tStat.st_mtime, tStat.st_size)
+    with s_tPatchDefinitionsLock:
+        tCached = s_atPatchDefinitions.get(strXmlPath)
+    if tCached is not None and tCached[0] == tStamp:
+        return tCached[1]
+
+    tFile = open(strXmlPath, 'rb')
+    strXml = tFile.read()
+    tFile.close()
+
+    tResult = __read_sidecar(
+        get_sidecar_path(strXmlPath),
+        hashlib.sha1(strXml).hexdigest()
+    )
+    if tResult is None:
+        tResult = parse_patch_definition(xml.dom.minidom.parseString(strXml))
+
+    with s_tPatchDefinitionsLock:
+        s_atPatchDefinitions[strXmlPath] = (tStamp, tResult)
+    return tResult
+
+
+if __name__ == '__main__':
+    tParser = argparse.ArgumentParser(
+        description='Pre-compile patch definitions to JSON sidecars.'
+    )
+    tParser.add_argument(
+        'astrXmlFiles',
+        nargs='*',
+        metavar='FILE',
+        help='Compile the patch definition FILE. The default are all '
+             'patch tables in the site_scons folder.'
+    )
+    tArgs = tParser.parse_args()
+
+    astrXmlFiles = tArgs.astrXmlFiles
+    if len(astrXmlFiles) == 0:
+        astrXmlFiles = sorted(glob.glob(os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            'hboot_*_patch_table.xml'
+        )))
+    for strXmlPath in astrXmlFiles:
+        print('%s -> %s' % (strXmlPath, write_sidecar(strXmlPath)))
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+
+# ***************************************************************************
+# *   Copyright (C) 2019 by Hilscher GmbH                                   *
+# *   netXsupport@hilscher.com                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation; either version 2 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program; if not, write to the                         *
+# *   Free Software Foundation, Inc.,                                       *
+# *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+# ***************************************************************************
+
+import atexit
+import os
+import subprocess
+import tempfile
+import threading
+
+# The "cryptography" package is optional. Without it all signatures are
+# created with the OpenSSL command line tool.
+try:
+    from cryptography.exceptions import UnsupportedAlgorithm
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.hazmat.primitives.asymmetric import padding
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    fHaveCryptography = True
+except ImportError:
+    fHaveCryptography = False
+
+
+class OpensslSigner:
+    """ Sign data with "openssl dgst -sign".
+
+    The data is passed on stdin. The private key is written to a temporary
+    file which exists only for one signature.
+    """
+    # The path to the OpenSSL tool.
+    __strOpenssl = None
+
+    # Additional options for the OpenSSL tool.
+    __astrOptions = None
+
+    # Use the RSA-PSS padding. Otherwise PKCS#1 v1.5 is used.
+    __fRsaPss = None
+
+    def __init__(self, strOpenssl='openssl', astrOptions=None, fRsaPss=True):
+        self.__strOpenssl = strOpenssl
+        self.__astrOptions = list(astrOptions or [])
+        self.__fRsaPss = bool(fRsaPss)
+
+    def sign(self, strKeyDER, strData, fRsaKey=True):
+        """ Sign strData with the DER encoded private key strKeyDER.
+
+        fRsaKey must be True for RSA keys and False for EC keys. RSA keys
+        return the plain signature, EC keys return the DER encoded ECDSA
+        signature.
+        """
+        iFile, strPathKey = tempfile.mkstemp(
+            suffix='.der',
+            prefix='tmp_hboot_image',
+            dir=None,
+            text=False
+        )
+        try:
+            try:
+                os.write(iFile, strKeyDER)
+            finally:
+                os.close(iFile)
+
+            astrCmd = [
+                self.__strOpenssl,
+                'dgst',
+                '-sign', strPathKey,
+                '-keyform', 'DER',
+                '-sha384'
+            ]
+            astrCmd.extend(self.__astrOptions)
+            # The PSS options are only accepted for RSA keys.
+            if self.__fRsaPss and fRsaKey:
+                astrCmd.extend([
+                    '-sigopt', 'rsa_padding_mode:pss',
+                    '-sigopt', 'rsa_pss_saltlen:-1'])
+
+            tProcess = subprocess.Popen(
+                astrCmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE
+            )
+            strSignature, _ = tProcess.communicate(strData)
+            if tProcess.returncode != 0:
+                raise subprocess.CalledProcessError(
+                    tProcess.returncode,
+                    astrCmd
+                )
+        finally:
+            # Remove the private key as soon as possible.
+            os.remove(strPathKey)
+        return strSignature
+
+    def close(self):
+        pass
+
+
+class CryptographySigner:
+    """ Sign data in-process with the "cryptography" package.
+
+    The output is the same as the output of OpenSSL. Loaded keys are kept
+    for all chunks and images of this process. Keys which are not supported
+    by the package, like EC keys with explicit parameters for a curve which
+    is not a NIST curve, are passed to the OpenSSL signer.
+    """
+    # Use the RSA-PSS padding. Otherwise PKCS#1 v1.5 is used.
+    __fRsaPss = None
+
+    # The signer for all keys which can not be used in-process.
+    __cFallback = None
+
+    # Protect the key cache.
+    __tLock = threading.Lock()
+
+    # The loaded private keys indexed by the DER data.
+    __atKeys = {}
+
+    # This marks keys in the cache which must use the fallback.
+    __tUnsupportedKey = object()
+
+    def __init__(self, fRsaPss=True, cFallback=None):
+        if fHaveCryptography is not True:
+            raise Exception('The python package "cryptography" is missing.')
+        self.__fRsaPss = bool(fRsaPss)
+        if cFallback is None:
+            cFallback = OpensslSigner(fRsaPss=fRsaPss)
+        self.__cFallback = cFallback
+
+    def __get_key(self, strKeyDER):
+        strKeyDER = bytes(strKeyDER)
+        with self.__tLock:
+            tKey = self.__atKeys.get(strKeyDER)
+        if tKey is None:
+            try:
+                tKey = serialization.load_der_private_key(
+                    strKeyDER,
+                    password=None,
+                    backend=default_backend()
+                )
+                if(
+                    not isinstance(tKey, rsa.RSAPrivateKey) and
+                    not isinstance(tKey, ec.EllipticCurvePrivateKey)
+                ):
+                    tKey = self.__tUnsupportedKey
+            except (ValueError, UnsupportedAlgorithm):
+                tKey = self.__tUnsupportedKey
+            with self.__tLock:
+                self.__atKeys[strKeyDER] = tKey
+        return tKey
+
+    def sign(self, strKeyDER, strData, fRsaKey=True):
+        """ Sign strData with the DER encoded private key strKeyDER.
+
+        The key type is taken from the key itself, fRsaKey is only passed
+        to the fallback. RSA keys return the plain signature, EC keys return
+        the DER encoded ECDSA signature. This is exactly the output of
+        OpenSSL.
+        """
+        tKey = self.__get_key(strKeyDER)
+        strData = bytes(strData)
+
+        strSignature = None
+        try:
+            if isinstance(tKey, rsa.RSAPrivateKey):
+                if self.__fRsaPss:
+                    # A salt length of -1 in OpenSSL is the digest length.
+                    tPadding = padding.PSS(
+                        mgf=padding.MGF1(hashes.SHA384()),
+                        salt_length=hashes.SHA384.digest_size
+                    )
+                else:
+                    tPadding = padding.PKCS1v15()
+                strSignature = tKey.sign(strData, tPadding, hashes.SHA384())
+
+            elif isinstance(tKey, ec.EllipticCurvePrivateKey):
+                strSignature = tKey.sign(strData, ec.ECDSA(hashes.SHA384()))
+
+        except (ValueError, UnsupportedAlgorithm):
+            strSignature = None
+
+        if strSignature is None:
+            strSignature = self.__cFallback.sign(strKeyDER, strData, fRsaKey)
+
+        return strSignature
+
+    def close(self):
+        self.__cFallback.close()
+
+
+# The signers of this process indexed by their configuration.
+s_atSigners = {}
+s_tSignersLock = threading.Lock()
+
+
+def get_signer(strOpenssl='openssl', astrOptions=None, fRsaPss=True):
+    """ Return the best available signer for the configuration.
+
+    Additional OpenSSL options can not be mapped to the in-process signer.
+    In this case and if the "cryptography" package is missing, the OpenSSL
+    command line tool is used. It is also used for all keys which the
+    package does not support. The signers are shared, so loaded keys are
+    reused for all images of the process.
+    """
+    tKey = (strOpenssl, tuple(astrOptions or []), bool(fRsaPss))
+    with s_tSignersLock:
+        tSigner = s_atSigners.get(tKey)
+        if tSigner is None:
+            tSigner = OpensslSigner(strOpenssl, astrOptions, fRsaPss)
+            if fHaveCryptography is True and not astrOptions:
+                tSigner = CryptographySigner(fRsaPss, tSigner)
+            s_atSigners[tKey] = tSigner
+    return tSigner
+
+
+def close_signers():
+    """ Close all signers of this process. """
+    with s_tSignersLock:
+        for tSigner in s_atSigners.values():
+            tSigner.close()
+
+
+atexit.register(close_signers)
@@ -0,0 +1,656 @@
+# -*- coding: utf-8 -*-
+
+# ***************************************************************************
+# *   Copyright (C) 2019 by Hilscher GmbH                                   *
+# *   netXsupport@hilscher.com                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation; either version 2 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program; if not, write to the                         *
+# *   Free Software Foundation, Inc.,                                       *
+# *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+# ***************************************************************************
+
+# A local signing service. One long-lived process holds the loaded keys for
+# a whole build. The image compilers pass their signing requests over a
+# Unix socket.
+#
+# Each message is a JSON header followed by binary data:
+#   4 bytes  size of the header (big endian)
+#   4 bytes  size of the data (big endian)
+#   header
+#   data
+#
+# A signing request carries a batch of signatures. All keys of the batch are
+# sent only once. The answer has one result per request in the same order.
+# The image compilers send one signature per request. Each signature is made
+# while its chunk is built, and the hash table signs the signatures of the
+# following chunks, so the signatures of an image can not be collected in
+# one batch. Chunks which are built in parallel use their own connections.
+#
+# The private keys are sent over the socket. The client only uses sockets
+# which belong to the current user and can not be used by anybody else.
+
+import argparse
+import atexit
+import collections
+import json
+import multiprocessing
+import multiprocessing.pool
+import os
+import shutil
+import socket
+import stat
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# The service process runs this file as a standalone script.
+if __name__ == '__main__' or sys.version_info[0] == 2:
+    import signer
+else:
+    from . import signer
+
+
+def send_message(tSocket, atHeader, strData=b''):
+    strHeader = json.dumps(atHeader).encode('utf-8')
+    tSocket.sendall(
+        struct.pack('>II', len(strHeader), len(strData)) +
+        strHeader +
+        strData
+    )
+
+
+def receive_message(tFile):
+    """ Read one message from the file object of a socket.
+
+    Return the header and the data or (None, None) if the connection was
+    closed.
+    """
+    strSizes = tFile.read(8)
+    if len(strSizes) == 0:
+        return None, None
+    if len(strSizes) != 8:
+        raise Exception('Truncated message.')
+    sizHeader, sizData = struct.unpack('>II', strSizes)
+    strHeader = tFile.read(sizHeader)
+    strData = tFile.read(sizData)
+    if len(strHeader) != sizHeader or len(strData) != sizData:
+        raise Exception('Truncated message.')
+    return json.loads(strHeader.decode('utf-8')), strData
+
+
+class SigningMetrics:
+    """ Count the requests and keep the latency of the most recent ones. """
+    # Protect all values.
+    __tLock = None
+
+    __uiRequests = None
+    __uiErrors = None
+    __uiBatches = None
+    __dLatencyTotal = None
+    __dLatencyMin = None
+    __dLatencyMax = None
+
+    # The latency of the most recent requests in seconds.
+    __adRecent = None
+
+    def __init__(self, sizRecent=1000):
+        self.__tLock = threading.Lock()
+        self.__uiRequests = 0
+        self.__uiErrors = 0
+        self.__uiBatches = 0
+        self.__dLatencyTotal = 0.0
+        self.__dLatencyMin = None
+        self.__dLatencyMax = None
+        self.__adRecent = collections.deque(maxlen=sizRecent)
+
+    def add_batch(self):
+        with self.__tLock:
+            self.__uiBatches += 1
+
+    def add_request(self, dLatency, fOk):
+        with self.__tLock:
+            self.__uiRequests += 1
+            if fOk is not True:
+                self.__uiErrors += 1
+            self.__dLatencyTotal += dLatency
+            if self.__dLatencyMin is None or dLatency < self.__dLatencyMin:
+                self.__dLatencyMin = dLatency
+            if self.__dLatencyMax is None or dLatency > self.__dLatencyMax:
+                self.__dLatencyMax = dLatency
+            self.__adRecent.append(dLatency)
+
+    def get(self):
+        """ Return all values as a dictionary. The latencies are in
+        milliseconds, the percentiles cover the most recent requests.
+        """
+        with self.__tLock:
+            adRecent = sorted(self.__adRecent)
+            atStatistics = {
+                'requests': self.__uiRequests,
+                'errors': self.__uiErrors,
+                'batches': self.__uiBatches,
+                'latency_mean': None,
+                'latency_min': None,
+                'latency_max': None,
+                'latency_p50': None,
+                'latency_p95': None,
+                'latency_p99': None
+            }
+            if self.__uiRequests != 0:
+                atStatistics['latency_mean'] = (
+                    1000.0 * self.__dLatencyTotal / self.__uiRequests
+                )
+                atStatistics['latency_min'] = 1000.0 * self.__dLatencyMin
+                atStatistics['latency_max'] = 1000.0 * self.__dLatencyMax
+                for strName, dPercentile in (
+                    ('latency_p50', 0.50),
+                    ('latency_p95', 0.95),
+                    ('latency_p99', 0.99)
+                ):
+                    uiIndex = min(
+                        int(dPercentile * len(adRecent)),
+                        len(adRecent) - 1
+                    )
+                    atStatistics[strName] = 1000.0 * adRecent[uiIndex]
+        return atStatistics
+
+
+class SigningServer:
+    """ Serve signing requests on a Unix socket.
+
+    Each connection is read by its own thread. The signatures are created by
+    a bounded pool of worker threads with the shared signers of the signer
+    module, so every key is loaded only once.
+    """
+    # The path of the Unix socket.
+    __strSocketPath = None
+
+    # The listening socket.
+    __tSocket = None
+
+    # The worker threads for the signatures.
+    __tPool = None
+
+    # Limit the number of requests which wait for a worker.
+    __tPending = None
+
+    __tMetrics = None
+
+    # This is set to stop the server.
+    __tShutdown = None
+
+    def __init__(self, strSocketPath, uiWorkers=None, uiMaxPending=None):
+        if hasattr(socket, 'AF_UNIX') is not True:
+            raise Exception('The signing service needs Unix sockets.')
+        if uiWorkers is None:
+            uiWorkers = multiprocessing.cpu_count()
+        uiWorkers = max(1, int(uiWorkers))
+        if uiMaxPending is None:
+            uiMaxPending = 16 * uiWorkers
+
+        self.__strSocketPath = strSocketPath
+        self.__tPool = multiprocessing.pool.ThreadPool(uiWorkers)
+        self.__tPending = threading.BoundedSemaphore(uiMaxPending)
+        self.__tMetrics = SigningMetrics()
+        self.__tShutdown = threading.Event()
+
+    def __sign(self, tJob):
+        # Sign one request. Errors are returned, not raised.
+        cSigner, strKeyDER, strData, fRsaKey, dStartTime = tJob
+        try:
+            strSignature = cSigner.sign(strKeyDER, strData, fRsaKey)
+            strError = None
+        except Exception as tException:
+            strSignature = None
+            strError = str(tException)
+        finally:
+            self.__tPending.release()
+        self.__tMetrics.add_request(
+            time.time() - dStartTime,
+            strError is None
+        )
+        return strSignature, strError
+
+    def __handle_sign(self, tSocket, atHeader, strData):
+        dStartTime = time.time()
+        self.__tMetrics.add_batch()
+
+        atConfig = atHeader['config']
+        cSigner = signer.get_signer(
+            atConfig['openssl'],
+            atConfig['options'],
+            atConfig['pss']
+        )
+
+        # Split the data into the keys and the data to sign.
+        uiOffset = 0
+        astrKeys = []
+        for sizKey in atHeader['keys']:
+            astrKeys.append(strData[uiOffset:uiOffset + sizKey])
+            uiOffset += sizKey
+        atJobs = []
+        for atRequest in atHeader['requests']:
+            sizData = atRequest['data']
+            atJobs.append((
+                cSigner,
+                astrKeys[atRequest['key']],
+                strData[uiOffset:uiOffset + sizData],
+                atRequest['rsa'],
+                dStartTime
+            ))
+            uiOffset += sizData
+
+        # Queue all requests of the batch. This blocks if too many requests
+        # are waiting for a worker.
+        atResults = []
+        for tJob in atJobs:
+            self.__tPending.acquire()
+            atResults.append(self.__tPool.apply_async(self.__sign, (tJob,)))
+
+        atReplies = []
+        astrSignatures = []
+        for tResult in atResults:
+            strSignature, strError = tResult.get()
+            if strError is None:
+                atReplies.append({'signature': len(strSignature)})
+                astrSignatures.append(strSignature)
+            else:
+                atReplies.append({'error': strError})
+        send_message(tSocket, {'results': atReplies}, b''.join(astrSignatures))
+
+    def __handle_connection(self, tSocket):
+        tFile = tSocket.makefile('rb')
+        try:
+            while True:
+                atHeader, strData = receive_message(tFile)
+                if atHeader is None:
+                    break
+
+                strOp = atHeader.get('op')
+                if strOp == 'sign':
+                    self.__handle_sign(tSocket, atHeader, strData)
+                elif strOp == 'stats':
+                    send_message(tSocket, {'stats': self.__tMetrics.get()})
+                elif strOp == 'shutdown':
+                    send_message(tSocket, {})
+                    self.shutdown()
+                    break
+                else:
+                    send_message(
+                        tSocket,
+                        {'error': 'Unknown operation: %s' % str(strOp)}
+                    )
+        except socket.error:
+            # The client is gone.
+            pass
+        finally:
+            tFile.close()
+            tSocket.close()
+
+    def serve_forever(self):
+        # Remove a stale socket from an old server. Never remove other files.
+        try:
+            tStat = os.lstat(self.__strSocketPath)
+        except OSError:
+            tStat = None
+        strError = None
+        if tStat is not None:
+            if stat.S_ISSOCK(tStat.st_mode) is not True:
+                strError = 'The path "%s" exists and is no socket.'
+            elif is_running(self.__strSocketPath) is True:
+                strError = 'A service already listens on "%s".'
+            else:
+                os.remove(self.__strSocketPath)
+        if strError is not None:
+            self.__tPool.close()
+            raise Exception(strError % self.__strSocketPath)
+
+        # The keys are sent over the socket. Only this user may connect.
+        self.__tSocket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        uiUmask = os.umask(0o077)
+        try:
+            self.__tSocket.bind(self.__strSocketPath)
+        finally:
+            os.umask(uiUmask)
+        self.__tSocket.listen(16)
+        self.__tSocket.settimeout(0.5)
+
+        try:
+            while self.__tShutdown.is_set() is not True:
+                try:
+                    tConnection, _ = self.__tSocket.accept()
+                except socket.timeout:
+                    continue
+                tConnection.settimeout(None)
+                tThread = threading.Thread(
+                    target=self.__handle_connection,
+                    args=(tConnection,)
+                )
+                tThread.daemon = True
+                tThread.start()
+        finally:
+            self.__tSocket.close()
+            try:
+                if stat.S_ISSOCK(os.lstat(self.__strSocketPath).st_mode):
+                    os.remove(self.__strSocketPath)
+            except OSError:
+                pass
+            self.__tPool.close()
+            signer.close_signers()
+
+    def shutdown(self):
+        self.__tShutdown.set()
+
+    def get_metrics(self):
+        return self.__tMetrics.get()
+
+
+class SigningClient:
+    """ Sign data with a running signing service.
+
+    This has the same interface as the signers of the signer module. Each
+    thread gets its own connection, so parallel builds do not wait for each
+    other.
+    """
+    __strSocketPath = None
+
+    # The signer configuration for the service.
+    __atConfig = None
+
+    # The connection of each thread.
+    __tConnections = None
+
+    def __init__(self, strSocketPath, strOpenssl='openssl', astrOptions=None,
+                 fRsaPss=True):
+        self.__strSocketPath = strSocketPath
+        self.__atConfig = {
+            'openssl': strOpenssl,
+            'options': list(astrOptions or []),
+            'pss': bool(fRsaPss)
+        }
+        self.__tConnections = threading.local()
+
+    def __get_connection(self):
+        tSocket = getattr(self.__tConnections, 'tSocket', None)
+        if tSocket is None:
+            check_socket(self.__strSocketPath)
+            tSocket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                tSocket.connect(self.__strSocketPath)
+                check_peer(tSocket)
+            except Exception:
+                tSocket.close()
+                raise
+            self.__tConnections.tSocket = tSocket
+            self.__tConnections.tFile = tSocket.makefile('rb')
+        return tSocket, self.__tConnections.tFile
+
+    def __request(self, atHeader, strData=b''):
+        tSocket, tFile = self.__get_connection()
+        try:
+            send_message(tSocket, atHeader, strData)
+            atReply, strReply = receive_message(tFile)
+        except socket.error:
+            self.close()
+            raise
+        if atReply is None:
+            self.close()
+            raise Exception('The signing service closed the connection.')
+        if 'error' in atReply:
+            raise Exception(atReply['error'])
+        return atReply, strReply
+
+    def sign_batch(self, atRequests):
+        """ Sign a list of (strKeyDER, strData, fRsaKey) tuples in one round
+        trip. Return the list of signatures.
+
+        This is for callers which have several signatures at once. The
+        image compilers use sign().
+        """
+        astrKeys = []
+        atKeyIndex = {}
+        atHeaderRequests = []
+        astrData = []
+        for strKeyDER, strData, fRsaKey in atRequests:
+            strKeyDER = bytes(strKeyDER)
+            strData = bytes(strData)
+            uiKey = atKeyIndex.get(strKeyDER)
+            if uiKey is None:
+                uiKey = len(astrKeys)
+                atKeyIndex[strKeyDER] = uiKey
+                astrKeys.append(strKeyDER)
+            atHeaderRequests.append({
+                'key': uiKey,
+                'data': len(strData),
+                'rsa': bool(fRsaKey)
+            })
+            astrData.append(strData)
+
+        atReply, strReply = self.__request(
+            {
+                'op': 'sign',
+                'config': self.__atConfig,
+                'keys': [len(strKey) for strKey in astrKeys],
+                'requests': atHeaderRequests
+            },
+            b''.join(astrKeys) + b''.join(astrData)
+        )
+
+        astrSignatures = []
+        uiOffset = 0
+        for atResult in atReply['results']:
+            if 'error' in atResult:
+                raise Exception('The signing service failed: %s' %
+                                atResult['error'])
+            sizSignature = atResult['signature']
+            astrSignatures.append(strReply[uiOffset:uiOffset + sizSignature])
+            uiOffset += sizSignature
+        return astrSignatures
+
+    def sign(self, strKeyDER, strData, fRsaKey=True):
+        return self.sign_batch([(strKeyDER, strData, fRsaKey)])[0]
+
+    def statistics(self):
+        """ Return the request counters and latencies of the service. """
+        atReply, _ = self.__request({'op': 'stats'})
+        return atReply['stats']
+
+    def shutdown(self):
+        """ Stop the service. """
+        self.__request({'op': 'shutdown'})
+        self.close()
+
+    def close(self):
+        # Close the connection of this thread.
+        tSocket = getattr(self.__tConnections, 'tSocket', None)
+        if tSocket is not None:
+            self.__tConnections.tFile.close()
+            tSocket.close()
+            self.__tConnections.tSocket = None
+            self.__tConnections.tFile = None
+
+
+def is_running(strSocketPath):
+    tSocket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        tSocket.connect(strSocketPath)
+        fRunning = True
+    except socket.error:
+        fRunning = False
+    finally:
+        tSocket.close()
+    return fRunning
+
+
+def check_socket(strSocketPath):
+    """ Refuse a socket which is not private to the current user.
+
+    The socket must belong to the user and must have the mode 0700, which is
+    the mode of the sockets created by the service.
+    """
+    tStat = os.lstat(strSocketPath)
+    if stat.S_ISSOCK(tStat.st_mode) is not True:
+        raise Exception('The signing service path "%s" is no socket.' %
+                        strSocketPath)
+    if tStat.st_uid != os.getuid():
+        raise Exception('The signing service socket "%s" belongs to another '
+                        'user.' % strSocketPath)
+    if stat.S_IMODE(tStat.st_mode) != 0o700:
+        raise Exception('The signing service socket "%s" has the mode %04o, '
+                        'but 0700 is required.' % (
+                            strSocketPath,
+                            stat.S_IMODE(tStat.st_mode)
+                        ))
+
+
+def check_peer(tSocket):
+    # The socket file can be replaced after the check. Compare the user of
+    # the listening process if the system reports it.
+    if hasattr(socket, 'SO_PEERCRED'):
+        strCredentials = tSocket.getsockopt(
+            socket.SOL_SOCKET,
+            socket.SO_PEERCRED,
+            struct.calcsize('3i')
+        )
+        _, uiUid, _ = struct.unpack('3i', strCredentials)
+        if uiUid != os.getuid():
+            raise Exception('The signing service runs as another user.')
+
+
+# The services started by this process indexed by their socket path. Each
+# entry is the process and the private folder of the socket or None.
+s_atServices = {}
+s_tServicesLock = threading.Lock()
+
+# The socket path of the service started without a path.
+s_strDefaultSocketPath = None
+
+
+def start_service(strSocketPath=None, uiWorkers=None, dTimeout=10.0):
+    """ Start a signing service in a new process and return its socket path.
+
+    Without a socket path, the socket is created in a new private folder and
+    used for all further calls without a path. A service which already
+    listens on the socket is reused, so several builds can share one
+    service. It must pass check_socket. Services started here are stopped
+    at exit.
+    """
+    global s_strDefaultSocketPath
+
+    if hasattr(socket, 'AF_UNIX') is not True:
+        raise Exception('The signing service needs Unix sockets.')
+
+    with s_tServicesLock:
+        strFolder = None
+        if strSocketPath is None:
+            if s_strDefaultSocketPath is not None:
+                return s_strDefaultSocketPath
+            # Only this user can access the folder.
+            strFolder = tempfile.mkdtemp(prefix='hboot_signing_')
+            strSocketPath = os.path.join(strFolder, 'service.sock')
+        strSocketPath = os.path.abspath(strSocketPath)
+
+        if strSocketPath in s_atServices:
+            return strSocketPath
+        if is_running(strSocketPath) is True:
+            check_socket(strSocketPath)
+            return strSocketPath
+
+        strScript = os.path.abspath(__file__)
+        if strScript.endswith('.pyc'):
+            strScript = strScript[:-1]
+        astrCmd = [
+            sys.executable,
+            strScript,
+            '--socket', strSocketPath
+        ]
+        if uiWorkers is not None:
+            astrCmd.extend(['--workers', '%d' % uiWorkers])
+        tProcess = subprocess.Popen(astrCmd)
+
+        # Wait until the service accepts connections.
+        try:
+            dEndTime = time.time() + dTimeout
+            while is_running(strSocketPath) is not True:
+                if tProcess.poll() is not None:
+                    raise Exception('The signing service failed with return '
+                                    'code %d.' % tProcess.returncode)
+                if time.time() > dEndTime:
+                    tProcess.kill()
+                    tProcess.wait()
+                    raise Exception('The signing service did not start.')
+                time.sleep(0.05)
+            check_socket(strSocketPath)
+        except Exception:
+            if tProcess.poll() is None:
+                tProcess.terminate()
+                tProcess.wait()
+            if strFolder is not None:
+                shutil.rmtree(strFolder, ignore_errors=True)
+            raise
+
+        s_atServices[strSocketPath] = (tProcess, strFolder)
+        if strFolder is not None:
+            s_strDefaultSocketPath = strSocketPath
+    return strSocketPath
+
+
+def stop_services():
+    """ Stop all services which were started by this process. """
+    global s_strDefaultSocketPath
+
+    with s_tServicesLock:
+        for strSocketPath, tService in s_atServices.items():
+            tProcess, strFolder = tService
+            try:
+                SigningClient(strSocketPath).shutdown()
+            except Exception:
+                tProcess.terminate()
+            tProcess.wait()
+            if strFolder is not None:
+                shutil.rmtree(strFolder, ignore_errors=True)
+        s_atServices.clear()
+        s_strDefaultSocketPath = None
+
+
+atexit.register(stop_services)
+
+
+if __name__ == '__main__':
+    tParser = argparse.ArgumentParser(
+        description='Run a signing service for the HBoot image compiler.'
+    )
+    tParser.add_argument(
+        '-s', '--socket',
+        dest='strSocketPath',
+        required=True,
+        metavar='PATH',
+        help='Listen on the Unix socket PATH.'
+    )
+    tParser.add_argument(
+        '-w', '--workers',
+        dest='uiWorkers',
+        required=False,
+        default=None,
+        type=int,
+        metavar='N',
+        help='Sign with N threads. The default is the number of CPUs.'
+    )
+    tArgs = tParser.parse_args()
+
+    tServer = SigningServer(tArgs.strSocketPath, tArgs.uiWorkers)
+    tServer.serve_forever()
@@ -20,10 +20,12 @@
 # *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
 # ***************************************************************************
 
+import collections
 import hashlib
 import os
 import os.path
 import sqlite3
+import threading
 import xml.dom.minidom
 
 
@@ -43,9 +45,30 @@ class SnippetLibrary:
     # The snippet library was already scanned if this flag is set.
     __fSnipLibIsAlreadyScanned = None
 
-    def __init__(self, strDatabasePath, astrSnippetSearchPaths, debug=False):
+    # Serialize all database accesses. The instance can be shared between
+    # threads.
+    __tLock = None
+
+    # LRU cache of parsed snippets indexed by the path and hash.
+    __atTemplateCache = None
+
+    # The maximum number of entries in the template cache.
+    __uiTemplateCacheSize = None
+
+    def __init__(
+        self,
+        strDatabasePath,
+        astrSnippetSearchPaths,
+        debug=False,
+        rescan=True,
+        template_cache_size=128
+    ):
         self.__fDebug = bool(debug)
 
+        self.__tLock = threading.RLock()
+        self.__atTemplateCache = collections.OrderedDict()
+        self.__uiTemplateCacheSize = template_cache_size
+
         # Set the filename of the SQLITE3 database.
         self.__strDatabasePath = strDatabasePath
         if self.__fDebug:
@@ -65,8 +88,10 @@ class SnippetLibrary:
             for strPath in self.__astrSnippetSearchPaths:
                 print('[SnipLib] Configuration: Search path "%s"' % strPath)
 
-        # The snippet library was not scanned yet.
-        self.__fSnipLibIsAlreadyScanned = False
+        # The snippet library was not scanned yet. If "rescan" is False, the
+        # database was already filled by another instance and is used as it
+        # is.
+        self.__fSnipLibIsAlreadyScanned = not bool(rescan)
 
     def __xml_get_all_text(self, tNode):
         astrText = []
@@ -94,9 +119,9 @@ class SnippetLibrary:
         tHash = hashlib.sha384()
         fEof = False
         while fEof is False:
-            strData = tFile.read(2048)
+            strData = tFile.read(65536)
             tHash.update(strData)
-            if len(strData) < 2048:
+            if len(strData) < 65536:
                 fEof = True
         strDigest = tHash.hexdigest()
         tFile.close()
@@ -106,12 +131,24 @@ class SnippetLibrary:
 
     def __db_open(self):
         tDb = self.__tDb
-        if tDb is None:
-            tDb = sqlite3.connect(self.__strDatabasePath)
-            self.__tDb = tDb
+        if tDb is not None:
+            return
+
+        # The connection is protected by the lock and may be used by other
+        # threads.
+        tDb = sqlite3.connect(
+            self.__strDatabasePath,
+            check_same_thread=False
+        )
+        self.__tDb = tDb
 
         tCursor = tDb.cursor()
 
+        # Allow readers in other processes while a scan is running. This is
+        # ignored for in-memory databases.
+        tCursor.execute('PRAGMA journal_mode=WAL')
+        tCursor.execute('PRAGMA synchronous=NORMAL')
+
         # Construct the "CREATE" statement for the "snippets" table.
         strCreateStatement = (
             'CREATE TABLE snippets ('
@@ -122,6 +159,9 @@ class SnippetLibrary:
             'groupid TEXT NOT NULL, '
             'artifact TEXT NOT NULL, '
             'version TEXT NOT NULL, '
+            'size INTEGER, '
+            'mtime_ns INTEGER, '
+            'inode INTEGER, '
             'clean INTEGER DEFAULT 0)'
         )
         if self.__fDebug:
@@ -156,6 +196,18 @@ class SnippetLibrary:
                 print('[SnipLib] Database: The existing "snippet" table was '
                       'created with the correct statement.')
 
+        # Create the indices for the lookup and the scan. They are dropped
+        # together with an old table.
+        tCursor.execute(
+            'CREATE INDEX IF NOT EXISTS snippets_gav ON snippets '
+            '(groupid, artifact, version, search_path)'
+        )
+        tCursor.execute(
+            'CREATE INDEX IF NOT EXISTS snippets_path ON snippets '
+            '(search_path, path)'
+        )
+        tDb.commit()
+
     def __snippet_get_gav(self, strPath):
         strGroup = None
         strArtifact = None
@@ -235,7 +287,6 @@ class SnippetLibrary:
             'UPDATE snippets SET clean=1 WHERE search_path=?',
             (strSearchPath, )
         )
-        self.__tDb.commit()
 
     def __sniplib_scan(self, strSearchPath):
         if self.__fDebug:
@@ -243,6 +294,19 @@ class SnippetLibrary:
                   strSearchPath)
 
         tCursor = self.__tDb.cursor()
+
+        # Get all known entries for the search path.
+        atKnownSnippets = {}
+        tCursor.execute(
+            'SELECT path,id,hash,size,mtime_ns,inode FROM snippets WHERE '
+            'search_path=?', (strSearchPath, )
+        )
+        for tRes in tCursor.fetchall():
+            atKnownSnippets[tRes[0]] = tRes[1:]
+
+        # Collect the IDs of all files which did not change.
+        aulUnchanged = []
+
         # Search all files recursively.
         for strRoot, astrDirs, astrFiles in os.walk(strSearchPath,
                                                     followlinks=True):
@@ -254,6 +318,32 @@ class SnippetLibrary:
                     # Get the absolute path for the file.
                     strAbsPath = os.path.join(strRoot, strFile)
 
+                    # Get the size, modification time and inode of the file.
+                    # Python 2 has no "st_mtime_ns".
+                    tStat = os.stat(strAbsPath)
+                    atSignature = (
+                        tStat.st_size,
+                        getattr(
+                            tStat,
+                            'st_mtime_ns',
+                            int(tStat.st_mtime * 1e9)
+                        ),
+                        tStat.st_ino
+                    )
+
+                    # Search the snippet in the database.
+                    atResults = atKnownSnippets.get(strAbsPath)
+                    if(
+                        atResults is not None and
+                        tuple(atResults[2:5]) == atSignature
+                    ):
+                        # The file was not touched since the last scan.
+                        if self.__fDebug:
+                            print('[SnipLib] Scan:  -> Found unchanged '
+                                  'snippet at "%s".' % strAbsPath)
+                        aulUnchanged.append((atResults[0], ))
+                        continue
+
                     # Get the stamp of the snip.
                     strDigest = self.__get_snip_hash(strAbsPath)
 
@@ -261,15 +351,6 @@ class SnippetLibrary:
                         print('[SnipLib] Scan:  -> Found snippet at "%s" '
                               'with the hash "%s".' % (strAbsPath, strDigest))
 
-                    # Search the snippet in the database.
-                    tCursor.execute(
-                        'SELECT id,hash FROM snippets WHERE search_path=? '
-                        'AND path=?', (
-                            strSearchPath,
-                            strAbsPath
-                        )
-                    )
-                    atResults = tCursor.fetchone()
                     if atResults is None:
                         # The snippet is not present in the database yet.
                         if self.__fDebug:
@@ -294,15 +375,15 @@ class SnippetLibrary:
                         tCursor.execute(
                             'INSERT INTO snippets '
                             '(search_path, path, hash, groupid, '
-                            'artifact, version) VALUES '
-                            '(?, ?, ?, ?, ?, ?)', (
+                            'artifact, version, size, mtime_ns, inode) '
+                            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', (
                                 strSearchPath,
                                 strAbsPath,
                                 strDigest,
                                 strGroup,
                                 strArtifact,
                                 strVersion
-                            )
+                            ) + atSignature
                         )
 
                     else:
@@ -315,10 +396,11 @@ class SnippetLibrary:
                                       ' already registered in the cache.')
 
                             # Found the file. Do not delete it from the
-                            # database.
+                            # database and remember the new signature.
                             tCursor.execute(
-                                'UPDATE snippets SET clean=0 WHERE id=?',
-                                (atResults[0], )
+                                'UPDATE snippets SET size=?, mtime_ns=?, '
+                                'inode=?, clean=0 WHERE id=?',
+                                atSignature + (atResults[0], )
                             )
 
                         else:
@@ -345,16 +427,22 @@ class SnippetLibrary:
                             else:
                                 tCursor.execute(
                                     'UPDATE snippets SET hash=?, groupid=?, '
-                                    'artifact=?, version=?, clean=0 WHERE '
+                                    'artifact=?, version=?, size=?, '
+                                    'mtime_ns=?, inode=?, clean=0 WHERE '
                                     'id=?', (
                                         strDigest,
                                         strGroup,
                                         strArtifact,
-                                        strVersion,
-                                        atResults[0]
-                                    )
+                                        strVersion
+                                    ) + atSignature + (atResults[0], )
                                 )
 
+        # Keep all unchanged files in the database.
+        tCursor.executemany(
+            'UPDATE snippets SET clean=0 WHERE id=?',
+            aulUnchanged
+        )
+
     def __sniplib_forget_invalid_entries(self, strSearchPath):
         # Remove all entries from the cache which are marked for clean.
         tCursor = self.__tDb.cursor()
@@ -386,27 +474,46 @@ class SnippetLibrary:
             'DELETE FROM snippets WHERE clean!=0 AND search_path=?',
             (strSearchPath, )
         )
-        self.__tDb.commit()
 
-    def find(self, strGroup, strArtifact, strVersion, atParameter):
+    def scan(self):
+        with self.__tLock:
+            self.__scan()
+
+    def __scan(self):
         # Open the connection to the database.
         self.__db_open()
 
         # Scan each search path.
         if self.__fSnipLibIsAlreadyScanned is not True:
-            for strSearchPath in self.__astrSnippetSearchPaths:
-                self.__sniplib_invalidate(strSearchPath)
-                self.__sniplib_scan(strSearchPath)
-                self.__sniplib_forget_invalid_entries(strSearchPath)
+            # Update all search paths in one transaction.
+            try:
+                for strSearchPath in self.__astrSnippetSearchPaths:
+                    self.__sniplib_invalidate(strSearchPath)
+                    self.__sniplib_scan(strSearchPath)
+                    self.__sniplib_forget_invalid_entries(strSearchPath)
+                self.__tDb.commit()
+            except BaseException:
+                self.__tDb.rollback()
+                raise
             self.__fSnipLibIsAlreadyScanned = True
 
+    def close(self):
+        with self.__tLock:
+            if self.__tDb is not None:
+                self.__tDb.close()
+                self.__tDb = None
+
+    def __lookup(self, strGroup, strArtifact, strVersion):
+        # Open the connection to the database and scan all search paths.
+        self.__scan()
+
         # Search for the snippet in each search path. Stop on the first hit.
         atMatch = None
         tCursor = self.__tDb.cursor()
         for strSearchPath in self.__astrSnippetSearchPaths:
             tCursor.execute(
-                'SELECT path FROM snippets WHERE search_path=? AND groupid=? '
-                'AND artifact=? AND version=?', (
+                'SELECT path,hash FROM snippets WHERE search_path=? AND '
+                'groupid=? AND artifact=? AND version=?', (
                     strSearchPath,
                     strGroup,
                     strArtifact,
@@ -418,23 +525,28 @@ class SnippetLibrary:
                 atMatch = atResult
                 break
 
-        # Get the snippet name for messages.
-        strSnippetName = 'G="%s", A="%s", V="%s"' % (
-            strGroup,
-            strArtifact,
-            strVersion
-        )
+        return atMatch
 
-        if atMatch is None:
-            # No matching snippet found.
-            raise Exception('No matching snippet found for %s.' %
-                            strSnippetName)
+    def __get_template(self, strAbsPath, strHash, strSnippetName):
+        # Look for the snippet in the cache.
+        tKey = (strAbsPath, strHash)
+        with self.__tLock:
+            tTemplate = self.__atTemplateCache.pop(tKey, None)
+            if tTemplate is not None:
+                # Insert the template again to mark it as recently used.
+                self.__atTemplateCache[tKey] = tTemplate
+                return tTemplate
 
-        strAbsPath = atMatch[0]
-        if self.__fDebug:
-            print('[SnipLib] Resolve: Found %s at "%s".' % (
-                  strSnippetName, strAbsPath))
+        tTemplate = self.__parse_template(strAbsPath, strSnippetName)
+
+        with self.__tLock:
+            self.__atTemplateCache[tKey] = tTemplate
+            while len(self.__atTemplateCache) > self.__uiTemplateCacheSize:
+                self.__atTemplateCache.popitem(last=False)
 
+        return tTemplate
+
+    def __parse_template(self, strAbsPath, strSnippetName):
         # Try to parse the snippet file.
         try:
             tXml = xml.dom.minidom.parse(strAbsPath)
@@ -487,6 +599,41 @@ class SnippetLibrary:
                             )
                         )
 
+        # Find the "Snippet" node and get the text contents.
+        strSnippet = None
+        tSnippetNode = self.__xml_get_node(tRootNode, 'Snippet')
+        if tSnippetNode is not None:
+            strSnippet = self.__xml_get_all_text(tSnippetNode)
+
+        return (atParameterList, strSnippet)
+
+    def find(self, strGroup, strArtifact, strVersion, atParameter):
+        with self.__tLock:
+            atMatch = self.__lookup(strGroup, strArtifact, strVersion)
+
+        # Get the snippet name for messages.
+        strSnippetName = 'G="%s", A="%s", V="%s"' % (
+            strGroup,
+            strArtifact,
+            strVersion
+        )
+
+        if atMatch is None:
+            # No matching snippet found.
+            raise Exception('No matching snippet found for %s.' %
+                            strSnippetName)
+
+        strAbsPath = atMatch[0]
+        if self.__fDebug:
+            print('[SnipLib] Resolve: Found %s at "%s".' % (
+                  strSnippetName, strAbsPath))
+
+        atParameterList, strSnippet = self.__get_template(
+            strAbsPath,
+            atMatch[1],
+            strSnippetName
+        )
+
         # Combine the parameters.
         atReplace = {}
         astrMissing = []
@@ -523,15 +670,37 @@ class SnippetLibrary:
                     )
                 )
 
-        # Find the "Snippet" node.
-        tSnippetNode = self.__xml_get_node(tRootNode, 'Snippet')
-        if tSnippetNode is None:
+        if strSnippet is None:
             raise Exception(
                 'The snippet definition "%s" has no "Snippet" node.' %
                 strAbsPath
             )
 
-        # Get the text contents.
-        strSnippet = self.__xml_get_all_text(tSnippetNode)
-
         return (strSnippet, atReplace, strAbsPath)
+
+
+# All shared snippet libraries of this process.
+s_atSharedLibraries = {}
+s_tSharedLibrariesLock = threading.Lock()
+
+
+def get_shared_library(strDatabasePath, astrSnippetSearchPaths, debug=False):
+    """ Get the snippet library of this process for the database and paths.
+
+    All callers with the same database and search paths share one instance.
+    It scans the search paths only once.
+    """
+    tKey = (
+        strDatabasePath,
+        tuple(os.path.abspath(strPath) for strPath in astrSnippetSearchPaths)
+    )
+    with s_tSharedLibrariesLock:
+        cLibrary = s_atSharedLibraries.get(tKey)
+        if cLibrary is None:
+            cLibrary = SnippetLibrary(
+                strDatabasePath,
+                astrSnippetSearchPaths,
+                debug=debug
+            )
+            s_atSharedLibraries[tKey] = cLibrary
+    return cLibrary
@@ -37,6 +37,7 @@ import build_properties
 import concat
 import data_array
 import diff
+import elf_support
 import filter
 import flex_zip
 import gcc_symbol_template
@@ -93,6 +94,13 @@ def display_build_status():
 atexit.register(display_build_status)
 
 
+# ---------------------------------------------------------------------------
+#
+# Show how often the ELF cache saved parsing an ELF file again.
+#
+atexit.register(elf_support.print_cache_statistics)
+
+
 def find_first_tool(strToolPattern):
     strToolName = None
 
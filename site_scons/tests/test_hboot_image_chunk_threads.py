@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+strSiteScons = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if strSiteScons not in sys.path:
+    sys.path.insert(0, strSiteScons)
+
+# The package imports the SCons tool with the same name, so get the
+# compiler module from the module list.
+importlib.import_module('hboot_image_compiler.hboot_image')
+hboot_image = sys.modules['hboot_image_compiler.hboot_image']
+
+
+class TestChunkThreads(unittest.TestCase):
+    # Several Options chunks with SPI macros. All macros use the same labels.
+    strImage = (
+        '<HBootImage type="REGULAR"><Chunks>' +
+        ''.join(
+            '<Options><Option id="RAW" offset="0"><SPIM>'
+            'L0: 0x01, L0, 0x%02x, L1: 0x02, L1'
+            '</SPIM></Option></Options>' % uiIndex
+            for uiIndex in range(40)
+        ) +
+        '</Chunks></HBootImage>'
+    )
+
+    def setUp(self):
+        self.strTempFolder = tempfile.mkdtemp()
+        self.strInput = os.path.join(self.strTempFolder, 'spim.xml')
+        with open(self.strInput, 'wt') as tFile:
+            tFile.write(self.strImage)
+
+        # Switch the threads as often as possible.
+        if hasattr(sys, 'getswitchinterval'):
+            self.dSwitchInterval = sys.getswitchinterval()
+            sys.setswitchinterval(1e-6)
+
+    def tearDown(self):
+        if hasattr(sys, 'setswitchinterval'):
+            sys.setswitchinterval(self.dSwitchInterval)
+        shutil.rmtree(self.strTempFolder)
+
+    def __build(self, uiChunkThreads, strOutput):
+        tEnv = {
+            'OBJCOPY': 'objcopy',
+            'OBJDUMP': 'objdump',
+            'READELF': 'readelf',
+            'HBOOT_INCLUDE': []
+        }
+        tCompiler = hboot_image.HbootImage(
+            tEnv,
+            'NETX90',
+            patch_definition=os.path.join(
+                strSiteScons,
+                'hboot_netx90_patch_table.xml'
+            ),
+            chunk_threads=uiChunkThreads
+        )
+        tCompiler.parse_image(self.strInput)
+        strOutput = os.path.join(self.strTempFolder, strOutput)
+        tCompiler.write(strOutput)
+        with open(strOutput, 'rb') as tFile:
+            strData = tFile.read()
+        return strData
+
+    def test_spi_macros_in_parallel(self):
+        strExpected = self.__build(1, 'sequential.bin')
+        for uiRun in range(3):
+            strData = self.__build(8, 'parallel%d.bin' % uiRun)
+            self.assertEqual(strData, strExpected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+import importlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+strSiteScons = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if strSiteScons not in sys.path:
+    sys.path.insert(0, strSiteScons)
+
+importlib.import_module('hboot_image_compiler.signer')
+signer = sys.modules['hboot_image_compiler.signer']
+
+
+def have_openssl():
+    try:
+        subprocess.check_output(['openssl', 'version'])
+        fResult = True
+    except (OSError, subprocess.CalledProcessError):
+        fResult = False
+    return fResult
+
+
+@unittest.skipUnless(have_openssl(), 'The OpenSSL tool is missing.')
+class TestCryptographyFallback(unittest.TestCase):
+    def setUp(self):
+        self.strTempFolder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.strTempFolder)
+
+    def __openssl(self, astrArguments):
+        subprocess.check_output(['openssl'] + astrArguments)
+
+    def __path(self, strName):
+        return os.path.join(self.strTempFolder, strName)
+
+    @unittest.skipUnless(
+        signer.fHaveCryptography,
+        'The python package "cryptography" is missing.'
+    )
+    def test_brainpool_explicit_parameters(self):
+        # The "cryptography" package does not load EC keys with explicit
+        # parameters for curves which are not NIST curves.
+        self.__openssl([
+            'ecparam',
+            '-name', 'brainpoolP384r1',
+            '-genkey',
+            '-noout',
+            '-param_enc', 'explicit',
+            '-outform', 'DER',
+            '-out', self.__path('key.der')
+        ])
+        self.__openssl([
+            'ec',
+            '-inform', 'DER',
+            '-in', self.__path('key.der'),
+            '-pubout',
+            '-out', self.__path('public.pem')
+        ])
+        with open(self.__path('key.der'), 'rb') as tFile:
+            strKeyDER = tFile.read()
+
+        strData = b'hboot signer test data'
+        cSigner = signer.CryptographySigner(True, signer.OpensslSigner())
+        try:
+            strSignature = cSigner.sign(strKeyDER, strData, False)
+        finally:
+            cSigner.close()
+
+        with open(self.__path('data.bin'), 'wb') as tFile:
+            tFile.write(strData)
+        with open(self.__path('signature.der'), 'wb') as tFile:
+            tFile.write(strSignature)
+        self.__openssl([
+            'dgst',
+            '-sha384',
+            '-verify', self.__path('public.pem'),
+            '-signature', self.__path('signature.der'),
+            self.__path('data.bin')
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+import importlib
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import unittest
+
+strSiteScons = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if strSiteScons not in sys.path:
+    sys.path.insert(0, strSiteScons)
+
+importlib.import_module('hboot_image_compiler.signing_service')
+signing_service = sys.modules['hboot_image_compiler.signing_service']
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'No Unix sockets.')
+class TestSocketChecks(unittest.TestCase):
+    def setUp(self):
+        self.strTempFolder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.strTempFolder)
+
+    def test_refuse_public_socket(self):
+        # Somebody else might listen on a socket which everybody can use.
+        strSocketPath = os.path.join(self.strTempFolder, 'public.sock')
+        tListener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            tListener.bind(strSocketPath)
+            os.chmod(strSocketPath, 0o777)
+            tListener.listen(1)
+
+            self.assertRaises(
+                Exception,
+                signing_service.start_service,
+                strSocketPath
+            )
+            tClient = signing_service.SigningClient(strSocketPath)
+            self.assertRaises(Exception, tClient.sign, b'key', b'data')
+        finally:
+            tListener.close()
+
+    def test_keep_other_files(self):
+        # The server must only replace stale sockets.
+        strPath = os.path.join(self.strTempFolder, 'file.sock')
+        with open(strPath, 'wt') as tFile:
+            tFile.write('no socket')
+
+        tServer = signing_service.SigningServer(strPath, 1)
+        self.assertRaises(Exception, tServer.serve_forever)
+        self.assertTrue(os.path.isfile(strPath))
+
+    def test_private_default_socket(self):
+        strSocketPath = signing_service.start_service()
+        try:
+            signing_service.check_socket(strSocketPath)
+            strFolder = os.path.dirname(strSocketPath)
+            self.assertEqual(os.stat(strFolder).st_mode & 0o777, 0o700)
+            self.assertEqual(signing_service.start_service(), strSocketPath)
+        finally:
+            signing_service.stop_services()
+        self.assertFalse(os.path.exists(strFolder))
+
+
+if __name__ == '__main__':
+    unittest.main()
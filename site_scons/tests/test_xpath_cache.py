@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+strSiteScons = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if strSiteScons not in sys.path:
+    sys.path.insert(0, strSiteScons)
+
+import xpath.cache
+
+
+class TestExpressionCache(unittest.TestCase):
+    def setUp(self):
+        self.compiled = []
+
+    def compile(self, key):
+        self.compiled.append(key)
+        return key.upper()
+
+    def test_miss_and_hit(self):
+        cache = xpath.cache.ExpressionCache(max_size=4)
+        self.assertEqual(cache.get('a', self.compile), 'A')
+        self.assertEqual(cache.get('a', self.compile), 'A')
+        self.assertEqual(self.compiled, ['a'])
+
+        statistics = cache.statistics()
+        self.assertEqual(statistics['misses'], 1)
+        self.assertEqual(statistics['hits'], 1)
+        self.assertEqual(statistics['size'], 1)
+
+    def test_hit_refreshes_entry(self):
+        cache = xpath.cache.ExpressionCache(max_size=2)
+        cache.get('a', self.compile)
+        cache.get('b', self.compile)
+        # Using "a" again makes "b" the least recently used entry.
+        cache.get('a', self.compile)
+        cache.get('c', self.compile)
+
+        self.compiled = []
+        cache.get('a', self.compile)
+        self.assertEqual(self.compiled, [])
+        cache.get('b', self.compile)
+        self.assertEqual(self.compiled, ['b'])
+        self.assertEqual(cache.statistics()['evictions'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
+import xpath.cache
 import xpath.exceptions
 import xpath.expr
 import xpath.parser
+import xpath.scanner
 import xpath.yappsrt
 import xpath.functions
 
@@ -82,14 +84,19 @@ class XPathContext(object):
 
 
 class XPath():
-    _max_cache = 100
-    _cache = {}
+    _cache = xpath.cache.ExpressionCache()
 
-    def __init__(self, expr):
-        """Init docs.
+    def __init__(self, expr, scanner=None):
+        """Parse expr.
+
+        scanner is the tokenizer class. It defaults to the single-regex
+        xpath.scanner.FastXPathScanner; pass xpath.parser.XPathScanner to
+        use the original yapps scanner.
         """
+        if scanner is None:
+            scanner = xpath.scanner.FastXPathScanner
         try:
-            parser = xpath.parser.XPath(xpath.parser.XPathScanner(str(expr)))
+            parser = xpath.parser.XPath(scanner(str(expr)))
             self.expr = parser.XPath()
         except xpath.yappsrt.SyntaxError as e:
             raise xpath.exceptions.XPathParseError(str(expr), e.pos, e.msg)
@@ -98,14 +105,15 @@ class XPath():
     def get(cls, s):
         if isinstance(s, cls):
             return s
-        try:
-            return cls._cache[s]
-        except KeyError:
-            if len(cls._cache) > cls._max_cache:
-                cls._cache.clear()
-            expr = cls(s)
-            cls._cache[s] = expr
-            return expr
+        return cls._cache.get(s, cls)
+
+    @classmethod
+    def set_cache_size(cls, size):
+        cls._cache.resize(size)
+
+    @classmethod
+    def cache_statistics(cls):
+        return cls._cache.statistics()
 
     @api
     def find(self, node, context=None, **kwargs):
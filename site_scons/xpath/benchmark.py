@@ -0,0 +1,136 @@
+"""Parse throughput benchmark for the XPath scanners.
+
+The benchmark collects the XPath expressions, patterns and attribute value
+templates from the stylesheets and parses each of them with the yapps
+scanner and with the single-regex scanner.
+
+Run from the site_scons folder:
+  python -m xpath.benchmark [stylesheet.xsl ...]
+
+Without arguments, it uses setup2html.xsl and every stylesheet below
+site_scons.
+"""
+
+import glob
+import os.path
+import sys
+import time
+import xml.dom.minidom
+
+import xpath.parser
+import xpath.scanner
+import xpath.yappsrt
+
+
+XSL_NAMESPACE = 'http://www.w3.org/1999/XSL/Transform'
+
+# The grammar rule for each kind of XSLT attribute.
+EXPRESSION_ATTRIBUTES = {
+    'select': 'XPath',
+    'test': 'XPath',
+    'use': 'XPath',
+    'match': 'Pattern',
+    'count': 'Pattern',
+    'from': 'Pattern',
+}
+
+
+def default_stylesheets():
+    site_scons = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    paths = [os.path.join(os.path.dirname(site_scons), 'setup2html.xsl')]
+    for root, dirs, files in os.walk(site_scons):
+        paths.extend(
+            os.path.join(root, name)
+            for name in sorted(files)
+            if name.endswith('.xsl') or name.endswith('.xslt')
+        )
+    return [path for path in paths if os.path.isfile(path)]
+
+
+def collect_expressions(path):
+    """Return a list of (rule, expression) pairs from a stylesheet."""
+    expressions = []
+    document = xml.dom.minidom.parse(path)
+    for node in document.getElementsByTagName('*'):
+        is_xsl = node.namespaceURI == XSL_NAMESPACE
+        for i in range(node.attributes.length):
+            attr = node.attributes.item(i)
+            if is_xsl:
+                rule = EXPRESSION_ATTRIBUTES.get(attr.name)
+                if rule is not None:
+                    expressions.append((rule, attr.value))
+            elif '{' in attr.value:
+                expressions.append(('AttributeValueTemplate', attr.value))
+    return expressions
+
+
+def tokens(scanner_class, rule, expression):
+    parser = xpath.parser.XPath(scanner_class(expression))
+    getattr(parser, rule)()
+    return [t[2:] for t in parser._scanner.tokens]
+
+
+def parse_all(scanner_class, expressions, rounds):
+    start = time.time()
+    for _ in range(rounds):
+        for rule, expression in expressions:
+            getattr(xpath.parser.XPath(scanner_class(expression)), rule)()
+    return time.time() - start
+
+
+def benchmark_scanners(stylesheets, rounds=50):
+    expressions = []
+    for path in stylesheets:
+        expressions.extend(collect_expressions(path))
+    if len(expressions) == 0:
+        print('No expressions found.')
+        return
+
+    # Both scanners must produce the same tokens.
+    for rule, expression in expressions:
+        # The yapps scanner fails with an AttributeError on some syntax
+        # errors, so treat any exception as a failed parse.
+        try:
+            old = tokens(xpath.parser.XPathScanner, rule, expression)
+        except Exception:
+            old = None
+        try:
+            new = tokens(xpath.scanner.FastXPathScanner, rule, expression)
+        except xpath.yappsrt.SyntaxError:
+            new = None
+        if old != new:
+            print('Token mismatch for %s %r' % (rule, expression))
+
+    # Leave out the expressions which do not parse.
+    valid = []
+    for rule, expression in expressions:
+        try:
+            tokens(xpath.scanner.FastXPathScanner, rule, expression)
+            valid.append((rule, expression))
+        except xpath.yappsrt.SyntaxError:
+            pass
+
+    count = len(valid) * rounds
+    t_yapps = parse_all(xpath.parser.XPathScanner, valid, rounds)
+    t_fast = parse_all(xpath.scanner.FastXPathScanner, valid, rounds)
+
+    print('%d expressions from %d stylesheets, %d rounds:' % (
+        len(valid),
+        len(stylesheets),
+        rounds
+    ))
+    print('  yapps scanner:        %.3fs (%d parses/s)' % (
+        t_yapps,
+        count / t_yapps
+    ))
+    print('  single-regex scanner: %.3fs (%d parses/s)' % (
+        t_fast,
+        count / t_fast
+    ))
+
+
+if __name__ == '__main__':
+    paths = []
+    for arg in sys.argv[1:]:
+        paths.extend(glob.glob(arg))
+    benchmark_scanners(paths or default_stylesheets())
@@ -0,0 +1,67 @@
+import collections
+import threading
+
+
+class ExpressionCache(object):
+    """A thread-safe LRU cache for compiled XPath expressions.
+
+    Once the cache is full, the least recently used expression is dropped.
+
+    """
+
+    def __init__(self, max_size=1000):
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._max_size = max_size
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key, compile):
+        """Return the cached value for key.  On a miss, compile(key) is
+        called outside the lock and the result is stored."""
+        with self._lock:
+            try:
+                # Python 2 has no move_to_end, so reinsert the entry to
+                # make it the most recently used one.
+                value = self._entries.pop(key)
+            except KeyError:
+                self._misses += 1
+            else:
+                self._entries[key] = value
+                self._hits += 1
+                return value
+
+        value = compile(key)
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            self._shrink()
+        return value
+
+    def resize(self, max_size):
+        with self._lock:
+            self._max_size = max_size
+            self._shrink()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def statistics(self):
+        """Return a dict with the hits, misses, evictions, size and
+        max_size of the cache."""
+        with self._lock:
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'size': len(self._entries),
+                'max_size': self._max_size,
+            }
+
+    def _shrink(self):
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
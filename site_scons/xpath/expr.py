@@ -13,42 +13,93 @@ import xpath.axes
 # Data model functions.
 #
 
+class DocumentOrderIndex(object):
+    """Pre-order numbering of all nodes below one root node.
+
+    Every indexed node gets an 'xpath_order' attribute holding the index,
+    its order value and its parent at indexing time.  The index is dropped
+    when a node is found under a different parent or is not indexed yet.
+    Code which reorders siblings must call invalidate_document_order.
+
+    """
+
+    _root_ids = itertools.count()
+
+    def __init__(self, root):
+        self.valid = True
+
+        # Keep the root id over rebuilds, so values taken before and after
+        # a rebuild are still comparable.
+        root_id = getattr(root, 'xpath_rootId', None)
+        if root_id is None:
+            root_id = next(DocumentOrderIndex._root_ids)
+            root.xpath_rootId = root_id
+
+        old_index = getattr(root, 'xpath_orderIndex', None)
+        if old_index is not None:
+            old_index.valid = False
+        root.xpath_orderIndex = self
+
+        # Attributes come after their element and before its children,
+        # ordered by name.
+        order = 0
+        stack = [(root, _parent_of(root))]
+        while stack:
+            node, parent = stack.pop()
+            node.xpath_order = (self, (root_id, order), parent)
+            order += 1
+            if node.nodeType == node.ELEMENT_NODE:
+                attrs = node.attributes
+                for attr in sorted((attrs.item(i)
+                                    for i in range(attrs.length)),
+                                   key=lambda x: x.name):
+                    attr.xpath_order = (self, (root_id, order), node)
+                    order += 1
+            if node.nodeType != node.ATTRIBUTE_NODE:
+                stack.extend((child, node)
+                             for child in reversed(node.childNodes))
+
+
+def _parent_of(node):
+    if node.nodeType == node.ATTRIBUTE_NODE:
+        return node.ownerElement
+    return node.parentNode
+
+
+def _root_of(node):
+    parent = _parent_of(node)
+    while parent is not None:
+        node = parent
+        parent = _parent_of(node)
+    return node
+
+
+def invalidate_document_order(node):
+    """Drop the document order index of the tree containing node."""
+    index = getattr(_root_of(node), 'xpath_orderIndex', None)
+    if index is not None:
+        index.valid = False
+
+
 def document_order(node):
     """Compute a document order value for the node.
 
     cmp(document_order(a), document_order(b)) will return -1, 0, or 1 if
     a is before, identical to, or after b in the document respectively.
 
-    We represent document order as a list of sibling indexes.  That is,
-    the third child of the document node has an order of [2].  The first
-    child of that node has an order of [2,0].
+    We represent document order as a tuple of a root id and the position
+    of the node in a pre-order walk of the tree.  The positions are
+    computed once per tree and kept in a DocumentOrderIndex.
 
-    Attributes have a sibling index of -1 (coming before all children of
-    their node) and are further ordered by name--e.g., [2,0,-1,'href'].
+    Attributes come before all children of their node and are further
+    ordered by name.
 
     """
-
-    # Attributes: parent-order + [-1, attribute-name]
-    if node.nodeType == node.ATTRIBUTE_NODE:
-        order = document_order(node.ownerElement)
-        order.extend((-1, node.name))
-        return order
-
-    # The document root (hopefully): []
-    if node.parentNode is None:
-        return [hash(node)]  # set some order for different documents
-
-    # Determine which child this is of its parent.
-    sibpos = 0
-    sib = node
-    while sib.previousSibling is not None:
-        sibpos += 1
-        sib = sib.previousSibling
-
-    # Order: parent-order + [sibling-position]
-    order = document_order(node.parentNode)
-    order.append(sibpos)
-    return order
+    info = getattr(node, 'xpath_order', None)
+    if info is None or not info[0].valid or info[2] is not _parent_of(node):
+        DocumentOrderIndex(_root_of(node))
+        info = node.xpath_order
+    return info[1]
 
 
 #
@@ -225,7 +276,8 @@ class UnionExpr(BinaryOperatorExpr):
             )
 
         # Need to sort the result to preserve document order.
-        return sorted(set(itertools.chain(a, b)), key=document_order)
+        unique = dict((id(n), n) for n in itertools.chain(a, b))
+        return sorted(unique.values(), key=document_order)
 
 
 class NegationExpr(Expr):
@@ -325,19 +377,28 @@ class Function(Expr):
         return '%s(%s)' % (self.name, ', '.join((str(x) for x in self.args)))
 
 
-def merge_into_nodeset(target, source):
+def merge_into_nodeset(target, source, seen=None):
     """Place all the nodes from the source node-set into the target
     node-set, preserving document order.  Both node-sets must be in
     document order to begin with.
 
+    'seen' is an optional set with the ids of all nodes in target.  It is
+    updated with the new nodes and saves building it again for every merge
+    into the same target.
+
     """
+    if seen is None:
+        seen = set(id(n) for n in target)
+
     if len(target) == 0:
         target.extend(source)
+        seen.update(id(n) for n in source)
         return
 
-    source = [n for n in source if n not in target]
+    source = [n for n in source if id(n) not in seen]
     if len(source) == 0:
         return
+    seen.update(id(n) for n in source)
 
     # If the last node in the target set comes before the first node in the
     # source set, then we can just concatenate the sets.  Otherwise, we
@@ -387,15 +448,29 @@ class PathExpr(Expr):
 
         # Subsequent steps are evaluated for each node in the node-set
         # resulting from the previous step.
+        # The new nodes are collected first and sorted only once at the end
+        # if they were not appended in document order.
         for step in self.steps[1:]:
             aggregate = []
+            seen = set()
+            in_order = True
             for i in range(len(result)):
                 nodes = step.evaluate(result[i], i+1, len(result), context)
                 if not xpath.tools.nodesetp(nodes):
                     raise xpath.exceptions.XPathTypeError(
                         "path step is not a node-set"
                     )
-                merge_into_nodeset(aggregate, nodes)
+                nodes = [n for n in nodes if id(n) not in seen]
+                if len(nodes) == 0:
+                    continue
+                seen.update(id(n) for n in nodes)
+                if in_order and len(aggregate) != 0 and \
+                        document_order(aggregate[-1]) > \
+                        document_order(nodes[0]):
+                    in_order = False
+                aggregate.extend(nodes)
+            if not in_order:
+                aggregate.sort(key=document_order)
             result = aggregate
 
         return result
@@ -0,0 +1,99 @@
+import re
+
+import xpath.parser
+import xpath.yappsrt
+
+
+def _compile(patterns):
+    """Combine patterns into one regex with an optional lookahead group per
+    pattern. Return the regex and a list of (token, group index)."""
+    master = re.compile(''.join(
+        '(?:(?=(?P<t%d>%s)))?' % (i, r.pattern)
+        for i, (p, r) in enumerate(patterns)
+    ))
+    groups = [
+        (p, master.groupindex['t%d' % i])
+        for i, (p, r) in enumerate(patterns)
+    ]
+    return master, groups
+
+
+class FastXPathScanner(xpath.parser.XPathScanner):
+    """Drop-in replacement for xpath.parser.XPathScanner.
+
+    The yapps scanner runs every token regex on its own at each position.
+    Here the token regexes allowed by a restriction are combined into one
+    master regex. Each token gets an optional lookahead group, so a single
+    match reports the match length of every candidate at the current
+    position. The token is then picked with the same rules as yapps: the
+    longest match wins, and on a tie the earlier pattern wins. The token
+    stream is identical to the one from XPathScanner.
+
+    """
+
+    # The master regex and (token, group) list for each restriction.
+    _masters = {}
+
+    # The result of the restriction check for each pair of restrictions.
+    _subsets = {}
+
+    def _get_master(self, restrict):
+        key = tuple(restrict) if restrict else ()
+        try:
+            return self._masters[key]
+        except KeyError:
+            master = _compile([
+                (p, r) for p, r in self.patterns
+                if not key or p in key or p in self.ignore
+            ])
+            self._masters[key] = master
+            return master
+
+    def token(self, i, restrict=0):
+        tokens = self.tokens
+        if i == len(tokens):
+            self.scan(restrict)
+        if i < len(tokens):
+            # Make sure the restriction is more restricted
+            if restrict and self.restrictions[i]:
+                key = (tuple(restrict), tuple(self.restrictions[i]))
+                try:
+                    subset = self._subsets[key]
+                except KeyError:
+                    subset = set(key[0]) <= set(key[1])
+                    self._subsets[key] = subset
+                if not subset:
+                    raise NotImplementedError(
+                        "Unimplemented: restriction set changed"
+                    )
+            return tokens[i]
+        raise xpath.yappsrt.NoMoreTokens()
+
+    def scan(self, restrict):
+        master, candidates = self._get_master(restrict)
+        while 1:
+            spans = master.match(self.input, self.pos).regs
+            best_match = -1
+            best_pat = '(error)'
+            for p, g in candidates:
+                start, end = spans[g]
+                if start >= 0 and end - start > best_match:
+                    best_pat = p
+                    best_match = end - start
+
+            if best_match < 0:
+                msg = "Bad Token"
+                if restrict:
+                    msg = "Trying to find one of " + ", ".join(restrict)
+                raise xpath.yappsrt.SyntaxError(self.pos, msg)
+
+            if best_pat not in self.ignore:
+                token = (self.pos, self.pos + best_match, best_pat,
+                         self.input[self.pos:self.pos + best_match])
+                self.pos += best_match
+                if not self.tokens or token != self.tokens[-1]:
+                    self.tokens.append(token)
+                    self.restrictions.append(restrict)
+                return
+            else:
+                self.pos += best_match
@@ -55,17 +55,30 @@ def xslt_action(target, source, env):
     tProc = xslt.XSLTProcessor()
     tProc.setStylesheet(source[1].get_path())
     astrMsgs = []
-    strResult = tProc.transform(source[0].get_path(), messages=astrMsgs)
+
+    # Write the transformed data directly to the target file.
+    strTarget = target[0].get_path()
+    file_target = open(strTarget, 'wb')
+    try:
+        tProc.transform(
+            source[0].get_path(),
+            messages=astrMsgs,
+            stream=file_target
+        )
+    except BaseException:
+        # Do not leave an incomplete target behind. SCons might treat it as
+        # up to date.
+        file_target.close()
+        if os.path.exists(strTarget):
+            os.remove(strTarget)
+        raise
+    finally:
+        file_target.close()
 
     # Show all messages.
     for strMsg in astrMsgs:
         print('[MSG]: %s' % strMsg)
 
-    # Write the transformed data to the target file.
-    file_target = open(target[0].get_path(), 'wb')
-    file_target.write(strResult)
-    file_target.close()
-
     return 0
 
 
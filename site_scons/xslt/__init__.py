@@ -1,5 +1,6 @@
 # elements need to register themselves as Element subclasses
 import xslt.core
+import xslt.six
 import xslt.stylesheet
 
 
@@ -10,7 +11,13 @@ class XSLTProcessor(object):
         self.params = {}
 
     def setStylesheet(self, uriOrDoc):
-        self.stylesheet = xslt.stylesheet.Stylesheet(uriOrDoc, dp=self.dp)
+        if isinstance(uriOrDoc, xslt.six.string_types):
+            self.stylesheet = self.dp.stylesheet(
+                uriOrDoc,
+                lambda uri: xslt.stylesheet.Stylesheet(uri, dp=self.dp)
+            )
+        else:
+            self.stylesheet = xslt.stylesheet.Stylesheet(uriOrDoc, dp=self.dp)
 
     def setParameter(self, name, value=None):
         if value is None:
@@ -27,10 +34,17 @@ class XSLTProcessor(object):
         context = self.createContext()
         return self.stylesheet.transformToDoc(uriOrDoc, context)
 
-    def transform(self, uriOrDoc, messages=None):
+    def transform(self, uriOrDoc, messages=None, stream=None):
+        """Return the serialized result. If stream is given, the result is
+        written to this binary file-like object instead and None is
+        returned."""
         context = self.createContext()
 
-        s = self.stylesheet.transformToString(uriOrDoc, context)
+        if stream is None:
+            s = self.stylesheet.transformToString(uriOrDoc, context)
+        else:
+            s = None
+            self.stylesheet.transformToStream(uriOrDoc, context, stream)
 
         if messages is not None:
             messages.extend(context.messages)
@@ -0,0 +1,108 @@
+"""Benchmarks for the XSLT engine.
+
+Run from the site_scons folder:
+  python -m xslt.benchmark [number of nodes]
+"""
+
+import functools
+import os.path
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import xslt
+import xslt.elements
+import xpath.tools
+
+
+SORT_STYLESHEET = '''<?xml version="1.0"?>
+<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+<xsl:output method="text"/>
+<xsl:template match="/">
+  <xsl:for-each select="root/item">
+    <xsl:sort select="@group"/>
+    <xsl:sort select="@value" data-type="number" order="descending"/>
+    <xsl:value-of select="@name"/>
+    <xsl:text>&#10;</xsl:text>
+  </xsl:for-each>
+</xsl:template>
+</xsl:stylesheet>
+'''
+
+
+def createSortInput(size):
+    rnd = random.Random(size)
+    lines = ['<root>']
+    for i in range(size):
+        lines.append('<item name="n%d" group="%s" value="%d"/>' % (
+            i,
+            rnd.choice(['alpha', 'Alpha', 'beta', 'gamma', 'Delta']),
+            rnd.randint(0, 1000)
+        ))
+    lines.append('</root>')
+    return '\n'.join(lines)
+
+
+def cmpSort(context, sortList):
+    """The old xsl:sort: evaluate the keys of both nodes on every
+    comparison."""
+
+    def compare(a, b):
+        for sort in sortList:
+            subContext = context.copy()
+            subContext.nodeset = [a]
+            v1 = sort.select.find(subContext)
+            subContext.nodeset = [b]
+            v2 = sort.select.find(subContext)
+            if sort.dataType == 'number':
+                v1 = xpath.tools.number(v1, subContext)
+                v2 = xpath.tools.number(v2, subContext)
+            else:
+                v1 = xpath.tools.string(v1, subContext)
+                v2 = xpath.tools.string(v2, subContext)
+            r = (v1 > v2) - (v1 < v2)
+            if not sort.asc:
+                r = -r
+            if r != 0:
+                return r
+        return 0
+    context.nodeset.sort(key=functools.cmp_to_key(compare))
+
+
+def runTransform(xslPath, xmlPath):
+    proc = xslt.XSLTProcessor()
+    proc.setStylesheet(xslPath)
+    start = time.time()
+    proc.transform(xmlPath)
+    return time.time() - start
+
+
+def benchmarkSort(size):
+    tmp = tempfile.mkdtemp()
+    try:
+        xslPath = os.path.join(tmp, 'sort.xsl')
+        xmlPath = os.path.join(tmp, 'sort.xml')
+        with open(xslPath, 'w') as f:
+            f.write(SORT_STYLESHEET)
+        with open(xmlPath, 'w') as f:
+            f.write(createSortInput(size))
+
+        keySort = xslt.elements.Sort.sort
+        tKey = runTransform(xslPath, xmlPath)
+        try:
+            xslt.elements.Sort.sort = staticmethod(cmpSort)
+            tCmp = runTransform(xslPath, xmlPath)
+        finally:
+            xslt.elements.Sort.sort = keySort
+    finally:
+        shutil.rmtree(tmp, True)
+
+    print('xsl:sort with 2 keys over %d nodes:' % size)
+    print('  precomputed keys: %.3fs' % tKey)
+    print('  compare function: %.3fs' % tCmp)
+
+
+if __name__ == '__main__':
+    benchmarkSort(int(sys.argv[1]) if len(sys.argv) > 1 else 3000)
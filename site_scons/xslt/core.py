@@ -1,4 +1,6 @@
+import os
 import os.path
+import threading
 import xml.dom.minidom
 import xslt.exceptions
 import xslt.functions
@@ -103,21 +105,75 @@ def assertEmptyNode(node):
 
 
 class DocumentProvider(object):
+    """Parses and caches documents and compiled stylesheets.
+
+    Cache entries remember the modification time and size of their files
+    and are rebuilt once a file changes. The XSLTProcessor default
+    instance is shared, so the caches live for the whole process."""
+
     def __init__(self):
+        # uri -> (document, stamp)
         self.cache = {}
+        # uri -> (stylesheet, ((uri, stamp), ...))
+        self.stylesheets = {}
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def stamp(uri):
+        """Returns the modification time and size of the file uri or None
+        if it is no file."""
+        try:
+            st = os.stat(uri)
+        except (OSError, ValueError):
+            return None
+        return (st.st_mtime, st.st_size)
 
     def document(self, uri, base=''):
         uri = self.absUri(uri, base)
+        stamp = self.stamp(uri)
 
-        if uri not in self.cache:
-            self.cache[uri] = xml.dom.minidom.parse(uri)
-            self.cache[uri].baseUri = uri
+        with self.lock:
+            entry = self.cache.get(uri)
+        if entry is not None and entry[1] == stamp:
+            return entry[0]
 
-        return self.cache[uri]
+        doc = xml.dom.minidom.parse(uri)
+        doc.baseUri = uri
+        with self.lock:
+            self.cache[uri] = (doc, stamp)
+        return doc
+
+    def documentStamp(self, uri, base=''):
+        """Returns the stamp of the cached document uri."""
+        with self.lock:
+            entry = self.cache.get(self.absUri(uri, base))
+        if entry is None:
+            return None
+        return entry[1]
+
+    def stylesheet(self, uri, create):
+        """Returns the compiled stylesheet for uri. create(uri) builds the
+        stylesheet if it is not cached or one of the files it was built
+        from changed."""
+        key = self.absUri(uri)
+
+        with self.lock:
+            entry = self.stylesheets.get(key)
+        if entry is not None:
+            sheet, stamps = entry
+            if all(self.stamp(u) == s for u, s in stamps):
+                return sheet
+
+        sheet = create(uri)
+        stamps = tuple((u, self.documentStamp(u)) for u in sheet.uris)
+        with self.lock:
+            self.stylesheets[key] = (sheet, stamps)
+        return sheet
 
     def addDOMDocument(self, doc):
-        uri = '#id'+hash(doc)
-        self.cache[uri] = doc
+        uri = '#id%d' % id(doc)
+        with self.lock:
+            self.cache[uri] = (doc, None)
         doc.baseUri = uri
         return uri
 
@@ -149,6 +205,8 @@ class XSLTContext(object):
         self.toplevelContext = self
 
         self.matches = {}
+        # key() lookup tables built by xsl:key elements
+        self.keyIndexes = {}
         self.messages = []
         self.fallback = False
 
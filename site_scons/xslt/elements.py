@@ -5,8 +5,9 @@ import xslt.xp
 from io import StringIO
 import xslt.properties
 import xslt.core
+import xpath.expr
 import xpath.tools
-import functools
+import math
 
 
 class LiteralText(xslt.core.Element):
@@ -286,7 +287,7 @@ class AttributeSet(xslt.core.Element):
 
 
 class Key(xslt.core.Element):
-    name = 'Key'
+    name = 'key'
 
     def initImpl(self, node, stylesheet, options):
         self.name = xslt.properties.qnameProperty(
@@ -297,24 +298,59 @@ class Key(xslt.core.Element):
             resolveDefault=False
         )
         match = xslt.properties.patternProperty(node, 'match', required=True)
-        use = xslt.properties.exprProperty(node, 'user', required=True)
-        self.keys = (match, use)
+        use = xslt.properties.exprProperty(node, 'use', required=True)
+        self.keys = [(match, use, self.namespaces)]
 
     def update(self, key):
         self.keys.extend(key.keys)
 
-    def select(self, context, value):
+    def buildIndex(self, context, document):
+        """Evaluate all match patterns and use expressions once for the
+        document. Returns a dict mapping each key value to the matching
+        nodes in document order."""
+
         subContext = context.toplevelContext.copy()
-        nodes = []
-        for key in self.keys:
-            cands = key[0].nodes(subContext)
+        index = {}
+        for (match, use, namespaces) in self.keys:
+            subContext.namespaces = namespaces
+            subContext.nodeset = [document]
+            cands = match.nodes(subContext)
             for cand in cands:
                 subContext.nodeset = [cand]
-                if key[1].findString(subContext) == \
-                   xpath.tools.string(value, context):
-                    nodes.append(cand)
+                value = use.find(subContext)
+                if xpath.tools.nodesetp(value):
+                    values = set(xpath.tools.string_value(x) for x in value)
+                else:
+                    values = [xpath.tools.string(value, subContext)]
+                for v in values:
+                    index.setdefault(v, []).append(cand)
+
+        # Several definitions for the same name may add a node more than
+        # once and out of order.
+        if len(self.keys) > 1:
+            for (v, nodes) in index.items():
+                unique = dict((id(n), n) for n in nodes)
+                index[v] = sorted(unique.values(),
+                                  key=xpath.expr.document_order)
+
+        return index
+
+    def select(self, context, value):
+        node = context.node
+        document = (
+            node.ownerDocument
+            if node.nodeType != xml.dom.Node.DOCUMENT_NODE
+            else node
+        )
+
+        # The index is built on the first use for each document.
+        handle = (hash(context.stylesheet), hash(document), self.name)
+        index = context.keyIndexes.get(handle)
+        if index is None:
+            index = self.buildIndex(context, document)
+            context.keyIndexes[handle] = index
 
-        return nodes
+        return list(index.get(xpath.tools.string(value, context), []))
 
 
 class Template(xslt.core.Element):
@@ -461,35 +497,45 @@ class Sort(object):
         )
         self.upperFirst = caseOrder == 'upper-first'
 
-    def compare(self, context, node1, node2):
-        subContext = context.copy()
+    def sortKey(self, context):
+        """Returns the key of the current node of context for this sort.
+        The keys of all nodes are computed once before sorting."""
 
-        subContext.nodeset = [node1]
-        v1 = self.select.find(subContext)
-        subContext.nodeset = [node2]
-        v2 = self.select.find(subContext)
+        v = self.select.find(context)
 
-        if self.dataType == 'text':
-            v1 = xpath.tools.string(v1, subContext)
-            v2 = xpath.tools.string(v2, subContext)
         if self.dataType == 'number':
-            v1 = xpath.tools.number(v1, subContext)
-            v2 = xpath.tools.number(v2, subContext)
-
-        r = (v1 > v2) - (v1 < v2)
-        if not self.asc:
-            r = -r
-        return r
+            v = xpath.tools.number(v, context)
+            # NaN comes before all numbers [XSLT 10]
+            if math.isnan(v):
+                return (0, 0)
+            return (1, v)
+
+        v = xpath.tools.string(v, context)
+        # Ignore the case first, then put the upper or lower case first.
+        if self.upperFirst:
+            return (v.lower(), v)
+        return (v.lower(), v.swapcase())
 
     @staticmethod
     def sort(context, sortList):
-        def compare(a, b):
-            for sort in sortList:
-                r = sort.compare(context, a, b)
-                if r != 0:
-                    return r
-        if sortList:
-            context.nodeset.sort(key=functools.cmp_to_key(compare))
+        if not sortList:
+            return
+
+        # Evaluate all sort keys once for each node. The nodes are the
+        # current node list, so position() and last() work.
+        nodes = context.nodeset
+        subContext = context.copy()
+        subContext.nodeset = nodes
+        keys = [[sort.sortKey(subContext) for sort in sortList]
+                for node in subContext]
+
+        # Sort by the least significant key first. The sort is stable,
+        # also in reverse mode.
+        order = list(range(len(nodes)))
+        for i in reversed(range(len(sortList))):
+            order.sort(key=lambda j: keys[j][i], reverse=not sortList[i].asc)
+
+        context.nodeset = [nodes[j] for j in order]
 
 
 class ApplyTemplates(xslt.core.Element):
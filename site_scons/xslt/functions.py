@@ -1,4 +1,5 @@
 from xpath.functions import function
+import xpath.expr
 import xpath.tools
 import xslt.properties
 import xslt.core
@@ -115,10 +116,12 @@ def f_key(node, pos, size, context, name, obj):
     name = xpath.tools.string(name, context)
 
     if xpath.tools.nodesetp(obj):
-        r = []
+        r = {}
         for x in obj:
-            r += f_key(node, pos, size, context, name, x)
-        return r
+            for n in f_key(node, pos, size, context, name,
+                           xpath.tools.string_value(x)):
+                r[id(n)] = n
+        return sorted(r.values(), key=xpath.expr.document_order)
 
-    name = properties.resolveQName(name, namespaces=context.namespaces)
+    name = xslt.properties.resolveQName(name, namespaces=context.namespaces)
     return context.stylesheet.keys[name].select(context, obj)
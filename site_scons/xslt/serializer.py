@@ -1,20 +1,60 @@
-try:
-    # Try to load the python2 module.
-    from StringIO import StringIO
-except ImportError as e:
-    # Load the python3 module.
-    from io import StringIO
+import codecs
+import io
 import xml.dom
 from xml.sax.saxutils import quoteattr, escape
 
 
-class XMLSerializer(object):
+class EncodingWriter(object):
+    """Collect text written by a serializer and pass it encoded to a binary
+    file-like object in chunks of about bufferSize characters."""
+
+    def __init__(self, stream, encoding, bufferSize=65536):
+        self.stream = stream
+        self.encoder = codecs.getincrementalencoder(encoding)()
+        self.bufferSize = bufferSize
+        self.parts = []
+        self.size = 0
+
+    def write(self, s):
+        self.parts.append(s)
+        self.size += len(s)
+        if self.size >= self.bufferSize:
+            self.flush()
+
+    def flush(self, final=False):
+        if self.parts or final:
+            self.stream.write(
+                self.encoder.encode(''.join(self.parts), final)
+            )
+            self.parts = []
+            self.size = 0
+
+
+class Serializer(object):
     def __init__(self, output):
         self.output = output
 
-    def serializeResult(self, frag):
-        s = StringIO()
+    def serializeResult(self, frag, stream=None):
+        """Serialize the result fragment.
+
+        If stream is None, the encoded result is returned. Otherwise it is
+        written piece by piece to the binary file-like object stream."""
+        if stream is None:
+            s = io.BytesIO()
+            self.serializeResult(frag, s)
+            return s.getvalue()
+
+        writer = EncodingWriter(stream, self.output.get('encoding', 'utf-8'))
+        self.serializeHeader(frag, writer)
+        self.serialize(frag, writer)
+        writer.flush(True)
+
+    def serializeHeader(self, frag, writer):
+        pass
+
 
+class XMLSerializer(Serializer):
+    def serializeHeader(self, frag, s):
         if self.output.get('omit-xml-declaration') is not True:
             s.write('<?xml')
             s.write(' version="%s"' % self.output.get('version', '1.0'))
@@ -37,10 +77,6 @@ class XMLSerializer(object):
                 s.write(' SYSTEM %s' % self.output.get('doctype-system'))
             s.write('>')
 
-        self.serialize(frag, s)
-
-        return s.getvalue().encode(self.output.get('encoding', 'utf-8'))
-
     def serializeDoc(self, doc):
         pass
 
@@ -111,15 +147,7 @@ class XMLSerializer(object):
                 writer.write(s)
 
 
-class TextSerializer(object):
-    def __init__(self, output):
-        self.output = output
-
-    def serializeResult(self, frag):
-        s = StringIO()
-        self.serialize(frag, s)
-        return s.getvalue().encode(self.output.get('encoding', 'utf-8'))
-
+class TextSerializer(Serializer):
     def serialize(self, node, writer, indent=0):
         if node.nodeType in (xml.dom.Node.DOCUMENT_FRAGMENT_NODE,
                              xml.dom.Node.DOCUMENT_NODE,
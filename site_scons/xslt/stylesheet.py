@@ -7,6 +7,78 @@ import xslt.serializer
 import xslt.tools
 
 
+class TemplateDispatch(object):
+    """Template rules of one stylesheet and mode, bucketed by the node type
+    and name their patterns can match. Patterns are tested lazily against
+    the current node only."""
+
+    def __init__(self, patterns):
+        # patterns is sorted by ascending priority. The last matching
+        # pattern wins, so the position is used to order the candidates.
+        self.buckets = {}
+        for index, (pattern, template, priority) in enumerate(patterns):
+            key = xslt.tools.patternDispatchKey(pattern.expr)
+            self.buckets.setdefault(key, []).append((index, pattern, template))
+        self.candidates = {}
+
+    def getCandidates(self, node):
+        """Returns all patterns which may match node, best one first."""
+
+        nodeType = node.nodeType
+        if(
+            nodeType == xml.dom.Node.ELEMENT_NODE or
+            nodeType == xml.dom.Node.ATTRIBUTE_NODE
+        ):
+            key = (nodeType, node.localName)
+        else:
+            key = (nodeType, None)
+
+        candidates = self.candidates.get(key)
+        if candidates is None:
+            candidates = self.buckets.get(key, [])
+            if key[1] is not None:
+                candidates = candidates + \
+                    self.buckets.get((nodeType, None), [])
+            candidates = candidates + self.buckets.get(None, [])
+            candidates.sort(key=lambda x: x[0], reverse=True)
+            self.candidates[key] = candidates
+        return candidates
+
+    def find(self, context, node):
+        """Returns the template for node or None."""
+
+        namespaces = context.namespaces
+        try:
+            for (index, pattern, template) in self.getCandidates(node):
+                context.namespaces = template.namespaces
+                r = xslt.tools.matchPattern(pattern.expr, node, context)
+                if r is None:
+                    r = self.matchDocument(context, pattern, node)
+                if r:
+                    return template
+        finally:
+            context.namespaces = namespaces
+        return None
+
+    def matchDocument(self, context, pattern, node):
+        """Fallback for complex patterns: evaluate the pattern once for
+        the document and test if node is in the result."""
+
+        document = (
+            node.ownerDocument
+            if node.nodeType != xml.dom.Node.DOCUMENT_NODE
+            else node
+        )
+        handle = (hash(pattern), hash(document))
+        matches = context.matches.get(handle)
+        if matches is None:
+            subContext = context.copy()
+            subContext.nodeset = [document]
+            matches = set(id(n) for n in pattern.nodes(subContext))
+            context.matches[handle] = matches
+        return id(node) in matches
+
+
 class Stylesheet(object):
     def __init__(self, uriOrDoc=None, dp=xslt.core.DocumentProvider()):
         self.dp = dp
@@ -18,6 +90,9 @@ class Stylesheet(object):
 
         doc = self.dp.document(uriOrDoc)
 
+        # all files this stylesheet was built from
+        self.uris = [self.dp.absUri(uriOrDoc)]
+
         self.stripSpace = []
         self.preserveSpace = []
         self.output = {}
@@ -29,6 +104,7 @@ class Stylesheet(object):
         self.variables = {}
         self.templates = []  # not used
         self.patterns = {(None, None): []}
+        self.dispatch = {}
         self.namedTemplates = {}
         self.imports = []
 
@@ -97,6 +173,23 @@ class Stylesheet(object):
         frag = self.transform(*args)
         xslt.core.fixNamespaces(frag)
 
+        ser = self.createSerializer()
+        if ser is not None:
+            return ser.serializeResult(frag)
+        else:
+            return ''
+
+    def transformToStream(self, uriOrDoc, context, stream):
+        """Transform and write the serialized result to the binary
+        file-like object stream."""
+        frag = self.transform(uriOrDoc, context)
+        xslt.core.fixNamespaces(frag)
+
+        ser = self.createSerializer()
+        if ser is not None:
+            ser.serializeResult(frag, stream)
+
+    def createSerializer(self):
         method = self.output.get('method', (None, 'xml'))
         if method == (None, 'xml'):
             ser = xslt.serializer.XMLSerializer(self.output)
@@ -106,11 +199,7 @@ class Stylesheet(object):
             ser = xslt.serializer.XMLSerializer(self.output)
         else:
             ser = None
-
-        if ser is not None:
-            return ser.serializeResult(frag)
-        else:
-            return ''
+        return ser
 
     def _parseStylesheetContent(self, doc, baseUri):
         sheet = doc.documentElement
@@ -167,7 +256,9 @@ class Stylesheet(object):
                     'href',
                     required=True
                 )
-                self.imports.append(Stylesheet(href, dp=self.dp))
+                imp = Stylesheet(href, dp=self.dp)
+                self.imports.append(imp)
+                self.uris.extend(imp.uris)
 
             if node.localName == 'include':
                 href = xslt.properties.stringProperty(
@@ -175,6 +266,7 @@ class Stylesheet(object):
                     'href',
                     required=True
                 )
+                self.uris.append(self.dp.absUri(href, baseUri))
                 self._parseStylesheetContent(
                     self.dp.document(href, baseUri),
                     self.dp.absUri(href, baseUri)
@@ -225,7 +317,7 @@ class Stylesheet(object):
                     self.attrSets[aset.name] = aset
 
     def addKey(self, key):
-        if key.name in self.keys.has_key:
+        if key.name in self.keys:
             self.keys[key.name].update(key)
         else:
             self.keys[key.name] = key
@@ -263,35 +355,12 @@ class Stylesheet(object):
                 self.patterns[mode] = []
             self.patterns[mode] += patterns
 
-    def initMode(self, context, mode):
-        self._matchAll(context, mode)
-        for i in self.imports:
-            i.initMode(context, mode)
-
-    def _matchAll(self, context, mode):
-        document = (
-            context.node.ownerDocument
-            if context.node.nodeType != xml.dom.Node.DOCUMENT_NODE
-            else context.node
-        )
-
-        handle = (hash(self), hash(document), mode)
-
-        if handle in context.matches:
-            # already matched this stylesheet agains current document and
-            # current mode
-            return
-
-        patterns = self.patterns[mode]
-        matches = {}
-        nsCopy = context.namespaces.copy()
-        for (pattern, template, priority) in patterns:
-            context.namespaces.update(template.namespaces)
-            nodes = template.match.nodes(context)
-            for node in nodes:
-                matches[hash(node)] = template
-
-        context.matches[handle] = matches
+    def getDispatch(self, mode):
+        dispatch = self.dispatch.get(mode)
+        if dispatch is None:
+            dispatch = TemplateDispatch(self.patterns.get(mode, []))
+            self.dispatch[mode] = dispatch
+        return dispatch
 
     def applyTemplates(self, context, mode):
         for node in context:
@@ -312,18 +381,11 @@ class Stylesheet(object):
                 return True
 
     def applyTemplatesImpl(self, context, mode):
-        self.initMode(context, mode)
-
         context.cause = (None, mode)
         node = context.node
-        doc = (
-            context.node.ownerDocument
-            if context.node.nodeType != xml.dom.Node.DOCUMENT_NODE
-            else context.node
-        )
-        handle = (hash(self), hash(doc), mode)
-        if hash(node) in context.matches[handle]:
-            context.matches[handle][hash(node)].instantiate(context)
+        template = self.getDispatch(mode).find(context, node)
+        if template is not None:
+            template.instantiate(context)
             return True
         else:
             r = self.applyImports(context)
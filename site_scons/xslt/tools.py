@@ -324,6 +324,125 @@ def computeDefaultPriority(pattern):
     return 0.5
 
 
+def patternDispatchKey(pattern):
+    """Get the (nodeType, localName) bucket of all nodes a pattern can
+    match. Accepts xpath.expr.Expr as pattern.
+    localName is None if the last step matches any name of the node type.
+    Returns None if the pattern can match nodes of any type."""
+
+    import xpath.expr as X
+
+    if type(pattern) is not X.AbsolutePathExpr:
+        return None
+    if pattern.path is None:
+        return (xml.dom.Node.DOCUMENT_NODE, None)
+    if type(pattern.path) is not X.PathExpr:
+        return None
+
+    step = pattern.path.steps[-1]
+    if type(step) is X.PredicateList:
+        step = step.expr
+    if type(step) is not X.AxisStep:
+        return None
+
+    axisName = step.axis.__name__
+    if axisName == 'attribute':
+        nodeType = xml.dom.Node.ATTRIBUTE_NODE
+    elif axisName == 'child':
+        nodeType = xml.dom.Node.ELEMENT_NODE
+    else:
+        return None
+
+    test = step.test
+    if type(test) is X.NameTest:
+        if test.localName == '*':
+            return (nodeType, None)
+        return (nodeType, test.localName)
+    if axisName == 'attribute':
+        return (nodeType, None)
+    if type(test) is X.TextTest:
+        return (xml.dom.Node.TEXT_NODE, None)
+    if type(test) is X.CommentTest:
+        return (xml.dom.Node.COMMENT_NODE, None)
+    if type(test) is X.PITest:
+        return (xml.dom.Node.PROCESSING_INSTRUCTION_NODE, None)
+    return None
+
+
+def matchPattern(pattern, node, context):
+    """Test if node matches a pattern without evaluating the pattern for
+    the whole document. The steps are matched from the last one to the
+    first one along the ancestors of node.
+    Returns True or False, or None if the pattern has a form which is not
+    supported here."""
+
+    import xpath.expr as X
+
+    if type(pattern) is not X.AbsolutePathExpr:
+        return None
+    if pattern.path is None:
+        return node.nodeType == xml.dom.Node.DOCUMENT_NODE
+    if type(pattern.path) is not X.PathExpr:
+        return None
+
+    return _matchSteps(pattern.path.steps, len(pattern.path.steps) - 1,
+                       node, context)
+
+
+def _matchSteps(steps, i, node, context):
+    import xpath.expr as X
+
+    if i < 0:
+        # absolute path starts at the document node
+        return node.nodeType == xml.dom.Node.DOCUMENT_NODE
+
+    step = steps[i]
+    if type(step) is X.PredicateList:
+        axisStep = step.expr
+        if type(axisStep) is not X.AxisStep:
+            return None
+    elif type(step) is X.AxisStep:
+        axisStep = step
+    else:
+        return None
+
+    axisName = axisStep.axis.__name__
+    if axisName == 'descendant-or-self' and type(step) is X.AxisStep and \
+            type(step.test) is X.AnyKindTest:
+        # any ancestor-or-self of node can be the context of this step
+        if node.nodeType == xml.dom.Node.ATTRIBUTE_NODE:
+            return False
+        while node is not None:
+            r = _matchSteps(steps, i - 1, node, context)
+            if r is None or r:
+                return r
+            node = node.parentNode
+        return False
+
+    if axisName == 'child':
+        if node.nodeType == xml.dom.Node.ATTRIBUTE_NODE:
+            return False
+        parent = node.parentNode
+    elif axisName == 'attribute':
+        if node.nodeType != xml.dom.Node.ATTRIBUTE_NODE:
+            return False
+        parent = node.ownerElement
+    else:
+        return None
+
+    if parent is None:
+        return False
+    if not axisStep.test.match(node, axisStep.axis, context):
+        return False
+    if type(step) is X.PredicateList:
+        # predicates depend on the siblings, so evaluate the step
+        nodes = step.evaluate(parent, 1, 1, context)
+        if not any(n is node for n in nodes):
+            return False
+
+    return _matchSteps(steps, i - 1, parent, context)
+
+
 def splitUnionExpr(expr):
     """Split a tree of UnionExpr's to a list of Expr's that are not
     UnionExpr"""
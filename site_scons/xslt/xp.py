@@ -1,12 +1,13 @@
+import xpath.cache
 import xpath.expr
 import xpath.parser
+import xpath.scanner
 import xpath.yappsrt
 import xpath.exceptions
 
 
 class XPathBase(object):
-    _max_cache = 100
-    _cache = {}
+    _cache = xpath.cache.ExpressionCache()
 
     def __init__(self, expr, useCache=True):
         """Init docs.
@@ -26,18 +27,20 @@ class XPathBase(object):
         if isinstance(s, xpath.expr.Expr):
             return s
 
-        if s not in cls._cache:
-            if len(cls._cache) >= cls._max_cache:
-                del cls._cache[0:cls._max_cache/2]
+        return cls._cache.get(s, cls.compile)
 
-            cls._cache[s] = cls.compile(s)
+    @classmethod
+    def setCacheSize(cls, size):
+        cls._cache.resize(size)
 
-        return cls._cache[s]
+    @classmethod
+    def cacheStatistics(cls):
+        return cls._cache.statistics()
 
     @staticmethod
     def compile(s):
         try:
-            parser = xpath.parser.XPath(xpath.parser.XPathScanner(str(s)))
+            parser = xpath.parser.XPath(xpath.scanner.FastXPathScanner(str(s)))
             expr = parser.XPath()
         except xpath.yappsrt.SyntaxError as e:
             raise xpath.exceptions.XPathParseError(str(s), e.pos, e.msg)
@@ -64,8 +67,7 @@ class XPathBase(object):
 
 
 class XPath(XPathBase):
-    _max_cache = 100
-    _cache = {}
+    _cache = xpath.cache.ExpressionCache()
 
     @xpath.api
     def findNodeset(self, context):
@@ -100,13 +102,12 @@ class XPath(XPathBase):
 
 
 class Pattern(XPathBase):
-    _max_cache = 100
-    _cache = {}
+    _cache = xpath.cache.ExpressionCache()
 
     @staticmethod
     def compile(s):
         try:
-            parser = xpath.parser.XPath(xpath.parser.XPathScanner(str(s)))
+            parser = xpath.parser.XPath(xpath.scanner.FastXPathScanner(str(s)))
             expr = parser.Pattern()
         except xpath.yappsrt.SyntaxError as e:
             raise xpath.exceptions.XPathParseError(str(s), e.pos, e.msg)
@@ -123,13 +124,12 @@ class Pattern(XPathBase):
 
 
 class AttributeTemplate(XPathBase):
-    _max_cache = 100
-    _cache = {}
+    _cache = xpath.cache.ExpressionCache()
 
     @staticmethod
     def compile(s):
         try:
-            parser = xpath.parser.XPath(xpath.parser.XPathScanner(str(s)))
+            parser = xpath.parser.XPath(xpath.scanner.FastXPathScanner(str(s)))
             expr = parser.AttributeValueTemplate()
         except xpath.yappsrt.SyntaxError as e:
             raise xpath.exceptions.XPathParseError(str(s), e.pos, e.msg)